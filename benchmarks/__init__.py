@@ -0,0 +1 @@
+""" Benchmarks for UHC Parser, run them from the repository root with python -m benchmarks.run """
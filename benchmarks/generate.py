@@ -0,0 +1,174 @@
+""" Synthetic UHC server log generator for benchmarking the parser
+Writes realistic looking logs: servers starting, players joining with uuid and ip,
+teams and game modes being set up, the world border shrinking, players dying in every
+way the parser knows about until one team is left, crashes with restarts and a lot of
+chat and chunk noise in between.
+"""
+import random
+import zlib
+from datetime import datetime, timedelta
+import click
+
+#Death messages for every death reason in parser.ACTIONS, {k} is the killer
+DEATHS = ['{p} was slain by {k}',
+          '{p} was shot by {k}',
+          '{p} blew up',
+          '{p} was blown up by {k}',
+          '{p} suffocated in a wall',
+          '{p} fell from a high place',
+          '{p} burned to death',
+          '{p} was burnt to a crisp whilst fighting {k}',
+          '{p} drowned',
+          '{p} tried to swim in lava',
+          '{p} tried to swim in lava to escape {k}',
+          '{p} hit the ground too hard']
+
+MOBS = ['Zombie', 'Skeleton', 'Creeper', 'Spider', 'Witch']
+COLORS = ['red', 'blue', 'green', 'yellow', 'aqua', 'gold', 'gray', 'white']
+NOISE = ['<{p}> {word} {word} {word}',
+         '<{p}> gg',
+         'Saving chunks for level \'world\'/Overworld',
+         'Can\'t keep up! Did the system time change, or is the server overloaded?',
+         '{p} moved wrongly!',
+         '{p} lost connection: Disconnected',
+         '[Server] {word} {word}']
+WORDS = ['diamonds', 'help', 'where', 'lol', 'nether', 'border', 'team', 'wait', 'run']
+
+class LogWriter(object):
+    """ Writes log lines with a clock that moves forward """
+    def __init__(self, file, rand, noise):
+        self.file = file
+        self.rand = rand
+        self.noise = noise
+        self.clock = datetime(2017, 1, 1, 18, 0, 0)
+        self.written = 0
+        self.lines = 0
+        self.players = []
+
+    def line(self, message, level='INFO', seconds=1):
+        """ Write a line, with noise lines in between as often as noise says """
+        while self.rand.random() < self.noise:
+            self._write(self.rand.choice(NOISE).format(p=self._someone(), word=self._word()),
+                        'INFO', seconds)
+        self._write(message, level, seconds)
+
+    def _someone(self):
+        return self.rand.choice(self.players) if self.players else 'Server'
+
+    def _word(self):
+        return self.rand.choice(WORDS)
+
+    def _write(self, message, level, seconds):
+        self.clock += timedelta(seconds=self.rand.randint(0, seconds))
+        data = '{t} [{l}] {m}\n'.format(t=self.clock.strftime("%Y-%m-%d %X"), l=level,
+                                        m=message).encode('utf-8')
+        self.file.write(data)
+        self.written += len(data)
+        self.lines += 1
+
+def colored(rand, name):
+    """ Player names are sometimes written with colour codes around them """
+    if rand.random() < 0.3:
+        return '§{c}{n}§r'.format(c=rand.choice('0123456789abcdef'), n=name)
+    return name
+
+def player_uuid(player):
+    """ A made up uuid for a player, the same in every game like a real one """
+    name = player.encode('utf-8')
+    return '{a:08x}-0000-4000-8000-{b:012x}'.format(a=zlib.crc32(name),
+                                                   b=zlib.crc32(name[::-1]) << 16)
+
+def write_game(log, rand):
+    """ Write the log for one game, from server start to server stop """
+    log.line('Starting minecraft server version 1.{v}.2'.format(v=rand.randint(8, 12)),
+             seconds=3600 * 20)
+    count = rand.randint(6, 30)
+    players = ['player{n}'.format(n=rand.randint(0, 500)) for _ in range(count)]
+    players = sorted(set(players))
+    log.players = players
+    for player in players:
+        log.line('UUID of player {p} is {u}'.format(p=player, u=player_uuid(player)))
+        log.line('{p}[/10.0.{a}.{b}:{port}] logged in with entity id {n} at ([world] 0, 64, 0)'
+                 .format(p=player, a=rand.randint(0, 255), b=rand.randint(0, 255),
+                         port=rand.randint(1024, 65535), n=rand.randint(1, 9999)))
+    size = rand.randint(2, 4)
+    teams = {}
+    for index in range(0, len(players), size):
+        team = COLORS[(index // size) % len(COLORS)] + str(index // size)
+        members = players[index:index + size]
+        teams[team] = members
+        log.line('Set option color for team {t} to {c}'.format(t=team, c=rand.choice(COLORS)))
+        names = members[0]
+        if len(members) > 1:
+            names = ', '.join(members[:-1]) + ' and ' + members[-1]
+        variant = rand.randint(0, 2)
+        if variant == 0:
+            log.line('Added {n} player(s) to team {t}: {m}'
+                     .format(n=len(members), t=team, m=names))
+        elif variant == 1:
+            log.line('[admin: Added {n} player(s) to team {t}: {m}]'
+                     .format(n=len(members), t=team, m=names))
+        else:
+            log.line('Could not add {n} player(s) to team {t}: {m}'
+                     .format(n=len(members), t=team, m=names))
+    for player in players:
+        variant = rand.randint(0, 2)
+        if variant == 0:
+            log.line("[admin: Set {p}'s game mode to Survival Mode]".format(p=player))
+        elif variant == 1:
+            log.line('[{p}: Set own game mode to Survival Mode]'.format(p=player))
+        else:
+            log.line("Set {p}'s game mode to Survival Mode".format(p=player))
+    log.line('Shrinking world border to 100.0 blocks wide (down from 2000.0 blocks) '
+             'over 3600 seconds', seconds=120)
+
+    alive = list(players)
+    team_of = {player: team for team, members in teams.items() for player in members}
+    aborted = rand.random() < 0.05
+    while len({team_of[player] for player in alive}) > 1:
+        if aborted and len(alive) < len(players) // 2:
+            break
+        if rand.random() < 0.01:
+            log.line('This crash report has been saved to: ./crash-reports/crash.txt',
+                     level='ERROR', seconds=60)
+            log.line('Starting minecraft server version 1.10.2', seconds=120)
+        died = rand.choice(alive)
+        alive.remove(died)
+        killer = rand.choice(alive + MOBS)
+        log.line(rand.choice(DEATHS).format(p=colored(rand, died), k=colored(rand, killer)),
+                 seconds=300)
+    for _ in range(rand.randint(0, 20)):
+        log.line('<{p}> gg'.format(p=rand.choice(players)), seconds=10)
+    log.line('Stopping the server', seconds=600)
+    log.players = []
+
+def generate(path, size, seed=0, noise=0.9):
+    """ Write a log of about size bytes to path, returns the number of lines written
+    noise is the chance that another noise line comes before every real line """
+    rand = random.Random(seed)
+    with open(path, 'wb') as file:
+        log = LogWriter(file, rand, noise)
+        while log.written < size:
+            write_game(log, rand)
+    return log.lines
+
+def parse_size(text):
+    """ Turn sizes like 10MB or 2GB into bytes """
+    text = text.upper().rstrip('B')
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+@click.command()
+@click.argument('path', type=click.Path())
+@click.option('--size', default='10MB', help='Size of the log, like 10MB or 1GB')
+@click.option('--seed', default=0, help='Seed for the random generator')
+@click.option('--noise', default=0.9, help='Chance of another noise line before each real line')
+def main(path, size, seed, noise):
+    """ Generate a synthetic UHC server log """
+    lines = generate(path, parse_size(size), seed, noise)
+    click.echo('Wrote {n} lines to {p}'.format(n=lines, p=path))
+
+if __name__ == "__main__":
+    main(None, None, None)
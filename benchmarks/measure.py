@@ -0,0 +1,41 @@
+""" Measure all stages on one logfile, run by benchmarks.run in its own process so the
+peak RSS belongs to that logfile only. Prints the numbers as JSON """
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from parser.parser import ParserSession
+from parser.export import write_games
+from parser.stats import score_count
+
+def measure(logfile, lines, legacy=False):
+    """ Time parse, score_count and the json export of a logfile """
+    size = os.path.getsize(logfile)
+    stages = {}
+    start = time.perf_counter()
+    store = ParserSession(legacy=legacy).parse(logfile)
+    stages['parse'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    score_count(store)
+    stages['score_count'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directory:
+        write_games(store, directory)
+    stages['export'] = time.perf_counter() - start
+
+    return {'bytes': size,
+            'lines': lines,
+            'games': store.count,
+            'stages': stages,
+            'lines_per_sec': lines / stages['parse'],
+            'mb_per_sec': size / 1024 ** 2 / stages['parse'],
+            #ru_maxrss is in kilobytes on linux
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+if __name__ == "__main__":
+    print(json.dumps(measure(sys.argv[1], int(sys.argv[2]), sys.argv[3:] == ['legacy'])))
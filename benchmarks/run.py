@@ -0,0 +1,86 @@
+""" Benchmark harness for UHC Parser
+Generates synthetic logs of the sizes asked for (they are kept in the data directory
+for the next run), measures every size in its own process and prints lines/sec,
+MB/sec, peak RSS and the time of every stage. Results can be saved as a baseline
+and later runs compared against it.
+
+    python -m benchmarks.run --sizes 10MB,100MB --save before
+    python -m benchmarks.run --sizes 10MB,100MB --compare before
+"""
+import json
+import os
+import subprocess
+import sys
+import click
+
+from benchmarks.generate import generate, parse_size
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS = os.path.join(HERE, 'results')
+DATA = os.path.join(HERE, 'data')
+
+def logfile_for(data, size, seed):
+    """ Generate the log for a size unless we already have it, returns (path, lines) """
+    path = os.path.join(data, 'uhc-{size}-{seed}.log'.format(size=size, seed=seed))
+    count = path + '.lines'
+    if not os.path.exists(path) or not os.path.exists(count):
+        os.makedirs(data, exist_ok=True)
+        click.echo('Generating {p}...'.format(p=path))
+        lines = generate(path, parse_size(size), seed)
+        with open(count, 'w') as file:
+            file.write(str(lines))
+    with open(count) as file:
+        return path, int(file.read())
+
+def run_size(path, lines, legacy):
+    """ Measure one log in a new process """
+    command = [sys.executable, '-m', 'benchmarks.measure', path, str(lines)]
+    if legacy:
+        command.append('legacy')
+    output = subprocess.check_output(command, cwd=os.path.dirname(HERE))
+    return json.loads(output.decode('utf-8'))
+
+def report(size, result, baseline=None):
+    """ Print the numbers for one size, with the change against the baseline """
+    def change(value, key, stage=False):
+        if baseline is None:
+            return ''
+        old = baseline['stages'][key] if stage else baseline[key]
+        return ' ({c:+.1%})'.format(c=value / old - 1) if old else ''
+    click.echo('{s}: {l:,} lines, {g} games'.format(s=size, l=result['lines'], g=result['games']))
+    click.echo('  {v:,.0f} lines/sec{c}'.format(v=result['lines_per_sec'],
+                                                c=change(result['lines_per_sec'], 'lines_per_sec')))
+    click.echo('  {v:.1f} MB/sec{c}'.format(v=result['mb_per_sec'],
+                                           c=change(result['mb_per_sec'], 'mb_per_sec')))
+    click.echo('  {v:.1f} MB peak RSS{c}'.format(v=result['peak_rss_mb'],
+                                                c=change(result['peak_rss_mb'], 'peak_rss_mb')))
+    for stage, seconds in result['stages'].items():
+        click.echo('  {s}: {v:.3f}s{c}'.format(s=stage, v=seconds,
+                                               c=change(seconds, stage, True)))
+
+@click.command()
+@click.option('--sizes', default='10MB,100MB',
+              help='Comma separated log sizes, like 10MB,100MB,1GB,10GB')
+@click.option('--seed', default=0, help='Seed for the log generator')
+@click.option('--data', default=DATA, type=click.Path(), help='Where generated logs are kept')
+@click.option('--legacy', is_flag=True, default=False, help='Benchmark the legacy matching')
+@click.option('--save', 'save_name', help='Save the results as a baseline with this name')
+@click.option('--compare', 'compare_name', help='Compare with the baseline with this name')
+def main(sizes, seed, data, legacy, save_name, compare_name):
+    """ Run the parser benchmarks """
+    baseline = {}
+    if compare_name:
+        with open(os.path.join(RESULTS, compare_name + '.json')) as file:
+            baseline = json.load(file)
+    results = {}
+    for size in sizes.split(','):
+        path, lines = logfile_for(data, size, seed)
+        results[size] = run_size(path, lines, legacy)
+        report(size, results[size], baseline.get(size))
+    if save_name:
+        os.makedirs(RESULTS, exist_ok=True)
+        with open(os.path.join(RESULTS, save_name + '.json'), 'w') as file:
+            file.write(json.dumps(results, indent=2, sort_keys=True))
+
+if __name__ == "__main__":
+    main(None, None, None)
@@ -3,54 +3,414 @@
 #Copyright 2017 Tobias Gustavsson <tobias at rackrymd.se>
 #License - See LICENSE file
 from sys import stdout
-import json
-import jsonpickle
+import os
 import click
-from logbook import Logger, StreamHandler
-from parser import parse, score_count
+#Everything else is imported by the commands that need it, so a short command like
+#--help or a query does not pay for logbook, the patterns or the parser modules
 
 #TODO: Games restarts where team is not set and player modes changes is not counted
 #Example: 2015-05-19 21:28:01
 
-@click.command()
+def highscore_tables(seasons):
+    """ The highscore tables to save by filename, all time and one for every season
+    The all time table keeps its old name, the seasons get a prefix so --season 2017 can
+    not take its place """
+    from parser.stats import Highscore, season
+    tables = {'hs2017.json': Highscore()}
+    for name in seasons:
+        tables['hs_season_{season}.json'.format(season=name)] = Highscore(*season(name))
+    return tables
+
+def save_analytics(games, save, log):
+    """ Save the event table and the analytics of all finished games """
+    #NumPy is only needed for the analytics, so it is only imported when asked for
+    from parser.events import EventTable
+    from parser.analytics import summary
+    import json
+    table = EventTable.from_store(games)
+    table.save(os.path.join(save, 'events.npz'))
+    filename = os.path.join(save, 'analytics.json')
+    with open(filename, 'w') as file:
+        log.debug("wrote analytics to {file}".format(file=filename))
+        file.write(json.dumps(summary(table)))
+
+def save_games(games, save, log, jsonl=False, tables=None, counted=False, profile=None,
+               quarantine=None):
+    """ Save all games and the highscore tables as json files in the save directory
+    counted tells if the games are already counted in the tables """
+    from parser.export import write_games
+    from parser.instrument import Profile
+    from parser.stats import score_tables
+    if profile is None:
+        profile = Profile()
+    if tables is None:
+        tables = highscore_tables(())
+    if not counted:
+        #Scoring can mark a game inconsistent, so it has to come before the export
+        with profile.stage('score'):
+            score_tables(games, tables.values(), quarantine)
+    log.debug('Saving data to json files')
+    with profile.stage('export'):
+        l_game = write_games(games, save, jsonl)
+    log.debug("wrote info for {n} games to {dir}".format(n=len(l_game), dir=save))
+    save_tables(tables, l_game, save, log)
+
+def save_tables(tables, l_game, save, log):
+    """ Save the highscore tables with the names of the saved games """
+    import json
+    for name, highscore in tables.items():
+        filename = os.path.join(save, name)
+        data = {'games': l_game, 'highscore': highscore.get_highscore()}
+        with open(filename, 'w') as file:
+            log.debug("wrote highscore info to {file}".format(file=filename))
+            file.write(json.dumps(data))
+
+def stream_games(games, save, log, jsonl=False, tables=None, archive=None, quarantine=None):
+    """ Count, save and archive a stream of games (like iter_games) in one pass, every game
+    is let go when it has been through all of it. Returns the number of games """
+    from parser.archive import Archive
+    from parser.export import GameWriter
+    from parser.stats import score_stream
+    if tables is None:
+        tables = highscore_tables(())
+    writer = None
+    if save:
+        #The highscore tables are only saved with the games
+        writer = GameWriter(save, jsonl)
+        games = writer.stream(score_stream(games, tables.values(), quarantine))
+    count = 0
+    if archive:
+        with Archive(archive) as saved:
+            count = saved.save(games)
+    else:
+        for _ in games:
+            count += 1
+    if writer is not None:
+        writer.close()
+        log.debug("wrote info for {n} games to {dir}".format(n=len(writer.names), dir=save))
+        save_tables(tables, writer.names, save, log)
+    return count
+
+def report_run(quarantine, profile, show_profile, profile_json):
+    """ Print the quarantine summary and show or save the profile of a parse """
+    import json
+    if quarantine is not None:
+        quarantine.close()
+        click.echo(quarantine.report(), err=True)
+    if profile is not None:
+        if show_profile:
+            click.echo(profile.report())
+        if profile_json:
+            with open(profile_json, 'w') as file:
+                file.write(json.dumps(profile.to_json(), indent=2, sort_keys=True))
+
+class DefaultGroup(click.Group):
+    """ Command group that runs parse when the first argument is not a command,
+    so main.py FILE still works like before the query commands """
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] not in ('--help', '-h'):
+            args.insert(0, 'parse')
+        return super().parse_args(ctx, args)
+
+@click.group(cls=DefaultGroup)
+def cli():
+    """ UHC Parser, parse server logs or ask the game archive questions """
+
+@cli.command('parse')
 @click.option('--debug', is_flag=True, default=False, help='Turn on debugging')
 @click.argument('file', type=click.Path(exists=True), required=True)
 @click.option('--save', type=click.Path(exists=True), help='save to directory specified')
-def start_parse(debug, file, save):
+@click.option('--jsonl', is_flag=True, default=False,
+              help='Save all games to one JSON Lines file instead of one file per game')
+@click.option('--legacy-matching', is_flag=True, default=False,
+              help='Run every pattern on every line, for comparing with the old parser')
+@click.option('--patterns', 'pattern_files', multiple=True, type=click.Path(exists=True),
+              help='JSON file with more patterns, like new death messages (repeatable)')
+@click.option('--follow', 'follow_log', is_flag=True, default=False,
+              help='Keep following the file as the server writes to it')
+@click.option('--checkpoint', type=click.Path(),
+              help='Resume from and save progress to this file when following')
+@click.option('--jobs', type=int, help='Number of processes when FILE is a directory of logs')
+@click.option('--dedup', is_flag=True, default=False,
+              help='Drop what overlapping logs in the FILE directory have in common')
+@click.option('--dedup-capacity', default=10 ** 7,
+              help='Number of actions the dedup filter is sized for')
+@click.option('--cache', type=click.Path(exists=True, file_okay=False),
+              help='Keep finished games in this directory and only parse what is new')
+@click.option('--season', 'seasons', multiple=True,
+              help='Also save a highscore for a season, like 2017 or 2017-05 (repeatable)')
+@click.option('--analytics', is_flag=True, default=False,
+              help='Also save analytics.json and the events.npz event table (needs NumPy)')
+@click.option('--profile', 'show_profile', is_flag=True, default=False,
+              help='Print lines, pattern hits and time spent in every stage when done')
+@click.option('--profile-json', type=click.Path(), help='Save the profile as JSON to this file')
+@click.option('--archive', type=click.Path(dir_okay=False),
+              help='Save all games to this SQLite archive for the query commands')
+@click.option('--quarantine', 'quarantine_file', type=click.Path(dir_okay=False),
+              help='Keep going when an action fails, failed actions are written to this file')
+@click.option('--stream', is_flag=True, default=False,
+              help='Handle every game as soon as it is done instead of keeping all games')
+@click.option('--split', is_flag=True, default=False,
+              help='Parse one big FILE in --jobs processes by cutting it where servers start')
+@click.option('--skip-stop-log', is_flag=True, default=False,
+              help='Do not keep what happens after a game is decided, this also lets the '
+                   'lines between games be skipped faster')
+def start_parse(debug, file, save, jsonl, legacy_matching, pattern_files, follow_log, checkpoint,
+                jobs, dedup, dedup_capacity, cache, seasons, analytics, show_profile, profile_json,
+                archive, quarantine_file, stream, split, skip_stop_log):
     """ main function for starting everything"""
+    from importlib.util import find_spec
+    from logbook import StreamHandler
+    from parser.parser import ParserSession, iter_games
+    from parser.parallel import parse_files, iter_files, parse_split
+    from parser.tail import follow
+    from parser.helpers import get_logger, set_debug
+    from parser.instrument import Profile
+    from parser.cache import ParseCache
+    from parser.archive import Archive
+    from parser.dedup import Deduplicator
+    from parser.parser import REGISTRY
+    from parser.models import StreamStore
+    from parser.quarantine import Quarantine
     if debug:
         log_level = 'DEBUG'
+        set_debug(True)
     else:
         log_level = 'WARNING'
 
     StreamHandler(stdout, level=log_level).push_application()
-    log = Logger('main')
+    log = get_logger('main')
     log.debug('Starting up...')
+    for path in pattern_files:
+        REGISTRY.load(path)
+
+    quarantine = Quarantine(quarantine_file) if quarantine_file else None
+    keep_stop_log = not skip_stop_log
+    if analytics and find_spec('numpy') is None:
+        raise click.UsageError('--analytics needs NumPy, install it with pip install numpy')
+    if follow_log:
+        conflicts = [option for option, used in (('--profile', show_profile or profile_json),
+                                                 ('--stream', stream), ('--split', split),
+                                                 ('--cache', cache), ('--analytics', analytics),
+                                                 ('--dedup', dedup)) if used]
+        if conflicts:
+            raise click.UsageError('--follow can not be used with {o}'
+                                   .format(o=', '.join(conflicts)))
+        session = ParserSession(legacy=legacy_matching, name='follow', quarantine=quarantine,
+                                keep_stop_log=keep_stop_log)
+        archived = 0
+        for games in follow(file, checkpoint, session=session):
+            log.info("Games:", games.count)
+            if save:
+                save_games(games, save, log, jsonl, highscore_tables(seasons),
+                           quarantine=quarantine)
+            if archive:
+                #Only the game being played and the games after it can have changed
+                with Archive(archive) as saved:
+                    saved.save(games.games_since(archived))
+                archived = games.final_count
+        return
 
-    games = parse(file)
+    if dedup and not os.path.isdir(file):
+        raise click.UsageError('--dedup merges the logs in a directory, not one FILE')
+    tables = highscore_tables(seasons)
+    counted = False
+    profile = Profile() if show_profile or profile_json else None
+    if stream:
+        if cache or analytics:
+            raise click.UsageError('--stream does not keep the games --cache and --analytics need')
+        if split:
+            raise click.UsageError('--split can not be used with --stream')
+        session = ParserSession(store=StreamStore(), legacy=legacy_matching, profile=profile,
+                                quarantine=quarantine, keep_stop_log=keep_stop_log)
+        deduplicator = Deduplicator(dedup_capacity) if dedup else None
+        if os.path.isdir(file):
+            games = iter_files(file, processes=jobs, session=session, dedup=deduplicator)
+        else:
+            games = iter_games(file, session=session)
+        if profile is not None:
+            games = profile.count_stream(games)
+        with (profile or Profile()).stage('stream'):
+            count = stream_games(games, save, log, jsonl, tables, archive, quarantine)
+        log.info("Games: {n}", n=count)
+        report_run(quarantine, profile, show_profile, profile_json)
+        return
+
+    session = ParserSession(legacy=legacy_matching, profile=profile, quarantine=quarantine,
+                            keep_stop_log=keep_stop_log)
+    with (profile or Profile()).stage('parse'):
+        if os.path.isdir(file):
+            if split:
+                raise click.UsageError('--split cuts one FILE, not a directory of logs')
+            if cache:
+                raise click.UsageError('--cache only keeps one FILE, not a directory of logs')
+            #Matching happens in the worker processes, only handling the actions is profiled
+            deduplicator = Deduplicator(dedup_capacity) if dedup else None
+            games = parse_files(file, processes=jobs, session=session, dedup=deduplicator)
+            if deduplicator is not None:
+                log.info("Dropped {n} duplicate actions, skipped copies: {f}",
+                         n=deduplicator.dropped, f=deduplicator.skipped_files)
+        elif split:
+            if profile is not None or quarantine is not None:
+                raise click.UsageError('--split can not be used with --profile or --quarantine')
+            if cache:
+                raise click.UsageError('--split can not be used with --cache')
+            games = parse_split(file, processes=jobs, session=session)
+        elif cache:
+            games, _ = ParseCache(cache).parse(file, session, tables=list(tables.values()))
+            counted = True
+        else:
+            games = session.parse(file)
 
     log.info("Games:", games.count)
     if save:
-        log.debug('Saving data to json files')
-        l_game = []
-        for game in games.items():
-            name = game.sid.strftime("%Y-%m-%d_%H%M%S")
-            l_game.append(name)
-            filename = save+name+".json"
-            with open(filename, 'w') as file:
-                file.write(jsonpickle.encode(game))
-                log.debug("wrote game info to {file}".format(file=filename))
-            filename = save+'hs2017.json'
-        highscore = score_count(games)
-        data = {'games': l_game, 'highscore': highscore}
-        with open(filename, 'w') as file:
-            log.debug("wrote highscore info to {file}".format(file=filename))
-            file.write(json.dumps(data))
+        save_games(games, save, log, jsonl, tables, counted, profile, quarantine)
+        if analytics:
+            with (profile or Profile()).stage('analytics'):
+                save_analytics(games, save, log)
+
+    if archive:
+        with (profile or Profile()).stage('archive'), Archive(archive) as saved:
+            saved.save(games.all_items())
+
+    if profile is not None:
+        profile.count_games(games)
+    report_run(quarantine, profile, show_profile, profile_json)
 
     log.debug('End of program...')
 
+@cli.command('servers')
+@click.option('--debug', is_flag=True, default=False, help='Turn on debugging')
+@click.argument('servers', nargs=-1, required=True)
+@click.option('--save', type=click.Path(exists=True, file_okay=False),
+              help='save every server to a directory of its own in this directory')
+@click.option('--jsonl', is_flag=True, default=False,
+              help='save the games of every server to one plain games.jsonl file')
+@click.option('--legacy-matching', is_flag=True, default=False,
+              help='Match every pattern against every line like older versions')
+@click.option('--jobs', type=int, help='Number of processes, servers are parsed in parallel')
+def start_servers(debug, servers, save, jsonl, legacy_matching, jobs):
+    """ Parse the logs of several servers, each SERVER is NAME=PATH (a log, a directory
+    of logs or a glob) or a directory with a directory of logs for every server.
+    The servers get their own games and one leaderboard counting players by UUID """
+    import json
+    from logbook import StreamHandler
+    from parser.helpers import get_logger, set_debug
+    from parser.servers import parse_servers, find_servers
+    if debug:
+        set_debug(True)
+    StreamHandler(stdout, level='DEBUG' if debug else 'WARNING').push_application()
+    log = get_logger('main')
+    sources = {}
+    for server in servers:
+        if '=' in server:
+            name, path = server.split('=', 1)
+            sources[name] = path
+        elif os.path.isdir(server):
+            sources.update(find_servers(server))
+        else:
+            raise click.BadParameter("{s} is not NAME=PATH or a directory".format(s=server))
+    stores, leaderboard = parse_servers(sources, jobs, legacy_matching)
+    for name, games in stores.items():
+        click.echo("{name}: {n} games".format(name=name, n=games.count))
+        if save:
+            directory = os.path.join(save, name)
+            os.makedirs(directory, exist_ok=True)
+            save_games(games, directory, log, jsonl)
+    click.echo("{n} players on {s} servers".format(n=len(leaderboard.players), s=len(stores)))
+    if save:
+        filename = os.path.join(save, 'hs_global.json')
+        with open(filename, 'w') as file:
+            log.debug("wrote the global highscore to {file}".format(file=filename))
+            file.write(json.dumps({'servers': sorted(stores),
+                                   'highscore': leaderboard.get_highscore()}))
+
+@cli.command('games')
+@click.argument('archive', type=click.Path(exists=True, dir_okay=False))
+@click.option('--player', help='Only games this player was in')
+@click.option('--uuid', help='Only games the player with this uuid was in')
+@click.option('--team', help='Only games where this team played')
+@click.option('--winner', help='Only games this team won')
+@click.option('--since', help='Only games started at or after this date, like 2017-05-01')
+@click.option('--until', help='Only games started before this date')
+@click.option('--all', 'all_games', is_flag=True, default=False,
+              help='Also aborted and crashed games')
+def query_games(archive, player, uuid, team, winner, since, until, all_games):
+    """ List the games in an archive """
+    from parser.archive import Archive
+    from parser.models import State
+    with Archive(archive) as games:
+        for game in games.games(since, until, player, uuid, team, winner,
+                                None if all_games else State.STOPPED):
+            click.echo('{sid} {state} winner: {team} players: {players}'.format(
+                sid=game.sid.isoformat(), state=game.state.name, team=game.winning_team,
+                players=', '.join(game.get_playing_players())))
+
+@cli.command('kills')
+@click.argument('archive', type=click.Path(exists=True, dir_okay=False))
+@click.option('--killer', help='Only kills made by this player')
+@click.option('--victim', help='Only deaths of this player')
+@click.option('--since', help='Only games started at or after this date, like 2017-05-01')
+@click.option('--until', help='Only games started before this date')
+def query_kills(archive, killer, victim, since, until):
+    """ List the deaths in the games of an archive """
+    from parser.archive import Archive
+    with Archive(archive) as games:
+        for sid, timestamp, player, killed_by, reason in games.deaths(victim, killer,
+                                                                      since, until):
+            click.echo('{sid} {time} {player} {reason} {killer}'.format(
+                sid=sid, time=timestamp, player=player, reason=reason,
+                killer=killed_by or ''))
+
+@cli.command('player')
+@click.argument('archive', type=click.Path(exists=True, dir_okay=False))
+@click.argument('name')
+def query_player(archive, name):
+    """ List every game a player was in, with the team and how it went """
+    from parser.archive import Archive
+    with Archive(archive) as games:
+        for sid, state, team, survived, won in games.player_games(name):
+            click.echo('{sid} {state} team: {team}{won}{survived}'.format(
+                sid=sid, state=state, team=team, won=' won' if won else '',
+                survived=' survived' if survived else ''))
+
+@cli.command('last')
+@click.argument('archive', type=click.Path(exists=True, dir_okay=False))
+def query_last(archive):
+    """ Show the game that started last and how it ended, like for a cron job """
+    from parser.archive import Archive
+    with Archive(archive) as games:
+        game = games.last()
+        if game is None:
+            click.echo('No games')
+            return
+        click.echo('{sid} {state} winner: {team}'.format(sid=game.sid.isoformat(),
+                                                          state=game.state.name,
+                                                          team=game.winning_team))
+
+@cli.command('serve')
+@click.option('--debug', is_flag=True, default=False, help='Turn on debugging')
+@click.argument('file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--host', default='127.0.0.1', help='Address to listen on')
+@click.option('--port', default=8080, help='Port to listen on')
+@click.option('--checkpoint', type=click.Path(),
+              help='Resume from and save progress to this file')
+def serve(debug, file, host, port, checkpoint):
+    """ Serve a live scoreboard of the log as the server writes it
+    GET /highscore and /games for snapshots, a WebSocket on /live for every change """
+    from logbook import StreamHandler
+    from parser.helpers import set_debug
+    from parser.live import ScoreboardServer
+    if debug:
+        set_debug(True)
+    StreamHandler(stdout, level='DEBUG' if debug else 'INFO').push_application()
+    try:
+        ScoreboardServer(file, host, port, checkpoint).run()
+    except KeyboardInterrupt:
+        pass
+
 
 if __name__ == "__main__":
     #for kaka in Action.__subclasses__():
     #    print(kaka.regex)
-    start_parse(None, None, None)
+    cli(None, None, None)
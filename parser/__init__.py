@@ -1,3 +1,12 @@
 """ submodule parser """
-from . parser import parse
-from . stats import score_count
\ No newline at end of file
+#The submodules are only imported when something from them is used, so a command
+#that does not parse does not pay for compiling the patterns
+SUBMODULES = {'parse': 'parser', 'ParserSession': 'parser', 'iter_games': 'parser',
+              'follow': 'tail', 'parse_files': 'parallel', 'iter_files': 'parallel',
+              'score_count': 'stats'}
+
+def __getattr__(name):
+    if name in SUBMODULES:
+        from importlib import import_module
+        return getattr(import_module('.' + SUBMODULES[name], __name__), name)
+    raise AttributeError("module {m} has no attribute {n}".format(m=__name__, n=name))
@@ -0,0 +1,124 @@
+""" Game analytics for UHC Parser
+Stats over many games worked out in bulk on an EventTable: time to first kill,
+survival times, who kills who, what players die of and how the size of a team
+changes the chance to win. Times are in seconds from when the game started.
+"""
+import numpy as np
+
+from . events import NO_ID
+
+def _seconds(times):
+    """ datetime64 values as int64 seconds """
+    return times.astype('datetime64[s]').astype(np.int64)
+
+def _roster_keys(table, games, players):
+    """ One int64 key per (game, player), for finding rows in the roster """
+    return games.astype(np.int64) * max(len(table.players), 1) + players
+
+def _in_roster(table, games, players):
+    """ Mask of the (game, player) pairs that are playing players in that game """
+    keys = _roster_keys(table, games, players)
+    return (players != NO_ID) & np.isin(keys, _roster_keys(table, table.roster_game,
+                                                           table.roster_player))
+
+def player_kills(table):
+    """ Mask of the events where a playing player killed another playing player """
+    deaths = table.event_kind == table.kind('death')
+    return (deaths
+            & _in_roster(table, table.event_game, table.event_player)
+            & _in_roster(table, table.event_game, table.event_killer))
+
+def _during_game(table):
+    """ Mask of the events after the game started (the world border started shrinking) """
+    return table.event_time >= table.game_start[table.event_game]
+
+def time_to_first_kill(table):
+    """ Seconds from game start to the first player kill in every game, -1 without kills """
+    kills = player_kills(table) & _during_game(table)
+    first = np.full(len(table.game_sid), np.iinfo(np.int64).max)
+    np.minimum.at(first, table.event_game[kills], _seconds(table.event_time[kills]))
+    result = first - _seconds(table.game_start)
+    result[first == np.iinfo(np.int64).max] = -1
+    return result
+
+def survival_times(table):
+    """ Seconds every roster row survived after game start, survivors last until the game ended
+    A player that died before the game started survived 0 seconds """
+    ended = _seconds(table.game_end)[table.roster_game]
+    died = ended.copy()
+    if not len(died):
+        return died
+    deaths = table.event_kind == table.kind('death')
+    keys = _roster_keys(table, table.roster_game, table.roster_player)
+    order = np.argsort(keys)
+    death_keys = _roster_keys(table, table.event_game[deaths], table.event_player[deaths])
+    rows = np.minimum(np.searchsorted(keys, death_keys, sorter=order), len(keys) - 1)
+    found = keys[order[rows]] == death_keys
+    #The first death of a player in a game counts
+    np.minimum.at(died, order[rows[found]], _seconds(table.event_time[deaths][found]))
+    died[table.roster_survived] = ended[table.roster_survived]
+    return np.maximum(died - _seconds(table.game_start)[table.roster_game], 0)
+
+def average_survival(table):
+    """ Average seconds survived per game for every player, returns {player: seconds} """
+    times = survival_times(table)
+    total = np.bincount(table.roster_player, weights=times, minlength=len(table.players))
+    games = np.bincount(table.roster_player, minlength=len(table.players))
+    return {table.players[player]: total[player] / games[player]
+            for player in np.flatnonzero(games)}
+
+def kill_matrix(table):
+    """ Matrix of player kills, [killer, victim] is how many times killer killed victim """
+    kills = player_kills(table)
+    matrix = np.zeros((len(table.players), len(table.players)), dtype=np.int32)
+    np.add.at(matrix, (table.event_killer[kills], table.event_player[kills]), 1)
+    return matrix
+
+def rivalries(table, count=10):
+    """ The pairs of players that killed each other the most, most kills first
+    Works on the kills and not kill_matrix, so it does not need a players x players matrix """
+    kills = player_kills(table) & (table.event_killer != table.event_player)
+    size = max(len(table.players), 1)
+    killers = table.event_killer[kills].astype(np.int64)
+    victims = table.event_player[kills].astype(np.int64)
+    directed = dict(zip(*(values.tolist() for values in
+                          np.unique(killers * size + victims, return_counts=True))))
+    pairs, counts = np.unique(np.minimum(killers, victims) * size + np.maximum(killers, victims),
+                              return_counts=True)
+    result = []
+    for pair in pairs[np.argsort(-counts, kind='stable')][:count].tolist():
+        first, second = divmod(pair, size)
+        result.append({'players': [table.players[first], table.players[second]],
+                       'kills': [directed.get(first * size + second, 0),
+                                 directed.get(second * size + first, 0)]})
+    return result
+
+def death_causes(table):
+    """ How many times players died of every cause, returns {cause: count} """
+    deaths = (table.event_kind == table.kind('death')) & (table.event_cause != NO_ID)
+    counts = np.bincount(table.event_cause[deaths], minlength=len(table.causes))
+    return {cause: int(counts[index]) for index, cause in enumerate(table.causes)}
+
+def team_sizes(table):
+    """ Games, wins and win rate by the number of players in a team
+    returns {size: {'teams', 'wins', 'win_rate'}} """
+    keys = table.roster_game.astype(np.int64) * max(len(table.teams), 1) + table.roster_team
+    teams, sizes = np.unique(keys, return_counts=True)
+    games = teams // max(len(table.teams), 1)
+    won = table.game_winner[games] == teams % max(len(table.teams), 1)
+    played = np.bincount(sizes)
+    wins = np.bincount(sizes, weights=won)
+    return {int(size): {'teams': int(played[size]), 'wins': int(wins[size]),
+                        'win_rate': wins[size] / played[size]}
+            for size in np.flatnonzero(played)}
+
+def summary(table):
+    """ All the analytics as an JSON object """
+    first_kill = time_to_first_kill(table)
+    return {'games': len(table.game_sid),
+            'time_to_first_kill': float(first_kill[first_kill >= 0].mean())
+                                  if (first_kill >= 0).any() else None,
+            'average_survival': average_survival(table),
+            'rivalries': rivalries(table),
+            'death_causes': death_causes(table),
+            'team_sizes': team_sizes(table)}
@@ -0,0 +1,288 @@
+""" SQLite game archive for UHC Parser
+Games are kept in one SQLite file, indexed by start time, winner and state, with a
+table of the players in every game (indexed by name, uuid and team) and one of all
+deaths (indexed by the player and the killer). The action logs are saved apart from the
+rest of a game and are only read when something asks for the actions of a game.
+"""
+import json
+import sqlite3
+
+from . models import Game, Store, State, Action
+
+SCHEMA = 1
+
+TABLES = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    sid TEXT NOT NULL UNIQUE,
+    state TEXT NOT NULL,
+    winning_team TEXT,
+    summary TEXT NOT NULL,
+    log TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_state ON games (state, sid);
+CREATE INDEX IF NOT EXISTS games_winner ON games (winning_team);
+CREATE TABLE IF NOT EXISTS players (
+    game_id INTEGER NOT NULL REFERENCES games (id) ON DELETE CASCADE,
+    player TEXT NOT NULL,
+    uuid TEXT,
+    team TEXT,
+    playing INTEGER NOT NULL,
+    survived INTEGER NOT NULL,
+    won INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS players_player ON players (player);
+CREATE INDEX IF NOT EXISTS players_uuid ON players (uuid);
+CREATE INDEX IF NOT EXISTS players_team ON players (team);
+CREATE INDEX IF NOT EXISTS players_game ON players (game_id);
+CREATE TABLE IF NOT EXISTS deaths (
+    game_id INTEGER NOT NULL REFERENCES games (id) ON DELETE CASCADE,
+    timestamp TEXT NOT NULL,
+    player TEXT NOT NULL,
+    killed_by TEXT,
+    reason TEXT
+);
+CREATE INDEX IF NOT EXISTS deaths_player ON deaths (player);
+CREATE INDEX IF NOT EXISTS deaths_killer ON deaths (killed_by, player);
+CREATE INDEX IF NOT EXISTS deaths_game ON deaths (game_id);
+"""
+
+class ArchivedGame(Game):
+    """ A game read from the archive, the action logs are read the first time they are used """
+    def __init__(self, *args, **kwargs):
+        self._archive = None
+        self._rowid = None
+        super().__init__(*args, **kwargs)
+
+    def _load(self):
+        """ Read the action logs from the archive unless we already have them """
+        if self._rowid is not None:
+            rowid, self._rowid = self._rowid, None
+            logs = self._archive.load_log(rowid)
+            self.__dict__['_log'] = [Action.from_json(action) for action in logs['log']]
+            self.__dict__['_stop_log'] = [Action.from_json(action)
+                                          for action in logs['stop_log']]
+
+    @property
+    def _log(self):
+        self._load()
+        return self.__dict__['_log']
+
+    @_log.setter
+    def _log(self, log):
+        self.__dict__['_log'] = log
+
+    @property
+    def _stop_log(self):
+        self._load()
+        return self.__dict__['_stop_log']
+
+    @_stop_log.setter
+    def _stop_log(self, log):
+        self.__dict__['_stop_log'] = log
+
+class Archive(object):
+    """ Games in an SQLite file, use save() to add games and games() to find them """
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA foreign_keys = ON')
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, SCHEMA):
+            raise ValueError("Unknown archive schema {v} in {p}".format(v=version, p=path))
+        with self._db:
+            self._db.executescript(TABLES)
+            self._db.execute('PRAGMA user_version = {v}'.format(v=SCHEMA))
+
+    def __repr__(self):
+        return "<Archive {path}>".format(path=self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """ Close the database """
+        self._db.close()
+
+    @property
+    def count(self):
+        """ The number of games in the archive """
+        return self._db.execute('SELECT COUNT(*) FROM games').fetchone()[0]
+
+    def _add(self, game):
+        """ Insert a game, replacing the game with the same start time """
+        data = game.to_json()
+        log = {'log': data.pop('log'), 'stop_log': data.pop('stop_log')}
+        data['start'] = log['log'][0]
+        sid = data['sid']
+        self._db.execute('DELETE FROM games WHERE sid = ?', (sid,))
+        rowid = self._db.execute(
+            'INSERT INTO games (sid, state, winning_team, summary, log) VALUES (?, ?, ?, ?, ?)',
+            (sid, data['state'], game.winning_team, json.dumps(data), json.dumps(log))).lastrowid
+        playing = set(game.get_playing_players())
+        survivors = set()
+        for action in log['log']:
+            if action['action'] == 'survivors':
+                survivors.update(action['players'])
+        players = []
+        for player, info in data['player_info'].items():
+            team = info.get('team')
+            players.append((rowid, player, info.get('uuid'), team, player in playing,
+                            player in survivors,
+                            team is not None and team == game.winning_team))
+        self._db.executemany('INSERT INTO players VALUES (?, ?, ?, ?, ?, ?, ?)', players)
+        self._db.executemany('INSERT INTO deaths VALUES (?, ?, ?, ?, ?)',
+                             [(rowid, action['timestamp'], action['player'],
+                               action.get('killed_by'), action.get('reason'))
+                              for action in log['log'] if action['action'] == 'death'])
+
+    def save(self, games):
+        """ Save games (like store.all_items()) in one transaction, returns how many """
+        saved = 0
+        with self._db:
+            for game in games:
+                self._add(game)
+                saved += 1
+        return saved
+
+    def load_log(self, rowid):
+        """ The action logs of a game, {'log': [...], 'stop_log': [...]} as JSON objects """
+        row = self._db.execute('SELECT log FROM games WHERE id = ?', (rowid,)).fetchone()
+        return json.loads(row[0])
+
+    def _game(self, rowid, summary):
+        """ A game from its summary, the action logs are loaded when used """
+        data = json.loads(summary)
+        data['log'] = [data.pop('start')]
+        data['stop_log'] = []
+        game = ArchivedGame.from_json(data)
+        game._archive = self
+        game._rowid = rowid
+        return game
+
+    def games(self, start=None, end=None, player=None, uuid=None, team=None, winner=None,
+              state=State.STOPPED):
+        """ Generator for the games matching all the filters, oldest first
+        start and end are ISO dates or datetimes, end is not included. team and winner
+        are team names, player and uuid a player that was in the game. Without a state
+        games in every state are returned """
+        where = []
+        args = []
+        if start is not None:
+            where.append('sid >= ?')
+            args.append(_iso(start))
+        if end is not None:
+            where.append('sid < ?')
+            args.append(_iso(end))
+        for column, value in (('player', player), ('uuid', uuid), ('team', team)):
+            if value is not None:
+                where.append('id IN (SELECT game_id FROM players WHERE {c} = ?)'.format(c=column))
+                args.append(value)
+        if winner is not None:
+            where.append('winning_team = ?')
+            args.append(winner)
+        if state is not None:
+            where.append('state = ?')
+            args.append(state.name)
+        query = 'SELECT id, summary FROM games'
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        for rowid, summary in self._db.execute(query + ' ORDER BY sid', args):
+            yield self._game(rowid, summary)
+
+    def last(self):
+        """ The game that started last, None if the archive is empty """
+        row = self._db.execute('SELECT id, summary FROM games ORDER BY sid DESC LIMIT 1').fetchone()
+        if row is None:
+            return None
+        return self._game(*row)
+
+    def deaths(self, player=None, killed_by=None, start=None, end=None, state=State.STOPPED):
+        """ Generator for (game sid, timestamp, player, killed_by, reason) of the deaths
+        matching all the filters, oldest first """
+        where = []
+        args = []
+        for column, value in (('deaths.player', player), ('deaths.killed_by', killed_by)):
+            if value is not None:
+                where.append('{c} = ?'.format(c=column))
+                args.append(value)
+        if start is not None:
+            where.append('games.sid >= ?')
+            args.append(_iso(start))
+        if end is not None:
+            where.append('games.sid < ?')
+            args.append(_iso(end))
+        if state is not None:
+            where.append('games.state = ?')
+            args.append(state.name)
+        query = ('SELECT games.sid, deaths.timestamp, deaths.player, deaths.killed_by, '
+                 'deaths.reason FROM deaths JOIN games ON games.id = deaths.game_id')
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        return self._db.execute(query + ' ORDER BY games.sid, deaths.rowid', args)
+
+    def player_games(self, player):
+        """ Generator for (game sid, state, team, survived, won) of every game a player was in """
+        return self._db.execute(
+            'SELECT games.sid, games.state, players.team, players.survived, players.won '
+            'FROM players JOIN games ON games.id = players.game_id '
+            'WHERE players.player = ? ORDER BY games.sid', (player,))
+
+    def store(self):
+        """ A Store reading its games from this archive and saving the games added to it,
+        call flush() on it when done to save the game being played """
+        return ArchiveStore(self)
+
+def _iso(value):
+    """ Dates and datetimes as the ISO text the game sid is saved as """
+    if isinstance(value, str):
+        return value
+    return value.isoformat()
+
+class ArchiveStore(Store):
+    """ Store backed by an archive. Finished games are streamed from it, the game being
+    played is kept in memory so handle_action can change it and is saved when it is
+    final (see Store.final_count) or on flush() """
+    def __init__(self, archive):
+        super().__init__()
+        self.archive = archive
+        #The last game of the archive may still go on (like after a crash)
+        self._current = archive.last()
+        self._unsaved = False
+
+    @property
+    def last(self):
+        return self._current
+
+    @property
+    def count(self):
+        return self.archive.count + self._unsaved
+
+    def add(self, game):
+        self.flush()
+        self._current = game
+        self._unsaved = True
+
+    def flush(self):
+        """ Save the game being played to the archive """
+        if self._current is not None:
+            self.archive.save([self._current])
+            self._unsaved = False
+
+    def _games(self, state):
+        """ The games in the archive with the game being played in place of its saved copy """
+        current = self._current
+        for game in self.archive.games(state=state):
+            if current is None or game.sid != current.sid:
+                yield game
+        if current is not None and (state is None or current.state == state):
+            yield current
+
+    def all_items(self):
+        return self._games(None)
+
+    def items(self):
+        return self._games(State.STOPPED)
@@ -0,0 +1,152 @@
+""" Persistent parse cache for UHC Parser
+Everything before the server_start of the last game in a logfile is final (see
+Store.final_count). The cache keeps the final games, what each of them added to the
+highscore and the byte offset where the last game started. A re-run only parses from
+that offset and folds the new final games into the cached totals.
+
+Every cached game is a segment of the logfile from its server_start to the next one,
+the hash of the first and last segment is checked against the file before the cache
+is trusted, together with the inode and size of the file and a fingerprint of the
+patterns and game options the games were made with.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from . helpers import replace_file
+from . models import Game, State, Store
+from . parser import ParserSession
+from . reader import open_log
+from . stats import Highscore, game_score
+
+INDEX = 'index.json'
+SCHEMA = 1
+
+def session_fingerprint(session):
+    """ Hash of what decides the games a session makes of a log, the patterns (with the
+    ones from plugins and config files), legacy matching and the game options """
+    patterns = [(action[0].pattern, action[1].__name__, action[2], action[3])
+                for action in session.actions]
+    data = json.dumps([patterns, session.legacy, session.game_options], sort_keys=True)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+def segment_hash(logfile, start, end):
+    """ Hash of the bytes from start to end in the logfile """
+    digest = hashlib.sha1()
+    with open_log(logfile) as file:
+        file.seek(start)
+        left = end - start
+        while left > 0:
+            data = file.read(min(left, 1024 * 1024))
+            if not data:
+                break
+            digest.update(data)
+            left -= len(data)
+    return digest.hexdigest()
+
+class ParseCache(object):
+    """ Cache of parsed logfiles in a directory """
+    def __init__(self, directory):
+        self.directory = directory
+        self.index = {'schema': SCHEMA, 'files': {}}
+        path = os.path.join(directory, INDEX)
+        if os.path.exists(path):
+            with open(path) as file:
+                index = json.load(file)
+            if index.get('schema') == SCHEMA:
+                self.index = index
+
+    def __repr__(self):
+        return "<ParseCache {dir}>".format(dir=self.directory)
+
+    def _games_path(self, key):
+        """ The file holding the finished games of a logfile """
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.directory, name + '.jsonl')
+
+    def _valid(self, entry, logfile, stat, fingerprint):
+        """ Check that the cached entry still describes the logfile and was made with
+        the same patterns and options """
+        if entry is None or entry['inode'] != stat.st_ino or entry['size'] > stat.st_size:
+            return False
+        if entry.get('fingerprint') != fingerprint:
+            return False
+        segments = entry['segments']
+        for start, end, digest in segments[:1] + segments[1:][-1:]:
+            if segment_hash(logfile, start, end) != digest:
+                return False
+        return True
+
+    def parse(self, logfile, session=None, load_games=True, tables=()):
+        """ Parse what is new in the logfile since the last run
+        Returns the store (with the cached games when load_games is set) and the highscore.
+        The cached score of every game is also added to each of the highscore tables
+        (like seasons) that the game is in the window of """
+        if session is None:
+            session = ParserSession()
+        key = os.path.abspath(logfile)
+        games_path = self._games_path(key)
+        stat = os.stat(logfile)
+        entry = self.index['files'].get(key)
+        fingerprint = session_fingerprint(session)
+        if not self._valid(entry, logfile, stat, fingerprint):
+            entry = {'inode': stat.st_ino, 'size': 0, 'offset': 0, 'segments': [],
+                     'fingerprint': fingerprint, 'highscore': Highscore().to_json()}
+            if os.path.exists(games_path):
+                os.remove(games_path)
+        totals = Highscore.from_json(entry['highscore'])
+
+        store = Store()
+        if (load_games or tables) and os.path.exists(games_path):
+            with open(games_path) as file:
+                for line in file:
+                    record = json.loads(line)
+                    if load_games:
+                        store.add(Game.from_json(record['game']))
+                    if tables:
+                        sid = datetime.strptime(record['game']['sid'], "%Y-%m-%dT%H:%M:%S")
+                        score = Highscore.from_json(record['score'])
+                        for table in tables:
+                            if table.in_window(sid):
+                                table.merge(score)
+
+        #Parse from where the last unfinished game started
+        starts = []
+        for offset, action in session.match_file(logfile, entry['offset'], offsets=True):
+            count = session.store.count
+            session.handle_action(action, (logfile, offset))
+            if session.store.count > count:
+                starts.append(offset)
+        games = list(session.store.all_items())
+
+        with open(games_path, 'a') as file:
+            for game, start, end in zip(session.store.final_games(), starts, starts[1:]):
+                if game.state == State.STOPPED:
+                    score = game_score(game, session.quarantine)
+                else:
+                    score = Highscore()
+                totals.merge(score)
+                for table in tables:
+                    table.add_game(game, score)
+                entry['segments'].append([start, end, segment_hash(logfile, start, end)])
+                file.write(json.dumps({'game': game.to_json(), 'score': score.to_json()}) + '\n')
+        if starts:
+            entry['offset'] = starts[-1]
+        else:
+            #No game in what we parsed, nothing in it can matter
+            entry['offset'] = stat.st_size
+        entry['size'] = stat.st_size
+        entry['highscore'] = totals.to_json()
+        self.index['files'][key] = entry
+        replace_file(os.path.join(self.directory, INDEX), json.dumps(self.index))
+
+        for game in games:
+            store.add(game)
+        highscore = Highscore().merge(totals)
+        if games and games[-1].state == State.STOPPED:
+            score = game_score(games[-1], session.quarantine)
+            highscore.merge(score)
+            for table in tables:
+                table.add_game(games[-1], score)
+        return store, highscore
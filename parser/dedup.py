@@ -0,0 +1,119 @@
+""" Deduplication of overlapping log sources for UHC Parser
+Backups, rotated files and console captures of the same server overlap. Every action
+found is keyed on its timestamp and content and checked against a Bloom filter of
+everything handled before, so an action seen in an earlier source is dropped before
+it can count a death twice or start a game again. Files that are exact copies of a
+file already read are skipped before they are even matched.
+
+The Bloom filter has a fixed size, so memory does not grow with the amount of logs.
+The price is that an action can, with the chance of error_rate, be taken for one we
+have seen. Size it with the number of actions (not lines) you expect.
+"""
+import hashlib
+import math
+import os
+import re
+
+from . reader import open_log
+
+#How much of the start and the end of a file goes into its fingerprint
+SAMPLE = 1024 * 1024
+TIMESTAMP = re.compile(rb'^(\d+-\d+-\d+ \d+:\d+:\d+)', re.MULTILINE)
+
+class BloomFilter(object):
+    """ Set of byte strings with a fixed size that can answer 'maybe seen' or 'never seen' """
+    def __init__(self, capacity=10 ** 7, error_rate=1e-7):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def __repr__(self):
+        return "<BloomFilter {n}/{c}>".format(n=self.count, c=self.capacity)
+
+    def _positions(self, key):
+        """ The bits of a key, from two halves of one hash (double hashing) """
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        size = self.size
+        return [(first + index * second) % size for index in range(self.hashes)]
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def add(self, key):
+        """ Add a key, returns True if it was (probably) already there """
+        bits = self.bits
+        seen = True
+        for pos in self._positions(key):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                seen = False
+        if not seen:
+            self.count += 1
+        return seen
+
+def action_key(action):
+    """ The timestamp and content of an action as bytes """
+    return '\x1f'.join(str(value) for value in action.values()).encode('utf-8')
+
+def fingerprint(logfile):
+    """ Size and hash of the start and end of a file, the same for copies of a file """
+    size = os.path.getsize(logfile)
+    digest = hashlib.sha1(str(size).encode('ascii'))
+    with open(logfile, 'rb') as file:
+        digest.update(file.read(SAMPLE))
+        if size > SAMPLE:
+            file.seek(max(size - SAMPLE, SAMPLE))
+            digest.update(file.read(SAMPLE))
+    return digest.hexdigest()
+
+def first_timestamp(logfile):
+    """ The timestamp of the first line with one in the start of a logfile, or None """
+    with open_log(logfile) as file:
+        match = TIMESTAMP.search(file.read(64 * 1024))
+    return match.group(1).decode('ascii') if match else None
+
+class Deduplicator(object):
+    """ Remembers the files and actions handled so far and drops them when seen again """
+    def __init__(self, capacity=10 ** 7, error_rate=1e-7):
+        self.seen = BloomFilter(capacity, error_rate)
+        self.files = {}
+        self.dropped = 0
+        self.skipped_files = []
+
+    def __repr__(self):
+        return "<Deduplicator {n} dropped>".format(n=self.dropped)
+
+    def order(self, logfiles):
+        """ Sort sources by the time they start, so overlapping ranges are read in order """
+        stamps = {logfile: first_timestamp(logfile) for logfile in logfiles}
+        return sorted(logfiles, key=lambda logfile: (stamps[logfile] is None,
+                                                     stamps[logfile] or ''))
+
+    def new_file(self, logfile):
+        """ False if the file is a copy of a file we already read """
+        key = fingerprint(logfile)
+        if key in self.files:
+            self.skipped_files.append(logfile)
+            return False
+        self.files[key] = logfile
+        return True
+
+    def is_new(self, action):
+        """ Check an action and remember it, False if it was handled before """
+        if self.seen.add(action_key(action)):
+            self.dropped += 1
+            return False
+        return True
+
+    def filter(self, actions):
+        """ Generator for the actions not handled before """
+        for action in actions:
+            if self.is_new(action):
+                yield action
@@ -0,0 +1,161 @@
+""" Columnar event table for UHC Parser
+All games flattened into NumPy arrays so stats over hundreds of games can be worked out
+with array operations instead of looping over the actions of every game. Players,
+killers, teams and death causes are interned to integer ids, the names are kept in
+lists next to the arrays. Timestamps are converted all at once by NumPy.
+
+There are three tables, all arrays of the same length within a table:
+events, one row per action with a timestamp (a team_members row per player),
+games, one row per game and roster, one row per playing player in a game.
+"""
+import numpy as np
+
+from . models import ACTION_TYPES
+
+#Action type code is the place in this list
+KINDS = list(ACTION_TYPES)
+#Id used when a row has no player, killer, team or cause
+NO_ID = -1
+#Timestamps are kept with a resolution of seconds, like the log
+TIME = 'datetime64[s]'
+
+EVENT_COLUMNS = ('event_game', 'event_time', 'event_kind', 'event_player', 'event_killer',
+                 'event_team', 'event_cause')
+GAME_COLUMNS = ('game_sid', 'game_start', 'game_end', 'game_state', 'game_winner')
+ROSTER_COLUMNS = ('roster_game', 'roster_player', 'roster_team', 'roster_survived')
+NAME_LISTS = ('players', 'teams', 'causes')
+
+class Names(object):
+    """ Hands out an integer id for every name, the first name seen gets 0 """
+    def __init__(self, names=()):
+        self.names = list(names)
+        self._ids = {name: index for index, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def id(self, name):
+        """ The id of a name, None gets NO_ID """
+        if name is None:
+            return NO_ID
+        index = self._ids.get(name)
+        if index is None:
+            index = self._ids[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+class EventTable(object):
+    """ Every game in a store as columns, build it with from_store or load """
+    def __init__(self, columns, players, teams, causes):
+        #The columns are named in EVENT_COLUMNS, GAME_COLUMNS and ROSTER_COLUMNS
+        self.event_game = columns['event_game']
+        self.event_time = columns['event_time']
+        self.event_kind = columns['event_kind']
+        self.event_player = columns['event_player']
+        self.event_killer = columns['event_killer']
+        self.event_team = columns['event_team']
+        self.event_cause = columns['event_cause']
+        self.game_sid = columns['game_sid']
+        self.game_start = columns['game_start']
+        self.game_end = columns['game_end']
+        self.game_state = columns['game_state']
+        self.game_winner = columns['game_winner']
+        self.roster_game = columns['roster_game']
+        self.roster_player = columns['roster_player']
+        self.roster_team = columns['roster_team']
+        self.roster_survived = columns['roster_survived']
+        self.players = list(players)
+        self.teams = list(teams)
+        self.causes = list(causes)
+
+    def __repr__(self):
+        return "<EventTable {g} games, {e} events>".format(g=len(self.game_sid),
+                                                          e=len(self.event_game))
+
+    def __len__(self):
+        return len(self.event_game)
+
+    @classmethod
+    def from_store(cls, games, all_games=False):
+        """ Build the table from the finished games in a store, or every game with all_games """
+        players, teams, causes = Names(), Names(), Names()
+        events = {name: [] for name in EVENT_COLUMNS}
+        meta = {name: [] for name in GAME_COLUMNS}
+        roster = {name: [] for name in ROSTER_COLUMNS}
+        kinds = {kind: code for code, kind in enumerate(KINDS)}
+        items = games.all_items() if all_games else games.items()
+        for number, game in enumerate(items):
+            last = None
+            survivors = set()
+            for action in game.get_actions():
+                if action['action'] == 'survivors':
+                    survivors.update(action['players'])
+                timestamp = action.get('timestamp')
+                if timestamp is None:
+                    continue
+                last = timestamp
+                if action['action'] == 'team_members':
+                    rows = [(player, action['team']) for player in action['players']]
+                else:
+                    rows = [(action.get('player'), action.get('team'))]
+                for player, team in rows:
+                    events['event_game'].append(number)
+                    events['event_time'].append(timestamp)
+                    events['event_kind'].append(kinds[action['action']])
+                    events['event_player'].append(players.id(player))
+                    events['event_killer'].append(players.id(action.get('killed_by')))
+                    events['event_team'].append(teams.id(team))
+                    events['event_cause'].append(causes.id(action.get('reason')))
+            started = game.game_info.get('timestamp') if game.game_info else None
+            meta['game_sid'].append(game.sid.isoformat())
+            meta['game_start'].append(started or game.sid.isoformat())
+            meta['game_end'].append(last or game.sid.isoformat())
+            meta['game_state'].append(game.state.value)
+            meta['game_winner'].append(teams.id(game.winning_team))
+            for player in game.get_playing_players():
+                roster['roster_game'].append(number)
+                roster['roster_player'].append(players.id(player))
+                roster['roster_team'].append(teams.id(game.player_info(player)['team']))
+                roster['roster_survived'].append(player in survivors)
+
+        columns = {}
+        #The timestamps are parsed by NumPy in one go
+        for name in ('event_time', 'game_sid', 'game_start', 'game_end'):
+            values = events[name] if name in events else meta[name]
+            columns[name] = np.array(values, dtype=TIME)
+        for name in ('event_game', 'event_player', 'event_killer', 'event_team'):
+            columns[name] = np.array(events[name], dtype=np.int32)
+        columns['event_kind'] = np.array(events['event_kind'], dtype=np.int8)
+        columns['event_cause'] = np.array(events['event_cause'], dtype=np.int8)
+        columns['game_state'] = np.array(meta['game_state'], dtype=np.int8)
+        columns['game_winner'] = np.array(meta['game_winner'], dtype=np.int32)
+        for name in ('roster_game', 'roster_player', 'roster_team'):
+            columns[name] = np.array(roster[name], dtype=np.int32)
+        columns['roster_survived'] = np.array(roster['roster_survived'], dtype=bool)
+        return cls(columns, players.names, teams.names, causes.names)
+
+    def kind(self, name):
+        """ The code of an action type, to compare with event_kind """
+        return KINDS.index(name)
+
+    def state(self, state):
+        """ Mask of the games in a State, game_state holds the value of the State """
+        return self.game_state == state.value
+
+    def save(self, path):
+        """ Save all columns and names to a compressed .npz file """
+        columns = {name: getattr(self, name)
+                   for name in EVENT_COLUMNS + GAME_COLUMNS + ROSTER_COLUMNS}
+        for name in NAME_LISTS:
+            columns[name] = np.array(getattr(self, name), dtype=str)
+        columns['kinds'] = np.array(KINDS, dtype=str)
+        np.savez_compressed(path, **columns)
+
+    @classmethod
+    def load(cls, path):
+        """ Load a table saved with save """
+        with np.load(path) as data:
+            if list(data['kinds']) != KINDS:
+                raise ValueError("Event table {p} has other action types".format(p=path))
+            columns = {name: data[name] for name in data.files}
+        return cls(columns, *(columns[name].tolist() for name in NAME_LISTS))
@@ -0,0 +1,129 @@
+""" Export games as JSON for UHC Parser
+Games are serialized with Game.to_json in a background thread pool and written either
+as one file per game or as one JSON Lines file. A manifest with the hash of what was
+written last time is kept next to the files, so unchanged games are not rewritten.
+"""
+import hashlib
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from . helpers import replace_file
+from . models import State
+
+MANIFEST = '.manifest.json'
+#Games queued for writing before write() waits for the oldest, so they do not pile up
+#in memory when parsing is faster than writing
+MAX_PENDING = 64
+JSONL_FILE = 'games.jsonl'
+
+def game_name(game):
+    """ The name we save a game as, based on when it started """
+    return game.sid.strftime("%Y-%m-%d_%H%M%S")
+
+def dump_game(game):
+    """ Serialize a game to a JSON string """
+    return json.dumps(game.to_json(), sort_keys=True)
+
+def _digest(data):
+    """ Hash of a serialized game for finding out if it changed """
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+class GameWriter(object):
+    """ Writes games to a directory in a background thread pool
+    Use it as a context manager or call close() to wait for everything to be written """
+    def __init__(self, directory, jsonl=False, workers=4):
+        self.directory = directory
+        self.jsonl = jsonl
+        self.names = []
+        self.written = 0
+        self._pool = ThreadPoolExecutor(workers)
+        self._pending = deque()
+        self._writing = {}
+        self._manifest = {}
+        path = os.path.join(directory, MANIFEST)
+        if os.path.exists(path):
+            with open(path) as file:
+                self._manifest = json.load(file)
+        if jsonl:
+            self._jsonl = open(os.path.join(directory, JSONL_FILE + '.tmp'), 'w')
+            self._hash = hashlib.sha1()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write_game(self, name, game):
+        """ Write a game to its own file unless it is the same as last time """
+        data = dump_game(game)
+        digest = _digest(data)
+        path = os.path.join(self.directory, name + '.json')
+        if self._manifest.get(name) == digest and os.path.exists(path):
+            return name, digest, False
+        replace_file(path, data)
+        return name, digest, True
+
+    def _drain(self, wait):
+        """ Take care of finished work in the order it was submitted """
+        while self._pending and (wait or self._pending[0].done()):
+            result = self._pending.popleft().result()
+            if self.jsonl:
+                line = result + '\n'
+                self._jsonl.write(line)
+                self._hash.update(line.encode('utf-8'))
+            else:
+                name, digest, written = result
+                self._manifest[name] = digest
+                self.written += written
+
+    def write(self, game):
+        """ Queue a game for writing """
+        name = game_name(game)
+        self.names.append(name)
+        if self.jsonl:
+            self._pending.append(self._pool.submit(dump_game, game))
+        else:
+            previous = self._writing.get(name)
+            if previous is not None:
+                #Games started in the same second share a file, the later game has to win
+                previous.result()
+            self._writing[name] = self._pool.submit(self._write_game, name, game)
+            self._pending.append(self._writing[name])
+        if len(self._pending) > MAX_PENDING:
+            self._pending[0].result()
+        self._drain(False)
+
+    def stream(self, games):
+        """ Queue every finished game in a stream of games (like iter_games) for writing
+        and pass all games on """
+        for game in games:
+            if game.state == State.STOPPED:
+                self.write(game)
+            yield game
+
+    def close(self):
+        """ Wait for all games to be written and save the manifest """
+        self._drain(True)
+        self._pool.shutdown()
+        if self.jsonl:
+            self._jsonl.close()
+            path = os.path.join(self.directory, JSONL_FILE)
+            digest = self._hash.hexdigest()
+            if self._manifest.get(JSONL_FILE) == digest and os.path.exists(path):
+                os.remove(path + '.tmp')
+            else:
+                os.replace(path + '.tmp', path)
+                self._manifest[JSONL_FILE] = digest
+                self.written += len(self.names)
+        replace_file(os.path.join(self.directory, MANIFEST),
+                     json.dumps(self._manifest, sort_keys=True))
+
+def write_games(games, directory, jsonl=False, workers=4):
+    """ Write all finished games in a store, returns the names of the games """
+    with GameWriter(directory, jsonl, workers) as writer:
+        for game in games.items():
+            writer.write(game)
+    return writer.names
@@ -1,6 +1,95 @@
 """ Simple helpers for the parser to use """
-from datetime import datetime
+import os
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 
+#All loggers in the parser are in one group, debug records are skipped before they
+#are even created unless debug logging is turned on. Logbook is only imported when
+#something is logged, so commands that never log start faster
+_GROUP = None
+_DEBUG = False
+
+def _logger_group():
+    """ The group of all parser loggers, created on first use """
+    global _GROUP
+    if _GROUP is None:
+        from logbook import LoggerGroup, DEBUG, INFO
+        _GROUP = LoggerGroup(level=DEBUG if _DEBUG else INFO)
+    return _GROUP
+
+class LazyLogger(object):
+    """ Stands in for a logbook Logger until it is used, then the methods asked for are
+    taken from the real logger and kept on this object so later calls go straight to it """
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        logger = self.__dict__.get('_logger')
+        if logger is None:
+            from logbook import Logger
+            logger = self.__dict__['_logger'] = Logger(self.name)
+            #Not added to the group's list of loggers, so loggers of finished sessions
+            #can be garbage collected
+            logger.group = _logger_group()
+        value = getattr(logger, attr)
+        if callable(value):
+            self.__dict__[attr] = value
+        return value
+
+def get_logger(name):
+    """ Create a logger that takes its level from the parser group """
+    return LazyLogger(name)
+
+def set_debug(enabled):
+    """ Turn debug logging on or off for the whole parser """
+    global _DEBUG
+    _DEBUG = enabled
+    if _GROUP is not None:
+        from logbook import DEBUG, INFO
+        _GROUP.level = DEBUG if enabled else INFO
+
+#Log times have no time zone, epoch seconds count from 1970-01-01 00:00 in log time
+EPOCH = datetime(1970, 1, 1)
+_EPOCH_DAY = EPOCH.toordinal()
+#Seconds from the epoch to the start of every date seen, a log has many lines but few dates
+_DAYS = {}
+
+def _day_seconds(day):
+    """ Seconds from the epoch to the start of a '%Y-%m-%d' date, None if it is not one """
+    seconds = _DAYS.get(day)
+    if seconds is None:
+        if day[4] != '-' or day[7] != '-':
+            return None
+        seconds = _DAYS[day] = (date(int(day[:4]), int(day[5:7]), int(day[8:])).toordinal()
+                                - _EPOCH_DAY) * 86400
+    return seconds
+
+def get_epoch(timestamp):
+    """ Seconds since the epoch of a '%Y-%m-%d %H:%M:%S' log timestamp
+    The fixed format is read by position, strptime is only used for odd timestamps """
+    if len(timestamp) == 19 and timestamp[13] == ':' and timestamp[16] == ':':
+        day = _day_seconds(timestamp[:10])
+        if day is not None:
+            return (day + int(timestamp[11:13]) * 3600 + int(timestamp[14:16]) * 60
+                    + int(timestamp[17:]))
+    return int((datetime.strptime(timestamp, "%Y-%m-%d %X") - EPOCH).total_seconds())
+
+@lru_cache(maxsize=4096)
 def get_datetime(line):
-    """ Convert a logline to a datetime for the log entry """
-    return datetime.strptime(line, "%Y-%m-%d %X")
+    """ Convert a logline to a datetime for the log entry, cached per second """
+    return EPOCH + timedelta(seconds=get_epoch(line))
+
+def decode_line(raw):
+    """ Decode a raw logline, old servers wrote the colour code § as latin-1 """
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw.decode('latin-1')
+
+def replace_file(path, data):
+    """ Write text to a file next to path first and move it in place, so readers and
+    crashes never see half of it """
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as file:
+        file.write(data)
+    os.replace(tmp, path)
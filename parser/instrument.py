@@ -0,0 +1,144 @@
+""" Profiling of a parse for UHC Parser
+A Profile counts what happens on the hot path: lines read, lines that got past the
+keyword prefilter, attempts, hits and time of every pattern, time spent handling every
+kind of action and how the games ended up. A session only does this work when it is
+given a profile, without one the normal fast path runs untouched.
+"""
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from . models import State
+from . parser import build_action
+
+COUNT_SLICE = 8 * 1024 * 1024
+
+def _label(index, action):
+    """ Readable name of a pattern in an action table, many patterns share a function
+    so the place in the table is part of it """
+    if action[2] is not None:
+        return '#{i} {f}:{r}'.format(i=index, f=action[1].__name__, r=action[2])
+    return '#{i} {f}'.format(i=index, f=action[1].__name__)
+
+class Profile(object):
+    """ Counters and timers for one parse, see report() and to_json() """
+    def __init__(self):
+        self.bytes_read = 0
+        self.lines_read = 0
+        self.candidates = 0
+        self.lines_matched = 0
+        self.actions = Counter()
+        #Pattern label -> [attempts, hits, seconds]
+        self.patterns = {}
+        #Action name -> [count, seconds]
+        self.handlers = defaultdict(lambda: [0, 0.0])
+        self.games = Counter()
+        self.stages = {}
+
+    def __repr__(self):
+        return "<Profile {lines} lines>".format(lines=self.lines_read)
+
+    @contextmanager
+    def stage(self, name):
+        """ Time a stage of the run, like parse or export """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def _pattern(self, index, action):
+        label = _label(index, action)
+        if label not in self.patterns:
+            self.patterns[label] = [0, 0, 0.0]
+        return self.patterns[label]
+
+    def read(self, buffer, start, end):
+        """ Count the lines of a window the reader went through """
+        self.bytes_read += end - start
+        #mmap has no count(), so count slices of it
+        for first in range(start, end, COUNT_SLICE):
+            self.lines_read += buffer[first:min(first + COUNT_SLICE, end)].count(b'\n')
+
+    def match_line(self, line, actions, keywords=None, indexes=None):
+        """ Same as match_line (legacy_match_line without keywords) while counting
+        the attempts, hits and time of every pattern. indexes are the places of the actions
+        in the full table when only some of the patterns are run """
+        self.candidates += 1
+        matched = []
+        if keywords is not None and keywords.search(line) is None:
+            return matched
+        for index, action in enumerate(actions):
+            if keywords is not None and action[3] not in line:
+                continue
+            counts = self._pattern(index if indexes is None else indexes[index], action)
+            start = time.perf_counter()
+            match = action[0].search(line)
+            counts[2] += time.perf_counter() - start
+            counts[0] += 1
+            if match:
+                counts[1] += 1
+                matched.append(build_action(match, action))
+        if matched:
+            self.lines_matched += 1
+            self.actions.update(action['action'] for action in matched)
+        return matched
+
+    def handle_action(self, handler, action, *args):
+        """ Run the handler on the action and time it by action type """
+        start = time.perf_counter()
+        handler(action, *args)
+        counts = self.handlers[action['action']]
+        counts[0] += 1
+        counts[1] += time.perf_counter() - start
+
+    def count_games(self, store):
+        """ Count the games in a store by the state they ended in """
+        self.games = Counter(game.state.name for game in store.all_items())
+
+    def count_stream(self, games):
+        """ Count the games in a stream of games (like iter_games) and pass them on """
+        for game in games:
+            self.games[game.state.name] += 1
+            yield game
+
+    def to_json(self):
+        """ Everything we counted as a dict that can be dumped as JSON """
+        return {
+            'bytes_read': self.bytes_read,
+            'lines_read': self.lines_read,
+            'candidates': self.candidates,
+            'lines_matched': self.lines_matched,
+            'actions': dict(self.actions),
+            'patterns': {label: {'attempts': counts[0], 'hits': counts[1],
+                                 'seconds': counts[2]}
+                         for label, counts in self.patterns.items()},
+            'handlers': {name: {'count': counts[0], 'seconds': counts[1]}
+                         for name, counts in self.handlers.items()},
+            'games': dict(self.games),
+            'stages': dict(self.stages)
+        }
+
+    def report(self):
+        """ The profile as readable text """
+        lines = ['Read {l:,} lines ({b:,} bytes), {c:,} got past the keywords, {m:,} matched'
+                 .format(l=self.lines_read, b=self.bytes_read, c=self.candidates,
+                         m=self.lines_matched)]
+        if self.stages:
+            lines.append('Stages:')
+            for name, seconds in self.stages.items():
+                lines.append('  {n:<24} {s:9.3f}s'.format(n=name, s=seconds))
+        lines.append('Patterns:')
+        lines.append('  {n:<40} {a:>10} {h:>8} {s:>10}'.format(n='pattern', a='attempts',
+                                                                h='hits', s='seconds'))
+        ordered = sorted(self.patterns.items(), key=lambda item: item[1][2], reverse=True)
+        for label, counts in ordered:
+            lines.append('  {n:<40} {a:>10,} {h:>8,} {s:>10.4f}'
+                         .format(n=label, a=counts[0], h=counts[1], s=counts[2]))
+        lines.append('Actions:')
+        for name, counts in sorted(self.handlers.items()):
+            lines.append('  {n:<24} {c:>8,} {s:>10.4f}s'.format(n=name, c=counts[0], s=counts[1]))
+        lines.append('Games: ' + ', '.join('{n} {s}'.format(n=self.games[state.name],
+                                                              s=state.name.lower())
+                                           for state in State if self.games[state.name]))
+        return '\n'.join(lines)
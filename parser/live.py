@@ -0,0 +1,288 @@
+""" Live scoreboard for UHC Parser
+An asyncio HTTP and WebSocket server holding the store and highscore in memory while
+a thread follows the server log. Deaths, team wins, survivors, game state changes and
+ranking changes are pushed to everyone connected to /live, /highscore and /games are
+JSON snapshots that are only rebuilt when the state of a game changes.
+
+Every message is encoded once and shared by all viewers. What the log gave in one go
+is pushed as one batch, each viewer has a bounded queue of batches and everything in
+it is written before waiting for the socket. A viewer whose socket does not drain
+while the batches pile up gets its queue replaced by a resync message telling it to
+fetch the snapshots again, so a slow client never holds up the others or the
+ingestion, while a burst of messages is no reason to resync.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import threading
+
+from . tail import follow
+from . helpers import get_logger
+from . models import State
+from . parser import ParserSession
+from . stats import Highscore
+
+log = get_logger('live')
+
+#Magic string from RFC 6455 for the Sec-WebSocket-Accept header
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+#Batches waiting for a viewer before it has to resync
+QUEUE_SIZE = 256
+#Largest request head we accept from a client
+MAX_HEAD = 8192
+
+class ScoreboardSession(ParserSession):
+    """ Parser session that keeps a highscore up to date and collects the messages to push """
+    def __init__(self, **kwargs):
+        kwargs.setdefault('name', 'live')
+        super().__init__(**kwargs)
+        self.highscore = Highscore()
+        self.messages = []
+        self.changed = False
+        self._announced = set()
+
+    def _state_changed(self, game, old):
+        """ Keep the highscore right when a game enters or leaves STOPPED """
+        self.changed = True
+        if old == State.STOPPED:
+            self.highscore.remove_game(game)
+        if game.state == State.STOPPED:
+            self.highscore.add_game(game)
+            if game.sid not in self._announced:
+                self._announced.add(game.sid)
+                for action in game.get_actions():
+                    if action['action'] in ('team_win', 'survivors'):
+                        self.messages.append({'type': action['action'],
+                                              'game': game.sid.isoformat(),
+                                              'action': action.to_json()})
+        self.messages.append({'type': 'state', 'game': game.sid.isoformat(),
+                              'state': game.state.name})
+
+    def handle_action(self, action, position=None):
+        """ Handle the action and record what it changed """
+        game = self.store.last
+        old = game.state if game is not None else None
+        active = game is not None and not game.stopped
+        super().handle_action(action, position)
+        if active and action['action'] == 'death':
+            self.messages.append({'type': 'death', 'game': game.sid.isoformat(),
+                                  'action': action.to_json()})
+        if game is not None and game.state != old:
+            self._state_changed(game, old)
+        if self.store.last is not game:
+            self._state_changed(self.store.last, None)
+
+    def recount(self):
+        """ Count the highscore from scratch, for when the store came from a checkpoint """
+        self.highscore = Highscore()
+        for game in self.store.items():
+            self.highscore.add_game(game)
+            self._announced.add(game.sid)
+        self.messages = []
+        self.changed = True
+
+    def take_messages(self):
+        """ The messages since the last call """
+        messages, self.messages = self.messages, []
+        return messages
+
+def _game_summary(game):
+    """ What the games snapshot tells about a game """
+    return {'sid': game.sid.isoformat(), 'state': game.state.name,
+            'winning_team': game.winning_team,
+            'players': list(game.get_playing_players())}
+
+def websocket_frame(data, opcode=0x1):
+    """ An unmasked, unfragmented WebSocket frame with the payload data """
+    length = len(data)
+    if length < 126:
+        head = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 1 << 16:
+        head = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        head = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return head + data
+
+async def read_frame(reader):
+    """ Read a frame from a client, returns (opcode, payload) """
+    first, second = await reader.readexactly(2)
+    length = second & 0x7f
+    if length == 126:
+        length, = struct.unpack('!H', await reader.readexactly(2))
+    elif length == 127:
+        length, = struct.unpack('!Q', await reader.readexactly(8))
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask is not None:
+        payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+    return first & 0x0f, payload
+
+def _response(status, body, content_type='application/json', headers=()):
+    """ A complete HTTP response as bytes """
+    lines = ['HTTP/1.1 {s}'.format(s=status),
+             'Content-Type: {t}'.format(t=content_type),
+             'Content-Length: {n}'.format(n=len(body)),
+             'Access-Control-Allow-Origin: *',
+             'Connection: close']
+    lines.extend(headers)
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+class Viewer(object):
+    """ A connected WebSocket client and the batches of frames waiting to be sent to it """
+    def __init__(self, writer):
+        self.writer = writer
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def push(self, frame, resync):
+        """ Queue a batch of frames, a viewer that is too far behind gets a resync instead """
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(resync)
+
+class ScoreboardServer(object):
+    """ Serves the scoreboard of a logfile, call run() or await serve() """
+    def __init__(self, logfile, host='127.0.0.1', port=8080, checkpoint=None, interval=1.0,
+                 session=None):
+        self.logfile = logfile
+        self.host = host
+        self.port = port
+        self.checkpoint = checkpoint
+        self.interval = interval
+        self.session = ScoreboardSession() if session is None else session
+        self.viewers = set()
+        self.snapshots = {'/highscore': _response('200 OK', b'[]'),
+                          '/games': _response('200 OK', b'[]')}
+        self._resync = websocket_frame(json.dumps({'type': 'resync'}).encode('utf-8'))
+        self._ranking = None
+        self._loop = None
+
+    def __repr__(self):
+        return "<ScoreboardServer {host}:{port}>".format(host=self.host, port=self.port)
+
+    def _snapshots(self):
+        """ Build the snapshot responses, only called when a game changed state """
+        ranking = self.session.highscore.top()
+        games = [_game_summary(game) for game in self.session.store.all_items()]
+        return ranking, {'/highscore': _response('200 OK', json.dumps(ranking).encode('utf-8')),
+                         '/games': _response('200 OK', json.dumps(games).encode('utf-8'))}
+
+    def _ingest(self):
+        """ Follow the log in this thread, everything found is handed to the event loop """
+        first = True
+        try:
+            for _ in follow(self.logfile, self.checkpoint, self.interval, session=self.session):
+                if first:
+                    #The history (and the checkpoint) is not pushed, only counted
+                    self.session.recount()
+                    first = False
+                messages = self.session.take_messages()
+                snapshots = None
+                if self.session.changed:
+                    self.session.changed = False
+                    snapshots = self._snapshots()
+                self._loop.call_soon_threadsafe(self.publish, messages, snapshots)
+        except Exception:
+            log.exception("Following {f} failed", f=self.logfile)
+            raise
+
+    def publish(self, messages, snapshots):
+        """ Push the messages to all viewers and switch to the new snapshots """
+        frames = [websocket_frame(json.dumps(message).encode('utf-8')) for message in messages]
+        if snapshots is not None:
+            ranking, self.snapshots = snapshots
+            if ranking != self._ranking:
+                self._ranking = ranking
+                frames.append(websocket_frame(json.dumps({'type': 'ranking',
+                                                          'highscore': ranking})
+                                              .encode('utf-8')))
+        if not frames:
+            return
+        batch = b''.join(frames)
+        for viewer in self.viewers:
+            viewer.push(batch, self._resync)
+
+    async def _send(self, viewer):
+        """ Write everything queued for a viewer, then wait for the socket to drain """
+        while True:
+            viewer.writer.write(await viewer.queue.get())
+            while not viewer.queue.empty():
+                viewer.writer.write(viewer.queue.get_nowait())
+            await viewer.writer.drain()
+
+    async def _websocket(self, reader, writer, headers):
+        """ Upgrade the connection and push messages until the viewer leaves """
+        key = headers.get('sec-websocket-key', '')
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('latin-1'))
+                                  .digest()).decode('latin-1')
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+                      'Connection: Upgrade\r\nSec-WebSocket-Accept: {a}\r\n\r\n')
+                     .format(a=accept).encode('latin-1'))
+        viewer = Viewer(writer)
+        if self._ranking is not None:
+            viewer.push(websocket_frame(json.dumps({'type': 'ranking', 'highscore': self._ranking})
+                                        .encode('utf-8')), self._resync)
+        self.viewers.add(viewer)
+        sender = asyncio.ensure_future(self._send(viewer))
+        try:
+            while True:
+                opcode, payload = await read_frame(reader)
+                if opcode == 0x8:
+                    viewer.push(websocket_frame(payload[:2], 0x8), self._resync)
+                    break
+                elif opcode == 0x9:
+                    viewer.push(websocket_frame(payload, 0xa), self._resync)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.viewers.discard(viewer)
+            #Give the close frame a moment to go out
+            await asyncio.sleep(0)
+            sender.cancel()
+
+    async def handle(self, reader, writer):
+        """ Handle one connection, a snapshot request or a WebSocket viewer """
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+            if len(head) > MAX_HEAD:
+                return
+            lines = head.decode('latin-1').split('\r\n')
+            method, path = lines[0].split(' ')[:2]
+            headers = {}
+            for line in lines[1:]:
+                if ':' in line:
+                    name, value = line.split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+            path = path.split('?')[0]
+            if path == '/live' and headers.get('upgrade', '').lower() == 'websocket':
+                await self._websocket(reader, writer, headers)
+            elif method == 'GET' and path in self.snapshots:
+                writer.write(self.snapshots[path])
+                await writer.drain()
+            else:
+                writer.write(_response('404 Not Found', b'{"error": "not found"}'))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError,
+                ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        """ Start following the log and serve until cancelled """
+        self._loop = asyncio.get_running_loop()
+        thread = threading.Thread(target=self._ingest, name='live-ingest', daemon=True)
+        thread.start()
+        server = await asyncio.start_server(self.handle, self.host, self.port, limit=MAX_HEAD)
+        log.info("Serving the scoreboard of {f} on {h}:{p}", f=self.logfile, h=self.host,
+                 p=self.port)
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        """ Serve until interrupted """
+        asyncio.run(self.serve())
@@ -1,7 +1,11 @@
 """ All the class models for the objects we need to represent the games """
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
 from enum import Enum, auto
-from logbook import Logger
-from . helpers import get_datetime
+from itertools import islice
+from sys import intern
+from . helpers import get_datetime, get_epoch, get_logger
 
 class State(Enum):
     """ Enumerate the state a game can be in """
@@ -10,23 +14,184 @@ class State(Enum):
     CRASHED = auto()
     ABORTED = auto()
 
+class Action(Mapping):
+    """ Compact record of something that happened, reads like the action dict it replaces
+    (action['player'], action.get('killed_by'), len(action)) but only has slots for
+    the fields of its own type and the type name is shared by the class """
+    __slots__ = ()
+    action = None
+    #Fields with names and values that repeat in every game, they share one string object
+    interned = ('player', 'killed_by', 'reason', 'team', 'mode', 'version', 'uuid',
+                'ipaddress', 'color')
+
+    def __init__(self, **fields):
+        for key, value in fields.items():
+            if key in self.interned and isinstance(value, str):
+                value = intern(value)
+            elif key == 'players':
+                value = [intern(player) for player in value]
+            setattr(self, key, value)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __getitem__(self, key):
+        if key == 'action':
+            return self.action
+        if key in self.__slots__:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield 'action'
+        for key in self.__slots__:
+            if hasattr(self, key):
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_json(self):
+        """ Return the action as an JSON object """
+        data = dict(self)
+        if 'players' in data:
+            data['players'] = list(data['players'])
+        return data
+
+    @staticmethod
+    def from_json(data):
+        """ Create the right action record from an JSON object """
+        fields = dict(data)
+        return ACTION_TYPES[fields.pop('action')](**fields)
+
+class ServerStart(Action):
+    """ The server started, this is where a game begins """
+    __slots__ = ('timestamp', 'version')
+    action = 'server_start'
+
+class ServerStop(Action):
+    """ The server was stopped """
+    __slots__ = ('timestamp',)
+    action = 'server_stop'
+
+class ServerCrash(Action):
+    """ The server crashed """
+    __slots__ = ('timestamp',)
+    action = 'server_crash'
+
+class Death(Action):
+    """ A player died, killed_by is only set when someone or something did it """
+    __slots__ = ('timestamp', 'player', 'reason', 'killed_by')
+    action = 'death'
+
+class GameStart(Action):
+    """ The world border started shrinking """
+    __slots__ = ('timestamp', 'end_blocks', 'start_blocks', 'seconds')
+    action = 'game_start'
+
+class PlayerMode(Action):
+    """ A players game mode changed """
+    __slots__ = ('timestamp', 'player', 'mode')
+    action = 'player_mode'
+
+class TeamColor(Action):
+    """ A team got a color """
+    __slots__ = ('timestamp', 'team', 'color')
+    action = 'team_color'
+
+class TeamMembers(Action):
+    """ Players was added to a team """
+    __slots__ = ('timestamp', 'team', 'players')
+    action = 'team_members'
+
+class PlayerJoin(Action):
+    """ A player joined with their uuid """
+    __slots__ = ('timestamp', 'player', 'uuid')
+    action = 'player_join'
+
+class PlayerIp(Action):
+    """ A player logged in from an ip address """
+    __slots__ = ('timestamp', 'player', 'ipaddress')
+    action = 'player_ip'
+
+class TeamWin(Action):
+    """ The team left standing and all its players """
+    __slots__ = ('team', 'players')
+    action = 'team_win'
+
+class Survivors(Action):
+    """ The players alive at the end of the game """
+    __slots__ = ('players',)
+    action = 'survivors'
+
+#Action type name to record class
+ACTION_TYPES = {action_type.action: action_type for action_type in Action.__subclasses__()}
+#Version of the JSON objects made by Game.to_json
+JSON_SCHEMA = 1
+#The actions that count towards the highscore
+SCORING = frozenset(['death', 'team_win', 'survivors'])
+
+class TimeIndex(object):
+    """ The actions of a game log that have a timestamp, sorted by their time in seconds
+    from the start of the game so the actions in a time range are found by binary search """
+    def __init__(self, actions, start):
+        timed = [(get_epoch(action['timestamp']) - start, action) for action in actions
+                 if action.get('timestamp') is not None]
+        #A stable sort, actions in the same second stay in log order
+        timed.sort(key=lambda entry: entry[0])
+        self.size = len(actions)
+        self.offsets = array('q', [offset for offset, _ in timed])
+        self.actions = [action for _, action in timed]
+
+    def __repr__(self):
+        return "<TimeIndex {n} actions>".format(n=len(self.actions))
+
+    def __len__(self):
+        return len(self.actions)
+
+    def between(self, start=None, end=None, action=None):
+        """ The actions from start to end seconds into the game (end not included), only
+        actions of the type action if given. Returns a list of (offset, action) """
+        first = 0 if start is None else bisect_left(self.offsets, start)
+        last = len(self.offsets) if end is None else bisect_left(self.offsets, end)
+        return [(self.offsets[index], self.actions[index]) for index in range(first, last)
+                if action is None or self.actions[index]['action'] == action]
+
 class Game(object):
-    """ Simple container for calculating game stuff like players, teams, winners """
-    def __init__(self, start_action):
+    """ Simple container for calculating game stuff like players, teams, winners
+    scoring_only only keeps the actions that count towards the highscore in the log and
+    keep_stop_log saves what happens after the game is decided """
+    log = get_logger('Game')
+
+    def __init__(self, start_action, scoring_only=False, keep_stop_log=True):
         self.sid = get_datetime(start_action['timestamp'])
         self._log = [start_action]
         self.mc_version = start_action['version']
+        self.scoring_only = scoring_only
+        self.keep_stop_log = keep_stop_log
         self._stop_log = []
         self.stopped = False
         self.game_started = None
         self.game_info = {}
         self._teams = {}
-        self._players = []
+        self._players = {}
         self._deaths = []
         self._player_info = {}
-        self.log = Logger('Game '+start_action['timestamp'])
+        #Incremental state for finding the winner, players with both uuid and team set,
+        #the players that died and how many playing players each team has alive
+        self._playing = set()
+        self._dead = set()
+        self._alive_teams = {}
         self._state = State.STARTED
         self.winning_team = None
+        #Set when an action failed in this game and was quarantined
+        self.inconsistent = False
+        #(logfile, byte offset) of the line the game started on, when the parse knows it
+        self.position = None
+        self._time_index = None
 
     def __repr__(self):
         return "<Game {start}>".format(start=self.sid.isoformat())
@@ -43,7 +208,7 @@ class Game(object):
 
     def game_start(self, action):
         """ The game is ON! """
-        self._players = [player for player in self.get_playing_players()]
+        self._players = dict.fromkeys(self.get_playing_players())
         self.game_started = len(self._log)
         self.game_info = action
 
@@ -51,10 +216,11 @@ class Game(object):
         """ Add an action to the log if active game, else save it for prosperity """
         if not self.stopped:
             #save the action to the general log
-            self._log.append(action)
+            if not self.scoring_only or action['action'] in SCORING:
+                self._log.append(action)
             #check if this did something to alter state
             self.check_action(action)
-        else:
+        elif self.keep_stop_log:
             self._stop_log.append(action)
 
     def check_action(self, action):
@@ -69,41 +235,41 @@ class Game(object):
         """ Someone did something that should be counted as a score """
         #Not kill
         if len(action) < 5:
-            self.log.debug("Player {p} died reason {r} "
-                           .format(p=action['player'], r=action['reason']))
+            self.log.debug("Player {p} died reason {r} ",
+                           p=action['player'], r=action['reason'])
         else:
             #killed
-            self.log.debug("Player {p} was killed by {p2} "
-                           .format(p=action['player'], p2=action['killed_by']))
+            self.log.debug("Player {p} was killed by {p2} ",
+                           p=action['player'], p2=action['killed_by'])
         self._deaths.append(action['player'])
+        if action['player'] not in self._dead:
+            self._dead.add(action['player'])
+            if action['player'] in self._playing:
+                self._count_alive(self._player_info[action['player']]['team'], -1)
         #Was this the winning move?
         self.check_for_winner()
 
     def player_mode(self, action):
         """ Handle a player mode change """
-        self.log.debug("Player {p} mode changed: {m}"
-                       .format(p=action['player'], m=action['mode']))
+        self.log.debug("Player {p} mode changed: {m}",
+                       p=action['player'], m=action['mode'])
         if action['mode'] == 'Survival':
             if action['player'] not in self._players:
-                self._players.append(action['player'])
+                self._players[action['player']] = None
         else:
             if action['player'] in self._players and not self.stopped:
-                self._players.remove(action['player'])
+                del self._players[action['player']]
 
     def player_join(self, action):
         """ Register player when someone joins """
-        self.log.debug("Player {p} joined game {g}"
-                       .format(p=action['player'], g=self))
-        player = self._player_info.get(action['player'])
-        if player is not None:
-            player['uuid'] = action['uuid']
-        else:
-            self._player_info[action['player']] = {'uuid': action['uuid']}
+        self.log.debug("Player {p} joined game {g}",
+                       p=action['player'], g=self)
+        self._update_player(action['player'], 'uuid', action['uuid'])
 
     def player_ip(self, action):
         """ Sets a players ip address """
-        self.log.debug("Player {p} have ip-address {ip}"
-                       .format(p=action['player'], ip=action['ipaddress']))
+        self.log.debug("Player {p} have ip-address {ip}",
+                       p=action['player'], ip=action['ipaddress'])
         player = self._player_info.get(action['player'])
         player = {**player, **{'ipaddress': action['ipaddress']}}
         #unnessary assignment?
@@ -112,40 +278,64 @@ class Game(object):
     def team_members(self, action):
         """ Set team info on players """
         for player in action['players']:
-            g_player = self._player_info.get(player)
-            if g_player is not None:
-                g_player['team'] = action['team']
-            else:
-                self._player_info[player] = {'team': action['team']}
+            self._update_player(player, 'team', action['team'])
+            self.log.debug("Player {p} in team {team}",
+                           p=player, team=action['team'])
+
+    def _count_alive(self, team, change):
+        """ Change the number of alive players in a team, only teams with someone alive are kept """
+        alive = self._alive_teams.get(team, 0) + change
+        if alive > 0:
+            self._alive_teams[team] = alive
+        else:
+            self._alive_teams.pop(team, None)
+
+    def _update_player(self, player, key, value):
+        """ Set info on a player and keep the playing players and alive teams up to date """
+        info = self._player_info.get(player)
+        if info is None:
+            info = self._player_info[player] = {}
+        if player in self._playing:
+            self._playing.discard(player)
+            if player not in self._dead:
+                self._count_alive(info['team'], -1)
+        info[key] = value
+        if info.get('uuid') is not None and info.get('team') is not None:
+            self._playing.add(player)
+            if player not in self._dead:
+                self._count_alive(info['team'], 1)
 
-            self.log.debug("Player {p} in team {team}"
-                           .format(p=player, team=action['team']))
+    def _count_players(self):
+        """ Work out the playing players and alive teams from scratch """
+        self._playing = set()
+        self._dead = set(self._deaths)
+        self._alive_teams = {}
+        for player in self.get_playing_players():
+            self._playing.add(player)
+            if player not in self._dead:
+                self._count_alive(self._player_info[player]['team'], 1)
 
     def check_for_winner(self):
         """ Check the info if we only have one team left (and the winners!) """
-        #just loop through all players and see if they belong to the same team
-        t_players = [player for player in self.get_playing_players()]
-        if len(t_players) < 3:
+        if len(self._playing) < 3:
             #Not a valid game, can't decide on a winner.
             self.stopped = True
             self.state = State.ABORTED
             return
-        team = None
-        players = set(t_players) - set(self._deaths)
-        for player in players:
-            if team is not None:
-                if team != self._player_info[player]['team']:
-                    #We do not have a winner, more teams still alive
-                    return
-            else:
-                team = self._player_info[player]['team']
+        if len(self._alive_teams) > 1:
+            #We do not have a winner, more teams still alive
+            return
         #If we get here, all remaining players are on the same team
+        team = next(iter(self._alive_teams), None)
         tm_pl = []
+        players = []
         for player in self.get_playing_players():
             if self._player_info[player]['team'] == team:
                 tm_pl.append(player)
-        self._log.append({'action':'team_win', 'team': team, 'players': tm_pl})
-        self._log.append({'action':'survivors', 'players': list(players)})
+            if player not in self._dead:
+                players.append(player)
+        self._log.append(TeamWin(team=team, players=tm_pl))
+        self._log.append(Survivors(players=players))
         self.stopped = True
         self.state = State.STOPPED
         self.winning_team = team
@@ -159,7 +349,73 @@ class Game(object):
 
     def to_json(self):
         """ Return the game as an JSON object """
-        raise NotImplementedError
+        return {'schema': JSON_SCHEMA,
+                'sid': self.sid.isoformat(),
+                'state': self._state.name,
+                'mc_version': self.mc_version,
+                'stopped': self.stopped,
+                'game_started': self.game_started,
+                'game_info': dict(self.game_info),
+                'winning_team': self.winning_team,
+                'inconsistent': self.inconsistent,
+                'scoring_only': self.scoring_only,
+                'keep_stop_log': self.keep_stop_log,
+                'players': list(self._players),
+                'deaths': list(self._deaths),
+                'player_info': self._player_info,
+                'log': [action.to_json() for action in self._log],
+                'stop_log': [action.to_json() for action in self._stop_log]}
+
+    @classmethod
+    def from_json(cls, data):
+        """ Create a game from an JSON object made by to_json """
+        if data.get('schema') != JSON_SCHEMA:
+            raise ValueError("Unknown game schema {s}".format(s=data.get('schema')))
+        log = [Action.from_json(action) for action in data['log']]
+        game = cls(log[0], data['scoring_only'], data['keep_stop_log'])
+        game._log = log
+        game._stop_log = [Action.from_json(action) for action in data['stop_log']]
+        game.stopped = data['stopped']
+        game.game_started = data['game_started']
+        if data['game_info']:
+            game.game_info = Action.from_json(data['game_info'])
+        game.winning_team = data['winning_team']
+        game.inconsistent = data.get('inconsistent', False)
+        game._players = dict.fromkeys(data['players'])
+        game._deaths = data['deaths']
+        game._player_info = data['player_info']
+        game._state = State[data['state']]
+        game._count_players()
+        return game
+
+    @property
+    def start_epoch(self):
+        """ Epoch seconds of the server start this game began with """
+        return get_epoch(self._log[0]['timestamp'])
+
+    def offset(self, action):
+        """ Seconds from the start of the game to an action """
+        return get_epoch(action['timestamp']) - self.start_epoch
+
+    def time_index(self):
+        """ TimeIndex of the game log, built when first asked for and again when the log grew """
+        index = self._time_index
+        if index is None or index.size != len(self._log):
+            index = self._time_index = TimeIndex(self._log, self.start_epoch)
+        return index
+
+    def actions_between(self, start=None, end=None, action=None):
+        """ The actions from start to end seconds into the game, like the deaths in the
+        first ten minutes with actions_between(0, 600, 'death'). Returns (offset, action) """
+        return self.time_index().between(start, end, action)
+
+    def shrink_window(self):
+        """ Start and end in seconds into the game of the world border shrinking that
+        game_start began, None before game_start """
+        if not self.game_info:
+            return None
+        start = self.offset(self.game_info)
+        return start, start + int(self.game_info['seconds'])
 
     def get_actions(self):
         """ returns actions that we should count towards scoring """
@@ -188,12 +444,61 @@ class Store(object):
         """ The number of games in the store """
         return len(self._store)
 
+    @property
+    def final_count(self):
+        """ The number of games that can not change any more. Nothing in a log can change
+        a game once the next game has begun, so that is every game but the last """
+        return max(self.count - 1, 0)
+
+    def final_games(self, start=0):
+        """ The games that can not change any more, from the start:th game on """
+        return islice(self.all_items(), start, self.final_count)
+
+    def games_since(self, final):
+        """ The games that may have changed since final_count was final """
+        return islice(self.all_items(), final, None)
+
     def add(self, game):
         """ Add a game to the store """
         self._store.append(game)
 
+    def all_items(self):
+        """ Generator for returning every game in the store, whatever state it ended in """
+        for item in self._store:
+            yield item
+
     def items(self):
         """ Generator for returning the games in the store """
         for item in self._store:
             if item.state == State.STOPPED:
                 yield item
+
+class StreamStore(Store):
+    """ Store that only keeps the game being played. The final games (see final_count)
+    are moved to finished to be handed out by take() and are not kept after that """
+    def __init__(self):
+        super().__init__()
+        self.finished = []
+        self._count = 0
+
+    @property
+    def count(self):
+        """ The number of games seen so far """
+        return self._count
+
+    def add(self, game):
+        """ Add a game, the game before it is done """
+        self.finished.extend(self._store)
+        self._store = [game]
+        self._count += 1
+
+    def take(self):
+        """ The games that are done since the last call """
+        finished, self.finished = self.finished, []
+        return finished
+
+    def close(self):
+        """ The log ended, the last game is done too """
+        self.finished.extend(self._store)
+        self._store = []
+        return self.take()
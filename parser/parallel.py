@@ -0,0 +1,163 @@
+""" Parallel ingestion of many logfiles for UHC Parser
+Matching the lines is the expensive part and every file can be matched on its own,
+so that is done in a process pool. The actions are then handled in file order by
+the same handle_action state machine as a sequential parse, so games spanning a
+rotation (like a restart after a crash) are stitched together exactly the same way.
+
+A single huge log is cut into segments where a server starts and every segment is
+matched and played into games in a worker, see parse_split.
+"""
+import glob
+import mmap
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from . models import State, StreamStore
+from . parser import ParserSession, stream_games
+from . reader import OPENERS
+
+#Text of the line where a server starts, the only place a log can be cut into games
+SERVER_START = b'Starting minecraft server version '
+#Segments per process, more than one so a segment with a long game does not hold up the rest
+SEGMENTS_PER_PROCESS = 4
+#Rotated server logs are named like 2017-03-01-2.log.gz
+ROTATED = re.compile(r'(\d+-\d+-\d+)-(\d+)\.log')
+LOG_SUFFIXES = ('.log', '.log.gz', '.log.xz', '.log.bz2')
+
+def _order(path):
+    """ Sort key putting rotated logs in date and number order and latest.log last """
+    match = ROTATED.search(os.path.basename(path))
+    if match:
+        return (0, match.group(1), int(match.group(2)), path)
+    return (1, '', 0, path)
+
+def log_files(source):
+    """ Returns the logfiles in a directory or matching a glob, oldest first """
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)
+                 if name.endswith(LOG_SUFFIXES)]
+    else:
+        paths = glob.glob(source)
+    return sorted(paths, key=_order)
+
+def match_file(logfile, actions, legacy=False, offsets=False):
+    """ Returns all actions in a logfile, this is what runs in the worker processes
+    With offsets it returns (offset, action) with the byte offset of the line """
+    #Nothing is handled here, so every pattern has to run
+    session = ParserSession(actions=actions, legacy=legacy, prune=False)
+    return list(session.match_file(logfile, offsets=offsets))
+
+def _handled_actions(source, processes, session, dedup):
+    """ Generator for the (action, position) pairs of all logfiles in file order
+    Only a few files more than there are processes are matched ahead of the one being
+    handled, so a slow consumer does not pile up the actions of every file """
+    files = log_files(source)
+    if dedup is not None:
+        files = [logfile for logfile in dedup.order(files) if dedup.new_file(logfile)]
+    #The line of a failed action is only needed for the quarantine
+    offsets = session.quarantine is not None
+    ahead = 2 * (processes or os.cpu_count() or 1)
+    with ProcessPoolExecutor(processes) as pool:
+        pending = deque()
+        for logfile in files:
+            pending.append((logfile, pool.submit(match_file, logfile, session.actions,
+                                                 session.legacy, offsets)))
+            if len(pending) >= ahead:
+                first, actions = pending.popleft()
+                yield from _positioned(first, actions.result(), offsets, dedup)
+        while pending:
+            first, actions = pending.popleft()
+            yield from _positioned(first, actions.result(), offsets, dedup)
+
+def _positioned(logfile, actions, offsets, dedup):
+    """ The matched actions of a logfile as (action, position), without duplicates """
+    if not offsets:
+        actions = ((None, action) for action in actions)
+    for offset, action in actions:
+        if dedup is None or dedup.is_new(action):
+            yield action, (logfile, offset)
+
+def parse_files(source, processes=None, legacy=False, session=None, dedup=None):
+    """ Parse all logfiles in a directory or glob into the store of one session
+    processes is the size of the process pool, defaults to the number of cores.
+    With a dedup.Deduplicator the sources are read in the order they start, copies of a
+    file are skipped and actions already handled from another source are dropped """
+    if session is None:
+        session = ParserSession(legacy=legacy)
+    for action, position in _handled_actions(source, processes, session, dedup):
+        session.handle_action(action, position)
+    return session.store
+
+def iter_files(source, processes=None, legacy=False, session=None, dedup=None):
+    """ Like parse_files but yields every game as soon as it is done instead of keeping
+    them in a store, see parser.iter_games. A given session needs a StreamStore """
+    if session is None:
+        session = ParserSession(store=StreamStore(), legacy=legacy)
+    return stream_games(session, _handled_actions(source, processes, session, dedup))
+
+def split_points(logfile, parts):
+    """ Byte offsets of the lines where a server starts that cut a plain logfile into
+    about parts segments of the same size, found by searching the raw bytes """
+    size = os.path.getsize(logfile)
+    if size == 0:
+        return [0, 0]
+    points = [0]
+    with open(logfile, 'rb') as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        for part in range(1, parts):
+            pos = buffer.find(SERVER_START, max(size * part // parts, points[-1] + 1))
+            if pos == -1:
+                break
+            first = buffer.rfind(b'\n', 0, pos) + 1
+            if first > points[-1]:
+                points.append(first)
+    points.append(size)
+    return points
+
+def parse_segment(logfile, start, end, actions, legacy=False, game_options=None):
+    """ Play the actions from start to end in a logfile into games, this is what runs in
+    the worker processes. Returns (games, True if the first action started a server) """
+    session = ParserSession(actions=actions, legacy=legacy, **(game_options or {}))
+    first = None
+    for action in session.match_file(logfile, start, end=end):
+        if first is None:
+            first = action['action']
+        session.handle_action(action)
+    return list(session.store.all_items()), first == 'server_start'
+
+def parse_split(logfile, processes=None, legacy=False, session=None):
+    """ Parse one huge logfile in parallel by cutting it where servers start
+    Every segment is played into games on its own, then the segments are put together in
+    order with the rules handle_action has for a server start: a game left STARTED is
+    ABORTED, and a segment following a CRASHED game (or not starting with a server
+    start) is played again on top of the games before it, like a sequential parse would.
+    The store ends up the same as session.parse(logfile). Compressed logs can not be cut
+    without reading them, they are parsed sequentially """
+    if session is None:
+        session = ParserSession(legacy=legacy)
+    if session.quarantine is not None or session.profile is not None:
+        raise ValueError("parse_split does not support a quarantine or a profile")
+    if os.path.splitext(logfile)[1] in OPENERS:
+        return session.parse(logfile)
+    points = split_points(logfile, SEGMENTS_PER_PROCESS * (processes or os.cpu_count() or 1))
+    segments = list(zip(points, points[1:]))
+    store = session.store
+    with ProcessPoolExecutor(processes) as pool:
+        results = pool.map(parse_segment, [logfile] * len(segments),
+                           [start for start, _ in segments], [end for _, end in segments],
+                           [session.actions] * len(segments),
+                           [session.legacy] * len(segments),
+                           [session.game_options] * len(segments))
+        for (start, end), (games, server_start) in zip(segments, results):
+            last = store.last
+            if last is not None and (last.state == State.CRASHED or not server_start):
+                for action in session.match_file(logfile, start, end=end):
+                    session.handle_action(action)
+                continue
+            if last is not None and last.state == State.STARTED:
+                last.state = State.ABORTED
+            for game in games:
+                store.add(game)
+    return store
@@ -1,11 +1,14 @@
 """ Parser module for UHC Parser
 Here we have everything converting the logfile into actions based on
-regular expressions, it calls a function that will return an 'action dict'
+regular expressions, it calls a function that will return an action record
+that reads like an 'action dict'
 """
-import re
-from logbook import Logger
 
-from . models import State, Game, Store
+from . models import (State, Game, Store, StreamStore, Death, GameStart, PlayerMode, TeamColor,
+                      TeamMembers, ServerStart, ServerStop, ServerCrash, PlayerJoin, PlayerIp)
+from . helpers import get_logger
+from . reader import read_lines
+from . patterns import PatternRegistry, compile_keywords
 __ALL__ = [
     "death",
     "game_start",
@@ -17,209 +20,388 @@ __ALL__ = [
     "server_crash",
     "player_join",
     "player_ip",
+    "match_line",
+    "legacy_match_line",
+    "handle_action",
+    "ParserSession",
     "parse"
 ]
 
-GAME_STORE = Store()
-
 def death(data, reason=None):
     """ Creates a action log entry for a players death """
-    action = {'action': 'death', 'player': data[1], 'timestamp':data[0], 'reason': reason}
     if len(data) > 2:
-        action['killed_by'] = data[2]
-    return action
+        return Death(timestamp=data[0], player=data[1], reason=reason, killed_by=data[2])
+    return Death(timestamp=data[0], player=data[1], reason=reason)
 
 def game_start(data):
     """ Creates an action log entry for game start"""
-    action = {'action': 'game_start',
-              'timestamp': data[0],
-              'end_blocks': data[1],
-              'start_blocks': data[2],
-              'seconds': data[3]}
-    return action
+    return GameStart(timestamp=data[0],
+                     end_blocks=data[1],
+                     start_blocks=data[2],
+                     seconds=data[3])
 
 def player_mode(data):
     """ Creates an action log entry when players mode changes """
-    action = {'action': 'player_mode',
-              'timestamp': data[0],
-              'player': data[1],
-              'mode': data[2]}
-    return action
+    return PlayerMode(timestamp=data[0],
+                      player=data[1],
+                      mode=data[2])
 
 def team_color(data):
     """ Creates an action log entry for team color """
-    action = {'action': 'team_color',
-              'timestamp': data[0],
-              'team': data[1],
-              'color': data[2]}
-    return action
+    return TeamColor(timestamp=data[0],
+                     team=data[1],
+                     color=data[2])
 
 def team_members(data):
     """ Creates an action log entry for team creation and member assigment"""
-    action = {'action': 'team_members',
-              'timestamp': data[0],
-              'team': data[1]}
     players = []
     for player in data[2].split(' '):
         if 'and' in player:
             continue
         players.append(player.rstrip(','))
-    action['players'] = players
-    return action
+    return TeamMembers(timestamp=data[0],
+                       team=data[1],
+                       players=players)
 
 def server_start(data):
     """ Create an action log entry for server start """
-    action = {'action': 'server_start',
-              'timestamp': data[0],
-              'version': data[1]}
-    return action
+    return ServerStart(timestamp=data[0],
+                       version=data[1])
 
 def server_stop(data):
     """ Create an action log entry for server stop """
-    action = {'action': 'server_stop',
-              'timestamp': data[0]}
-
-    return action
+    return ServerStop(timestamp=data[0])
 
 def server_crash(data):
     """ Create an action log entry for server crash """
-    action = {'action': 'server_crash',
-              'timestamp': data[0],}
-    return action
+    return ServerCrash(timestamp=data[0])
 
 def player_join(data):
     """ Create an action log entry for when a player joins """
-    action = {'action':'player_join',
-              'timestamp': data[0],
-              'player': data[1],
-              'uuid': data[2]}
-    return action
+    return PlayerJoin(timestamp=data[0],
+                      player=data[1],
+                      uuid=data[2])
 
 def player_ip(data):
     """ Create an action log entry for a players ip address """
-    action = {'action':'player_ip',
-              'timestamp': data[0],
-              'player': data[1],
-              'ipaddress': data[2]}
-    return action
-
-#Big list of regexes and the function we want to apply to it for formatting the data back
-ACTIONS = [(re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] '
-                       r'(?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1}'
-                       r' was slain by '
-                       r'(?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1}'), death, 'slain'),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] '
-                       r'(?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1}'
-                       r' was shot by '
-                       r'(?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1}'), death, 'shot'),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] '
-                       r'(?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1}'
-                       r' blew up'), death, 'blew_up'),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] '
-                       r'(?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1}'
-                       r' was blown up by '
-                       r'(?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1}'), death, 'blown_up'),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] '
-                       r'(?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1}'
-                       r' suffocated in a wall'), death, 'suffocated_wall'),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] '
-                       r'(?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1}'
-                       r' fell from a high place'), death, 'fell'),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] '
-                       r'(?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1}'
-                       r' burned to death'), death, 'burned'),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] '
-                       r'(?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1}'
-                       r' was burnt to a crisp whilst fighting '
-                       r'(?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1}'), death, 'burned_fighting'),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] '
-                       r'(?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1}'
-                       r' drowned'), death, 'drowned'),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] '
-                       r'(?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1}'
-                       r' tried to swim in lava'), death, 'lava'),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+)'
-                       r' \[INFO\] (?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1} '
-                       r'tried to swim in lava to escape (?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1}'),
-            death, 'lava_escape'),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] '
-                       r'(?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1}'
-                       r' hit the ground too hard'), death, 'fell_hit'),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] Shrinking world border to '
-                       r'(\d+.\d) blocks wide '
-                       r'\(down from (\d+.\d) blocks\) over (\d+) seconds'), game_start),
-           (re.compile(r"(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] \[\w+: Set (\w+)'s"
-                       r" game mode to (\w+) Mode\]"), player_mode),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] \[(\w+): Set own '
-                       r'game mode to (\w+) Mode\]'), player_mode),
-           (re.compile(r"(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] Set (\w+)'s "
-                       r"game mode to (\w+) Mode"), player_mode),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] UUID of player (?P<player>.*) '
-                       r'is (?P<uuid>.*)'), player_join),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] (?P<player>.*)\[/(?P<ip>.*):\d+\]'
-                       r' logged in'), player_ip),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] Set option color'
-                       r' for team (?P<team>\w+) to (?P<color>\w+)'), team_color),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] Added \d player\(s\)'
-                       r' to team (?P<team>\w+): (?P<members>.*)'), team_members),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] Could not add \d player\(s\) '
-                       r'to team (?P<team>\w+): (?P<members>.*)'), team_members),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] \[(?:\w+): '
-                       r'Added \d player\(s\) to team (?P<team>\w+): '
-                       r'(?P<members>.*)\]'), team_members),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] '
-                       r'Starting minecraft server version (.*)'), server_start),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\]'
-                       r' .*Stopping the server.*'), server_stop),
-           (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[ERROR\] This crash report has been saved to:'),
-            server_crash)]
-
-
-def handle_action(action):
+    return PlayerIp(timestamp=data[0],
+                    player=data[1],
+                    ipaddress=data[2])
+
+#The actions that can change anything while no game is being played
+LIFECYCLE = (server_start, server_stop, server_crash)
+
+#All patterns turning loglines into actions, plugins and config files can add more.
+#Every entry becomes (regex, function, death reason, keyword) where keyword is a piece of
+#literal text the line must contain for the regex to be able to match at all
+REGISTRY = PatternRegistry({'death': death,
+                            'game_start': game_start,
+                            'player_mode': player_mode,
+                            'team_color': team_color,
+                            'team_members': team_members,
+                            'server_start': server_start,
+                            'server_stop': server_stop,
+                            'server_crash': server_crash,
+                            'player_join': player_join,
+                            'player_ip': player_ip})
+REGISTRY.register_death(' was slain by ', 'slain', killer=True)
+REGISTRY.register_death(' was shot by ', 'shot', killer=True)
+REGISTRY.register_death(' blew up', 'blew_up')
+REGISTRY.register_death(' was blown up by ', 'blown_up', killer=True)
+REGISTRY.register_death(' suffocated in a wall', 'suffocated_wall')
+REGISTRY.register_death(' fell from a high place', 'fell')
+REGISTRY.register_death(' burned to death', 'burned')
+REGISTRY.register_death(' was burnt to a crisp whilst fighting ', 'burned_fighting', killer=True)
+REGISTRY.register_death(' drowned', 'drowned')
+REGISTRY.register_death(' tried to swim in lava', 'lava')
+REGISTRY.register_death(' tried to swim in lava to escape ', 'lava_escape', killer=True)
+REGISTRY.register_death(' hit the ground too hard', 'fell_hit')
+REGISTRY.register(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] Shrinking world border to '
+                  r'(\d+.\d) blocks wide '
+                  r'\(down from (\d+.\d) blocks\) over (\d+) seconds', 'game_start',
+                  'Shrinking world border to ')
+REGISTRY.register(r"(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] \[\w+: Set (\w+)'s"
+                  r" game mode to (\w+) Mode\]", 'player_mode',
+                  "'s game mode to ")
+REGISTRY.register(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] \[(\w+): Set own '
+                  r'game mode to (\w+) Mode\]', 'player_mode',
+                  ': Set own game mode to ')
+REGISTRY.register(r"(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] Set (\w+)'s "
+                  r"game mode to (\w+) Mode", 'player_mode',
+                  "'s game mode to ")
+REGISTRY.register(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] UUID of player (?P<player>.*) '
+                  r'is (?P<uuid>.*)', 'player_join',
+                  'UUID of player ')
+REGISTRY.register(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] (?P<player>.*)\[/(?P<ip>.*):\d+\]'
+                  r' logged in', 'player_ip',
+                  '] logged in')
+REGISTRY.register(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] Set option color'
+                  r' for team (?P<team>\w+) to (?P<color>\w+)', 'team_color',
+                  'Set option color for team ')
+REGISTRY.register(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] Added \d player\(s\)'
+                  r' to team (?P<team>\w+): (?P<members>.*)', 'team_members',
+                  ' player(s) to team ')
+REGISTRY.register(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] Could not add \d player\(s\) '
+                  r'to team (?P<team>\w+): (?P<members>.*)', 'team_members',
+                  ' player(s) to team ')
+REGISTRY.register(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] \[(?:\w+): '
+                  r'Added \d player\(s\) to team (?P<team>\w+): '
+                  r'(?P<members>.*)\]', 'team_members',
+                  ' player(s) to team ')
+REGISTRY.register(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] '
+                  r'Starting minecraft server version (.*)', 'server_start',
+                  'Starting minecraft server version ')
+REGISTRY.register(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\]'
+                  r' .*Stopping the server.*', 'server_stop',
+                  'Stopping the server')
+REGISTRY.register(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[ERROR\] This crash report has been saved to:',
+                  'server_crash',
+                  '[ERROR] This crash report has been saved to:')
+
+def __getattr__(name):
+    """ ACTIONS, KEYWORDS and KEYWORD_BYTES are compiled from the registry when first used """
+    if name == 'ACTIONS':
+        return REGISTRY.actions()
+    if name == 'KEYWORDS':
+        return REGISTRY.keywords()[0]
+    if name == 'KEYWORD_BYTES':
+        return REGISTRY.keywords()[1]
+    raise AttributeError("module {m} has no attribute {n}".format(m=__name__, n=name))
+
+LOG = get_logger('handle_action')
+
+
+def build_action(match, action):
+    """ Format the match of a pattern in the action table to an action record """
+    if action[1] == death:
+        #if it is the death, include how death happend
+        return action[1](match.groups(), action[2])
+    return action[1](match.groups())
+
+def match_line(line, actions=None, keywords=None):
+    """ Return all actions in a logline, only runs the patterns whose keyword is in the line
+    actions defaults to the registry, keywords to the compile_keywords of actions """
+    if actions is None:
+        actions = REGISTRY.actions()
+        keywords = keywords or REGISTRY.keywords()[0]
+    elif keywords is None:
+        keywords = compile_keywords(actions)[0]
+    if keywords.search(line) is None:
+        return []
+    matched = []
+    for action in actions:
+        if action[3] in line:
+            match = action[0].search(line)
+            if match:
+                matched.append(build_action(match, action))
+    return matched
+
+def legacy_match_line(line, actions=None):
+    """ Return all actions in a logline by running every pattern in the registry on it """
+    if actions is None:
+        actions = REGISTRY.actions()
+    matched = []
+    for action in actions:
+        match = action[0].search(line)
+        if match:
+            matched.append(build_action(match, action))
+    return matched
+
+def handle_action(action, store, log=LOG, game_options=None):
     """ Handles the action we matched, checks to see if should create/stop a game
-    else adds it to an existing game for evaluation """
+    else adds it to an existing game for evaluation.
+    game_options are passed on to every new Game """
     #Check if the server did something we need to handle
     #like start, stop or crashed
-    log = Logger('handle_action')
     if action['action'] == 'server_start':
-        if GAME_STORE.last is not None:
-            if GAME_STORE.last.state == State.CRASHED:
-                GAME_STORE.last.add_action(action)
-                log.debug("Game {g} crashed, continuing with same game"
-                          .format(g=GAME_STORE.last.sid))
+        if store.last is not None:
+            if store.last.state == State.CRASHED:
+                store.last.add_action(action)
+                log.debug("Game {g} crashed, continuing with same game",
+                          g=store.last.sid)
                 return
-            elif GAME_STORE.last.state == State.STARTED:
+            elif store.last.state == State.STARTED:
                 # Mark the last game as aborted since we will start a new one
-                GAME_STORE.last.state = State.ABORTED
-        GAME_STORE.add(Game(action))
-        log.debug("Created new game {g}".format(g=GAME_STORE.last.sid))
+                store.last.state = State.ABORTED
+        store.add(Game(action, **(game_options or {})))
+        log.debug("Created new game {g}", g=store.last.sid)
     elif action['action'] == 'server_stop':
-        if GAME_STORE.last is None:
+        if store.last is None:
             return
-        if GAME_STORE.last.winning_team is not None:
-            GAME_STORE.last.state = State.STOPPED
+        if store.last.winning_team is not None:
+            store.last.state = State.STOPPED
         else:
-            GAME_STORE.last.state = State.ABORTED
-        log.debug("Stopped game {g}".format(g=GAME_STORE.last.sid))
+            store.last.state = State.ABORTED
+        log.debug("Stopped game {g}", g=store.last.sid)
     elif action['action'] == 'server_crash':
-        if GAME_STORE.last is not None:
-            GAME_STORE.last.state = State.CRASHED
-            log.info("Game {g} crashed".format(g=GAME_STORE.last.sid))
+        if store.last is not None:
+            store.last.state = State.CRASHED
+            log.info("Game {g} crashed", g=store.last.sid)
     else:
-        if GAME_STORE.last is not None:
-            GAME_STORE.last.add_action(action)
-
-def parse(logfile):
-    """ Parse the UHC server log file for entries """
-    with open(logfile, 'r') as file:
-        for line in file:
-            for action in ACTIONS:
-                match = action[0].search(line)
-                if match:
-                    if action[1] == death:
-                        #if it is the death, include how death happend
-                        data = action[1](match.groups(), action[2])
-                    else:
-                        data = action[1](match.groups())
-                    handle_action(data)
-    return GAME_STORE
+        if store.last is not None:
+            store.last.add_action(action)
+
+class ParserSession(object):
+    """ One parse with its own store, action table and logger
+    Sessions share nothing, so many of them can run side by side in threads or processes.
+    scoring_only and keep_stop_log are passed on to the games to save memory on long histories.
+    With a profile (see instrument.Profile) every pattern and handled action is counted and timed.
+    With a quarantine (see quarantine.Quarantine) an action that fails is quarantined and
+    the parse goes on, instead of the error stopping it.
+    With prune and without keep_stop_log match_file only runs the patterns that can change
+    the store in the state it is in (see _tier), so it must only be used when the actions
+    are handled as they are matched """
+    def __init__(self, store=None, actions=None, legacy=False, name='parser',
+                 scoring_only=False, keep_stop_log=True, profile=None, quarantine=None,
+                 prune=True):
+        self.store = Store() if store is None else store
+        if actions is None:
+            self.actions = REGISTRY.actions()
+            self.keywords, self.keyword_bytes = REGISTRY.keywords()
+        else:
+            self.actions = actions
+            self.keywords, self.keyword_bytes = compile_keywords(actions)
+        #legacy runs every pattern on every line, like we did before the keyword dispatch
+        self.legacy = legacy
+        self.log = get_logger(name)
+        self.game_options = {'scoring_only': scoring_only, 'keep_stop_log': keep_stop_log}
+        self.profile = profile
+        self.quarantine = quarantine
+        #In a game every pattern is needed, pruning only pays off when the games do not keep
+        #what happens after they are decided
+        self.prune = prune and not legacy and not keep_stop_log
+        #(actions, keywords, keyword bytes, index in actions) of the patterns to run while no
+        #game is being played and of all patterns
+        indexes = [index for index, action in enumerate(self.actions) if action[1] in LIFECYCLE]
+        lifecycle = [self.actions[index] for index in indexes]
+        self._lifecycle = (lifecycle,) + compile_keywords(lifecycle) + (indexes,)
+        self._everything = (self.actions, self.keywords, self.keyword_bytes, None)
+        self._current = self._everything
+
+    def __repr__(self):
+        return "<ParserSession {name}>".format(name=self.log.name)
+
+    def match_line(self, line):
+        """ Return all actions in a logline """
+        if self.profile is not None:
+            return self.profile.match_line(line, self.actions,
+                                           None if self.legacy else self.keywords)
+        if self.legacy:
+            return legacy_match_line(line, self.actions)
+        return match_line(line, self.actions, self.keywords)
+
+    def _tier(self):
+        """ The patterns that can change the store now. Outside a game (before the first
+        server start, or after the game is decided when the games do not keep what happens
+        after that) only starting, stopping and crashing the server does anything. In a
+        game every action is saved in its log, so every pattern is needed """
+        game = self.store.last
+        if game is None or (game.stopped and not game.keep_stop_log):
+            return self._lifecycle
+        return self._everything
+
+    def _tier_keywords(self):
+        """ The keyword bytes of the patterns that can change the store now, the reader
+        asks for them before every line so the tier is kept for matching that line """
+        self._current = self._tier()
+        return self._current[2]
+
+    def match_active(self, line):
+        """ Return the actions in a logline that can change the store now, only the
+        actions handled right after can be trusted to be complete (see prune) """
+        if not self.prune:
+            return self.match_line(line)
+        return self._match_tier(line, self._tier())
+
+    def _match_tier(self, line, tier):
+        """ Return the actions in a logline matching the patterns of a tier """
+        actions, keywords, _, indexes = tier
+        if indexes is None:
+            return self.match_line(line)
+        if self.profile is not None:
+            matched = self.profile.match_line(line, actions, keywords, indexes)
+        else:
+            matched = match_line(line, actions, keywords)
+        if matched:
+            #A game starts here, other actions in the same line count from now on
+            return self.match_line(line)
+        return matched
+
+    def match_file(self, logfile, start=0, offsets=False, end=None):
+        """ Generator for all actions in a logfile from the byte offset start to end
+        With offsets it yields (offset, action) with the byte offset of the line """
+        #Only lines with a keyword in them are decoded and matched
+        keywords = None if self.legacy else self.keyword_bytes
+        match = self.match_line
+        if self.prune:
+            keywords = self._tier_keywords
+            match = lambda line: self._match_tier(line, self._current)
+        for offset, line in read_lines(logfile, keywords, start, True, self.profile, end):
+            for action in match(line):
+                if offsets:
+                    yield offset, action
+                else:
+                    yield action
+
+    def _handle_action(self, action):
+        """ Handle the action with the handle_action state machine """
+        if self.profile is not None:
+            self.profile.handle_action(handle_action, action, self.store, self.log,
+                                       self.game_options)
+            return
+        handle_action(action, self.store, self.log, self.game_options)
+
+    def handle_action(self, action, position=None):
+        """ Let the action create, stop or alter the games in our store
+        position is the (logfile, byte offset) of the line, told to the quarantine """
+        if self.quarantine is None:
+            self._handle_action(action)
+            return
+        game = self.store.last
+        try:
+            self._handle_action(action)
+        except Exception as error:
+            entry = self.quarantine.add(action, error, game, position)
+            self.log.warning("Quarantined {a} from {f} line {l}: {e}", a=action['action'],
+                             f=entry['file'], l=entry['line'], e=entry['error'])
+        else:
+            self.quarantine.count(action)
+        if self.store.last is not game:
+            #Scoring only knows the game, so a failure then points at where it started
+            self.store.last.position = position
+
+    def parse(self, logfile):
+        """ Parse the UHC server log file into our store, see iter_games for a parse
+        that does not keep all games """
+        if self.quarantine is not None:
+            for offset, action in self.match_file(logfile, offsets=True):
+                self.handle_action(action, (logfile, offset))
+        else:
+            for action in self.match_file(logfile):
+                self.handle_action(action)
+        if self.profile is not None:
+            self.profile.count_games(self.store)
+        return self.store
+
+def parse(logfile, legacy=False, quarantine=None):
+    """ Parse the UHC server log file for entries, every call starts with an empty store """
+    return ParserSession(legacy=legacy, quarantine=quarantine).parse(logfile)
+
+def stream_games(session, actions):
+    """ Handle (action, position) pairs in a session with a StreamStore and yield every
+    game as soon as it is done, the games are not kept by the session """
+    store = session.store
+    for action, position in actions:
+        session.handle_action(action, position)
+        if store.finished:
+            yield from store.take()
+    yield from store.close()
+
+def iter_games(logfile, legacy=False, quarantine=None, session=None):
+    """ Generator for the games in a logfile, oldest first. A game is yielded when the
+    next game begins (or the log ends) and is then forgotten, so memory does not grow
+    with the length of the log. A given session needs a StreamStore """
+    if session is None:
+        session = ParserSession(store=StreamStore(), legacy=legacy, quarantine=quarantine)
+    return stream_games(session, ((action, (logfile, offset)) for offset, action
+                                  in session.match_file(logfile, offsets=True)))
@@ -0,0 +1,95 @@
+""" Pattern registry for UHC Parser
+The patterns turning loglines into actions are kept as text in a registry and only
+compiled the first time a parse asks for them, the compiled table is cached until a
+pattern is added. New death messages or the wording of another server version can be
+added by plugins (installed packages with an uhc_parser.patterns entry point, called
+with the registry) or by a JSON config file, see load().
+"""
+import json
+import re
+
+#Every pattern starts with the timestamp of the line
+TIMESTAMP = r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] '
+#Player names are sometimes written with colour codes around them
+PLAYER = r'(?:[§?][0-9a-z]){0,1}(\w+)(?:[§?]r){0,1}'
+#Entry point group for pattern plugins
+ENTRY_POINT = 'uhc_parser.patterns'
+
+def compile_keywords(actions):
+    """ Returns one combined automaton over all keywords in an action table, a line without
+    any of them can not match any pattern so we can skip it with a single scan.
+    Also returns the same keywords as bytes for searching raw data in the reader """
+    keywords = sorted({action[3] for action in actions}, key=len, reverse=True)
+    return (re.compile('|'.join(re.escape(keyword) for keyword in keywords)),
+            sorted(keyword.encode('utf-8') for keyword in keywords))
+
+class PatternRegistry(object):
+    """ Patterns and the builders making actions of their matches
+    builders maps action names (like 'death') to the function building that action """
+    def __init__(self, builders, plugins=True):
+        self.builders = builders
+        self.plugins = plugins
+        self._entries = []
+        self._actions = None
+        self._keywords = None
+
+    def __repr__(self):
+        return "<PatternRegistry {n} patterns>".format(n=len(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def register(self, pattern, action, keyword, reason=None):
+        """ Add a pattern for an action, keyword is literal text the line must contain
+        for the pattern to match and reason is passed on to death """
+        self._entries.append((pattern, self.builders[action], reason, keyword))
+        self._actions = None
+        self._keywords = None
+
+    def register_death(self, message, reason, killer=False):
+        """ Add a death message like ' was slain by ', with killer the name of the killer
+        comes after the message """
+        pattern = TIMESTAMP + PLAYER + re.escape(message)
+        if killer:
+            pattern += PLAYER
+        self.register(pattern, 'death', message, reason)
+
+    def load(self, path):
+        """ Add the patterns in a JSON config file, a list of objects like
+        {"death": " was killed by ", "reason": "killed", "killer": true} or
+        {"action": "player_mode", "pattern": "...", "keyword": "..."} """
+        with open(path) as file:
+            entries = json.load(file)
+        for entry in entries:
+            if 'death' in entry:
+                self.register_death(entry['death'], entry['reason'], entry.get('killer', False))
+            else:
+                self.register(entry['pattern'], entry['action'], entry['keyword'],
+                              entry.get('reason'))
+
+    def _load_plugins(self):
+        """ Let installed plugins add their patterns, only done once """
+        self.plugins = False
+        from importlib.metadata import entry_points
+        try:
+            plugins = entry_points(group=ENTRY_POINT)
+        except TypeError:
+            #Python before 3.10
+            plugins = entry_points().get(ENTRY_POINT, [])
+        for plugin in plugins:
+            plugin.load()(self)
+
+    def actions(self):
+        """ The compiled action table, a list of (regex, function, death reason, keyword) """
+        if self.plugins:
+            self._load_plugins()
+        if self._actions is None:
+            self._actions = [(re.compile(pattern), builder, reason, keyword)
+                             for pattern, builder, reason, keyword in self._entries]
+        return self._actions
+
+    def keywords(self):
+        """ compile_keywords of the action table, cached with it """
+        if self._keywords is None:
+            self._keywords = compile_keywords(self.actions())
+        return self._keywords
@@ -0,0 +1,136 @@
+""" Quarantine for UHC Parser
+In resilient mode an action that breaks the game it is handled in does not stop the
+parse. It is written to a side file (JSON Lines) with the file and line it came from
+and the error, the game it was handled in is marked inconsistent and the parse goes
+on with the next action. Counting a game into the highscore works the same way, an
+action that was handled but can not be scored is counted apart as unscored.
+
+Nothing extra is done for actions that go well except counting them, line numbers are
+only worked out for the actions that are quarantined.
+"""
+import json
+
+from . reader import open_log
+
+class Quarantine(object):
+    """ The actions that failed, written to path (if given) as they are found """
+    def __init__(self, path=None):
+        self.path = path
+        self.handled = {}
+        self.failed = {}
+        self.unscored = {}
+        self.errors = {}
+        self.games = set()
+        self.entries = 0
+        self._file = None
+        #Last (offset, line number) found in every logfile, so counting lines goes on from there
+        self._lines = {}
+
+    def __repr__(self):
+        return "<Quarantine {n} actions>".format(n=self.entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """ Close the side file """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def count(self, action):
+        """ An action was handled without trouble """
+        self.handled[action['action']] = self.handled.get(action['action'], 0) + 1
+
+    def line_number(self, logfile, offset):
+        """ The line number (from 1) of the line starting at byte offset in a logfile """
+        start, line = self._lines.get(logfile, (0, 1))
+        if offset < start:
+            start, line = 0, 1
+        with open_log(logfile) as file:
+            file.seek(start)
+            left = offset - start
+            while left > 0:
+                data = file.read(min(left, 1024 * 1024))
+                if not data:
+                    break
+                line += data.count(b'\n')
+                left -= len(data)
+        self._lines[logfile] = (offset, line)
+        return line
+
+    def add(self, action, error, game=None, position=None, stage='handle'):
+        """ Quarantine an action that raised error, game is marked inconsistent and
+        position is the (logfile, byte offset) of the line when known. stage is 'handle'
+        or 'score' for an action that was handled but could not be scored.
+        Without a position (like when scoring) the line the game started on is used,
+        'at' in the entry tells if file, offset and line are of the action or the game """
+        name = action['action']
+        failed = self.unscored if stage == 'score' else self.failed
+        failed[name] = failed.get(name, 0) + 1
+        kind = type(error).__name__
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+        self.entries += 1
+        entry = {'action': action.to_json(), 'error': '{k}: {e}'.format(k=kind, e=error),
+                 'stage': stage, 'game': None, 'at': 'action', 'file': None, 'offset': None,
+                 'line': None}
+        if game is not None:
+            game.inconsistent = True
+            self.games.add(game.sid)
+            entry['game'] = game.sid.isoformat()
+            if position is None and game.position is not None:
+                position = game.position
+                entry['at'] = 'game'
+        if position is not None:
+            logfile, offset = position
+            entry['file'] = logfile
+            if offset is not None:
+                entry['offset'] = offset
+                entry['line'] = self.line_number(logfile, offset)
+        if self.path is not None:
+            if self._file is None:
+                self._file = open(self.path, 'a')
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+        return entry
+
+    def summary(self):
+        """ How many actions of every type were handled, quarantined and could not be
+        scored, as an JSON object """
+        handled = sum(self.handled.values())
+        failed = sum(self.failed.values())
+        actions = {}
+        for name in sorted(set(self.handled) | set(self.failed) | set(self.unscored)):
+            total = self.handled.get(name, 0) + self.failed.get(name, 0)
+            actions[name] = {'actions': total, 'quarantined': self.failed.get(name, 0),
+                             'rate': self.failed.get(name, 0) / max(total, 1),
+                             'unscored': self.unscored.get(name, 0)}
+        return {'actions': handled + failed,
+                'quarantined': failed,
+                'rate': failed / max(handled + failed, 1),
+                'unscored': sum(self.unscored.values()),
+                'games': len(self.games),
+                'errors': dict(self.errors),
+                'by_action': actions}
+
+    def report(self):
+        """ The summary as text """
+        summary = self.summary()
+        lines = ["Quarantined {q} of {n} actions ({r:.4%}) in {g} games".format(
+            q=summary['quarantined'], n=summary['actions'], r=summary['rate'],
+            g=summary['games'])]
+        for name, info in summary['by_action'].items():
+            if info['quarantined']:
+                lines.append("  {name:<14} {q:>8} of {n:>10} ({r:.4%})".format(
+                    name=name, q=info['quarantined'], n=info['actions'], r=info['rate']))
+        if summary['unscored']:
+            lines.append("Could not score {u} handled actions".format(u=summary['unscored']))
+            for name, info in summary['by_action'].items():
+                if info['unscored']:
+                    lines.append("  {name:<14} {u:>8}".format(name=name, u=info['unscored']))
+        for kind, count in sorted(summary['errors'].items()):
+            lines.append("  {kind}: {n}".format(kind=kind, n=count))
+        return '\n'.join(lines)
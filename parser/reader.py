@@ -0,0 +1,156 @@
+""" Bytes level reader for UHC Parser
+Plain logfiles are memory mapped and compressed archives are streamed in large
+chunks. Both are handled in windows that end on a line break, and when keywords
+are given only the lines containing one of them are copied out of the window and
+decoded, every other line is skipped without ever becoming a python object.
+"""
+import bz2
+from bisect import bisect_left
+import gzip
+import lzma
+import mmap
+import os
+
+from . helpers import decode_line
+
+#Size of the windows we search through, also how much we read from archives at a time
+CHUNK_SIZE = 64 * 1024 * 1024
+
+OPENERS = {'.gz': gzip.open,
+           '.xz': lzma.open,
+           '.bz2': bz2.open}
+
+def open_log(logfile):
+    """ Open a plain or compressed logfile for reading bytes """
+    opener = OPENERS.get(os.path.splitext(logfile)[1], open)
+    return opener(logfile, 'rb')
+
+def _mapped_windows(file, size, start):
+    """ Yields (buffer, start, end, base) windows over a memory mapped file up to byte size """
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        while start < size:
+            end = buffer.find(b'\n', min(start + CHUNK_SIZE, size) - 1, size) + 1
+            if end == 0:
+                end = size
+            yield buffer, start, end, 0
+            start = end
+
+def _streamed_windows(file, start, stop=None):
+    """ Yields (buffer, start, end, base) windows over a stream up to byte stop, carrying
+    partial lines over """
+    if start:
+        #Compressed streams seek forward by decompressing, but we skip the matching
+        file.seek(start)
+    base = start
+    rest = b''
+    while True:
+        data = file.read(CHUNK_SIZE)
+        if not data:
+            if rest:
+                yield rest, 0, len(rest), base
+            return
+        buffer = rest + data
+        if stop is not None and base + len(buffer) >= stop:
+            if stop > base:
+                yield buffer, 0, stop - base, base
+            return
+        end = buffer.rfind(b'\n') + 1
+        rest = buffer[end:]
+        if end > 0:
+            yield buffer, 0, end, base
+            base += end
+
+def windows(logfile, start=0, end=None):
+    """ Yields (buffer, start, end, base) windows of whole lines covering the logfile from
+    the byte offset start to end (where a line starts, or the end of the file),
+    buffer[pos] is at byte base + pos in the file """
+    if os.path.splitext(logfile)[1] in OPENERS:
+        with open_log(logfile) as file:
+            yield from _streamed_windows(file, start, end)
+        return
+    with open(logfile, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if end is not None:
+            size = min(size, end)
+        #mmap can not map an empty file
+        if size > start:
+            yield from _mapped_windows(file, size, start)
+
+def _lines(buffer, start, end):
+    """ Yields (position, line) for every line in the window """
+    while start < end:
+        stop = buffer.find(b'\n', start, end)
+        if stop == -1:
+            stop = end
+        yield start, buffer[start:stop]
+        start = stop + 1
+
+def _candidate_starts(buffer, start, end, keywords):
+    """ The positions where the lines in the window containing any of the keywords start,
+    in file order """
+    found = set()
+    for keyword in keywords:
+        pos = buffer.find(keyword, start, end)
+        while pos != -1:
+            first = buffer.rfind(b'\n', start, pos) + 1
+            found.add(first if first > 0 else start)
+            #No need to look for the keyword again on the same line
+            stop = buffer.find(b'\n', pos, end)
+            if stop == -1:
+                break
+            pos = buffer.find(keyword, stop, end)
+    return sorted(found)
+
+def _candidates(buffer, start, end, keywords):
+    """ Yields (position, line) for the lines in the window containing any of the keywords,
+    in file order """
+    for first in _candidate_starts(buffer, start, end, keywords):
+        stop = buffer.find(b'\n', first, end)
+        if stop == -1:
+            stop = end
+        yield first, buffer[first:stop]
+
+def _changing_candidates(buffer, start, end, keywords):
+    """ Like _candidates, but keywords is a function returning the keywords to look for and
+    it is asked again after every line, a change takes effect from the next line on.
+    The lines of every list of keywords are only searched for once in a window """
+    searched = []
+    pos = start
+    while pos < end:
+        current = keywords()
+        for words, starts in searched:
+            if words is current:
+                break
+        else:
+            starts = _candidate_starts(buffer, start, end, current)
+            searched.append((current, starts))
+        index = bisect_left(starts, pos)
+        if index == len(starts):
+            return
+        first = starts[index]
+        pos = buffer.find(b'\n', first, end) + 1
+        if pos == 0:
+            pos = end
+        yield first, buffer[first:pos].rstrip(b'\n')
+
+def read_lines(logfile, keywords=None, start=0, offsets=False, profile=None, end=None):
+    """ Yields the decoded lines of a logfile without line endings, from byte offset start
+    to end (where a line starts). With keywords (a list of bytes) only lines containing
+    one of them are yielded, keywords can also be a function returning that list which
+    is asked again after every yielded line. With offsets it yields (offset, line) where
+    offset is the byte where the line begins.
+    A profile is told about every window so it can count all lines, not only the yielded """
+    for buffer, first, end, base in windows(logfile, start, end):
+        if profile is not None:
+            profile.read(buffer, first, end)
+        if keywords is None:
+            lines = _lines(buffer, first, end)
+        elif callable(keywords):
+            lines = _changing_candidates(buffer, first, end, keywords)
+        else:
+            lines = _candidates(buffer, first, end, keywords)
+        for pos, raw in lines:
+            if offsets:
+                yield base + pos, decode_line(raw.rstrip(b'\r'))
+            else:
+                yield decode_line(raw.rstrip(b'\r'))
@@ -0,0 +1,53 @@
+""" Several servers at once for UHC Parser
+Every server has its own game timeline, so the logs of a server are parsed in order in
+one worker process while the servers are spread over the process pool. What every
+server adds to the highscore is merged into one global leaderboard keyed by the UUID
+of the players, so a player that changed name or plays on several servers is counted
+as one player.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from . parallel import log_files
+from . parser import ParserSession
+from . stats import UuidHighscore
+
+def server_logs(source):
+    """ The logfiles of a server, oldest first, source is a logfile, a directory or a glob """
+    if os.path.isfile(source):
+        return [source]
+    return log_files(source)
+
+def find_servers(directory):
+    """ Every subdirectory of directory is a server, returns {name: directory} """
+    return {name: os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if os.path.isdir(os.path.join(directory, name))}
+
+def parse_server(name, source, actions=None, legacy=False, load_games=True):
+    """ Parse all logs of a server into one store, this is what runs in the worker processes
+    Returns (name, store or None without load_games, UuidHighscore of its finished games) """
+    session = ParserSession(actions=actions, legacy=legacy, name=name)
+    for logfile in server_logs(source):
+        session.parse(logfile)
+    highscore = UuidHighscore()
+    for game in session.store.items():
+        highscore.add_game(game)
+    return name, session.store if load_games else None, highscore
+
+def parse_servers(servers, processes=None, legacy=False, load_games=True, session=None):
+    """ Parse the logs of many servers, servers maps a server name to its logs
+    Returns ({name: store}, global UuidHighscore). The actions of session (or the
+    default registry) are used by every worker """
+    actions = session.actions if session is not None else ParserSession().actions
+    names = list(servers)
+    stores = {}
+    leaderboard = UuidHighscore()
+    with ProcessPoolExecutor(processes) as pool:
+        for name, store, highscore in pool.map(parse_server, names,
+                                                [servers[name] for name in names],
+                                                [actions] * len(names),
+                                                [legacy] * len(names),
+                                                [load_games] * len(names)):
+            stores[name] = store
+            leaderboard.merge(highscore)
+    return stores, leaderboard
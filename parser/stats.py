@@ -1,32 +1,134 @@
 """ Calculate all the stats we want to know about games and players """
-from operator import itemgetter
+from bisect import bisect_left, insort
+from datetime import datetime
+from itertools import islice
 
-PLAYERS = {}
+from . models import State
+
+#Everything we count for a player
+COUNTERS = ('kills', 'deaths', 'wins', 'games', 'survived')
+#The counters that give points, 1 point each for kills, team wins and being alive at the end
+SCORED = ('kills', 'wins', 'survived')
+#Merging a table with more players than this sorts the ranking once instead of moving
+#every player into place
+BULK_MERGE = 256
 
 def score_count(games):
     """ Main count of all games in a store """
     highscore = Highscore()
     for game in games.items():
-        players = [(player, game.player_info(player)) for player in game.get_playing_players()]
-        highscore.add_players(players)
-        for action in game.get_actions():
-            if action['action'] == 'death':
-                highscore.count_kill_action(action)
-            elif action['action'] == 'team_win':
-                highscore.count_team_win(action)
-            elif action['action'] == 'survivors':
-                highscore.count_survivors(action)
+        highscore.merge(game_score(game))
     return highscore.get_highscore()
 
+def score_tables(games, tables, quarantine=None):
+    """ Count all games in a store into several highscore tables at once, like one per season
+    Every game is only counted once no matter how many tables there are """
+    for game in games.items():
+        delta = game_score(game, quarantine)
+        for table in tables:
+            table.add_game(game, delta)
+    return tables
+
+def score_stream(games, tables, quarantine=None):
+    """ Count every finished game in a stream of games (like iter_games) into the tables
+    and pass all games on, score_tables for games that are not kept in a store """
+    for game in games:
+        if game.state == State.STOPPED:
+            delta = game_score(game, quarantine)
+            for table in tables:
+                table.add_game(game, delta)
+        yield game
+
+def season(name):
+    """ Returns the (start, end) of a season named like 2017 (a year) or 2017-05 (a month) """
+    if '-' in name:
+        year, month = (int(part) for part in name.split('-'))
+        start = datetime(year, month, 1)
+        if month == 12:
+            return start, datetime(year + 1, 1, 1)
+        return start, datetime(year, month + 1, 1)
+    year = int(name)
+    return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+def _count_action(highscore, action):
+    """ Count one scoring action of a game """
+    if action['action'] == 'death':
+        highscore.count_kill_action(action)
+    elif action['action'] == 'team_win':
+        highscore.count_team_win(action)
+    elif action['action'] == 'survivors':
+        highscore.count_survivors(action)
+
+def game_score(game, quarantine=None):
+    """ The highscore table of a single game, this is what the game adds to the totals.
+    Kills only count for players in the same game, so every game counts the same no
+    matter which games was counted before it.
+    With a quarantine an action that can not be counted (like the death of a player that
+    is not in the game) is quarantined and the rest of the game is still counted """
+    highscore = Highscore()
+    players = [(player, game.player_info(player)) for player in game.get_playing_players()]
+    highscore.add_players(players)
+    for action in game.get_actions():
+        if quarantine is None:
+            _count_action(highscore, action)
+            continue
+        try:
+            _count_action(highscore, action)
+        except Exception as error:
+            quarantine.add(action, error, game, stage='score')
+    return highscore
+
 class Highscore(object):
-    """ Defines a highscore table to track the players score """
-    def __init__(self):
+    """ Defines a highscore table to track the players score
+    Tables can be merged in any order and keep a ranking that is updated as we count.
+    With start and/or end only games started in that window are counted by add_game """
+    def __init__(self, start=None, end=None):
         self.players = {}
+        self.start = start
+        self.end = end
+        #First seen order of the players, decides the place when the score is the same
+        self._names = []
+        self._order = {}
+        #Sorted list of (-score, order), the leader first
+        self._ranking = []
 
     def __repr__(self):
         return '<Class Higscore>'
 
-    def _add_player(self, player, uuid):
+    def __add__(self, other):
+        return Highscore(self.start, self.end).merge(self).merge(other)
+
+    def to_json(self):
+        """ Return the highscore table as an JSON object """
+        return {'players': self.players,
+                'start': self.start.isoformat() if self.start else None,
+                'end': self.end.isoformat() if self.end else None}
+
+    @classmethod
+    def from_json(cls, data):
+        """ Create a highscore from an JSON object made by to_json """
+        start, end = (datetime.strptime(data[key], "%Y-%m-%dT%H:%M:%S")
+                      if data.get(key) else None for key in ('start', 'end'))
+        highscore = cls(start, end)
+        for player, info in data['players'].items():
+            highscore._add_player(player, info['uuid'])
+            for key in COUNTERS:
+                highscore.players[player][key] = info[key]
+        highscore._rank()
+        return highscore
+
+    def score(self, player):
+        """ The score of a player """
+        info = self.players[player]
+        return sum(info[key] for key in SCORED)
+
+    def in_window(self, when):
+        """ Check if a game started at when should be counted in this table """
+        if self.start is not None and when < self.start:
+            return False
+        return self.end is None or when < self.end
+
+    def _add_player(self, player, uuid, rank=True):
         """ Found new player that we should add to the highscore table """
         #we dont want to overwrite an existing player
         if self.players.get(player) is None:
@@ -36,6 +138,22 @@ class Highscore(object):
                                     'wins': 0,
                                     'games': 0,
                                     'survived': 0}
+            self._order[player] = len(self._names)
+            self._names.append(player)
+            if rank:
+                insort(self._ranking, (0, self._order[player]))
+
+    def _count(self, player, changes, rank=True):
+        """ Add (key, amount) changes to the counters of a player and move them in the ranking """
+        info = self.players[player]
+        old = self.score(player)
+        for key, amount in changes:
+            info[key] = info[key] + amount
+        new = self.score(player)
+        if rank and new != old:
+            order = self._order[player]
+            del self._ranking[bisect_left(self._ranking, (-old, order))]
+            insort(self._ranking, (-new, order))
 
     def add_players(self, players):
         """ Add all players in the game so we know they have a spot in the highscore"""
@@ -43,6 +161,38 @@ class Highscore(object):
             self._add_player(player[0], player[1]['uuid'])
             self.count_game(player[0])
 
+    def _rank(self):
+        """ Sort the ranking from scratch """
+        self._ranking = sorted((-self.score(player), order)
+                               for order, player in enumerate(self._names))
+
+    def _merge_player(self, player, info, sign, rank):
+        """ Add the counts of one player in another table """
+        self._add_player(player, info['uuid'], rank)
+        self._count(player, [(key, info[key] * sign) for key in COUNTERS], rank)
+
+    def merge(self, other, sign=1):
+        """ Add the counts from another highscore table to this one, with sign -1 they are
+        taken away instead (like when a game we counted changed) """
+        rank = len(other.players) <= BULK_MERGE
+        for player, info in other.players.items():
+            self._merge_player(player, info, sign, rank)
+        if not rank:
+            self._rank()
+        return self
+
+    def add_game(self, game, delta=None):
+        """ Count a game if it is in our window, delta is game_score(game) if already known """
+        if self.in_window(game.sid):
+            self.merge(delta if delta is not None else game_score(game))
+        return self
+
+    def remove_game(self, game, delta=None):
+        """ Take back what add_game counted for a game """
+        if self.in_window(game.sid):
+            self.merge(delta if delta is not None else game_score(game), -1)
+        return self
+
     def count_kill_action(self, action):
         """ An action was found that we need to count """
         killer = action.get('killed_by')
@@ -51,40 +201,74 @@ class Highscore(object):
             #something killed player
             if self.players.get(killer) is not None:
                 #something is not a mob, count it!
-                self.players[killer]['kills'] = self.players[killer]['kills'] + 1
+                self._count(killer, [('kills', 1)])
         #register death of player
-        self.players[died]['deaths'] = self.players[died]['deaths'] + 1
+        self._count(died, [('deaths', 1)])
 
     def count_survivors(self, action):
         """ count the points for survivors """
         for player in action['players']:
-            self.players[player]['survived'] = self.players[player]['survived'] + 1
+            self._count(player, [('survived', 1)])
 
     def count_team_win(self, action):
         """ count the players in a team for scoring """
         for player in action['players']:
-            self.players[player]['wins'] = self.players[player]['wins'] + 1
+            self._count(player, [('wins', 1)])
 
     def count_game(self, player):
         """ Add a game to the player since playing """
-        self.players[player]['games'] = self.players[player]['games'] + 1
+        self._count(player, [('games', 1)])
+
+    def top(self, count=None):
+        """ Returns the count best players as an ordered list, leader first
+        Every entry is a new dict, the counters in the table are not touched """
+        data = []
+        for place, (score, order) in enumerate(islice(self._ranking, count)):
+            player = self._names[order]
+            info = self.players[player]
+            data.append(dict(info,
+                             nickname=info.get('nickname', player),
+                             score=-score,
+                             #kill/death ratio, players who never died count as one death
+                             kd=round(info['kills'] / max(info['deaths'], 1), 3),
+                             place=place + 1))
+        return data
 
     def get_highscore(self):
         """ Returns the highscore as an ordered list, leader first """
-        data = []
-        for player, info in self.players.items():
-            score = 0
-            #kills is 1 point
-            score = info['kills'] * 1
-            #team win is 1 point
-            score = score + info['wins'] * 1
-            #alive at the end is 1 point
-            score = score + info['survived'] * 1
-            self.players[player]['nickname'] = player
-            self.players[player]['score'] = score
-            self.players[player]['kd'] = round(info['kills'] / info['deaths'], 3)
-            data.append(self.players[player])
-        sort_list = sorted(data, key=itemgetter('score'), reverse=True)
-        for index, player in enumerate(sort_list):
-            player['place'] = index+1
-        return sort_list
+        return self.top()
+
+class UuidHighscore(Highscore):
+    """ Highscore keyed by the UUID of the players instead of the name, so a player that
+    changed name is still one player. The name shown is the one from the latest game,
+    last_seen is when that game started """
+    def _merge_player(self, player, info, sign, rank):
+        uuid = info['uuid'] or player
+        super()._merge_player(uuid, dict(info, uuid=uuid), sign, rank)
+        if sign > 0:
+            self._rename(uuid, info.get('nickname', player), info.get('last_seen'))
+
+    def _rename(self, uuid, nickname, seen):
+        """ Keep the name from the latest game a player was seen in """
+        info = self.players[uuid]
+        if 'nickname' not in info or (seen or '') >= (info['last_seen'] or ''):
+            info['nickname'] = nickname
+            info['last_seen'] = seen
+
+    def add_game(self, game, delta=None):
+        """ Count a game if it is in our window, the names in it are from when it started """
+        if self.in_window(game.sid):
+            delta = delta if delta is not None else game_score(game)
+            seen = game.sid.isoformat()
+            for player, info in delta.players.items():
+                self._merge_player(player, dict(info, last_seen=seen), 1, True)
+        return self
+
+    @classmethod
+    def from_json(cls, data):
+        """ Create a highscore from an JSON object made by to_json """
+        highscore = super().from_json(data)
+        for uuid, info in data['players'].items():
+            highscore.players[uuid]['nickname'] = info['nickname']
+            highscore.players[uuid]['last_seen'] = info['last_seen']
+        return highscore
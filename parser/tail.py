@@ -0,0 +1,151 @@
+""" Follow mode for UHC Parser
+Tails a running server log and feeds new lines to handle_action as they arrive.
+A checkpoint makes it possible to resume after a restart without parsing the whole
+history again. It is a small JSON file with the byte offset, the inode and the game
+being played. The final games of the store (see Store.final_count) are appended
+once to a JSON Lines file next to it (the checkpoint path + '.games'), so saving a
+checkpoint only costs the game being played and not the whole history.
+"""
+import json
+import os
+import time
+from . helpers import decode_line, get_logger, replace_file
+from . models import Game, Store
+from . parser import ParserSession
+
+log = get_logger('follow')
+
+CHECKPOINT_SCHEMA = 1
+
+def _games_path(checkpoint):
+    """ The file with the finished games of a checkpoint """
+    return checkpoint + '.games'
+
+def load_checkpoint(checkpoint):
+    """ Returns the saved checkpoint dict, with the games in a Store as 'store', or None
+    if there is nothing (or nothing we can read) to resume from """
+    if checkpoint is None or not os.path.exists(checkpoint):
+        return None
+    try:
+        with open(checkpoint) as file:
+            state = json.load(file)
+    except ValueError:
+        state = None
+    if not isinstance(state, dict) or state.get('schema') != CHECKPOINT_SCHEMA:
+        log.warning("Can not read the checkpoint {c}, starting from the beginning",
+                    c=checkpoint)
+        return None
+    store = Store()
+    if state['finished']:
+        #Only what the checkpoint counted, a crash may have left more after it
+        with open(_games_path(checkpoint), 'rb') as file:
+            data = file.read(state['games_size'])
+        for line in data.splitlines():
+            store.add(Game.from_json(json.loads(line.decode('utf-8'))))
+    if state['game'] is not None:
+        store.add(Game.from_json(state['game']))
+    state['store'] = store
+    return state
+
+def save_checkpoint(checkpoint, offset, inode, store, saved=None):
+    """ Save where we are in the log and the games, saved is the checkpoint returned by
+    the last save (or load). Returns the new checkpoint """
+    finished = saved['finished'] if saved is not None else 0
+    size = saved['games_size'] if saved is not None else 0
+    done = store.final_count
+    if done > finished:
+        with open(_games_path(checkpoint), 'ab') as file:
+            #Drop anything written after the last checkpoint
+            file.truncate(size)
+            for game in store.final_games(finished):
+                file.write((json.dumps(game.to_json()) + '\n').encode('utf-8'))
+            size = file.tell()
+        finished = done
+    state = {'schema': CHECKPOINT_SCHEMA, 'offset': offset, 'inode': inode,
+             'finished': finished, 'games_size': size,
+             'game': store.last.to_json() if store.last is not None else None}
+    replace_file(checkpoint, json.dumps(state))
+    return state
+
+def _open(logfile, offset):
+    """ Open the logfile at offset, returns (file, inode) or (None, None) if it is missing """
+    try:
+        file = open(logfile, 'rb')
+    except FileNotFoundError:
+        return None, None
+    file.seek(offset)
+    return file, os.fstat(file.fileno()).st_ino
+
+def _read(file, offset, session):
+    """ Handle all complete lines from offset to the end of file
+    Returns the new offset and if any action was handled """
+    handled = False
+    if file is None:
+        return offset, handled
+    for raw in iter(file.readline, b''):
+        if not raw.endswith(b'\n'):
+            #The server is still writing this line, wait for the rest
+            file.seek(offset)
+            break
+        for action in session.match_active(decode_line(raw.rstrip(b'\r\n'))):
+            session.handle_action(action, (file.name, offset))
+            handled = True
+        offset += len(raw)
+    return offset, handled
+
+def follow(logfile, checkpoint=None, interval=1.0, legacy=False, session=None, once=False):
+    """ Tail the logfile and yield the store once what is already in it (or in the
+    checkpoint) has been handled, then every time new actions has been handled
+    Rotation (the path points to a new file) and truncation starts over from the
+    beginning of the new file. With once the generator stops at the end of the file. """
+    if session is None:
+        session = ParserSession(legacy=legacy, name='follow')
+    offset = 0
+    inode = None
+    state = saved_state = load_checkpoint(checkpoint)
+    if state is not None:
+        session.store = state['store']
+        offset = state['offset']
+        inode = state['inode']
+        log.debug("Resuming {f} at byte {o}", f=logfile, o=offset)
+
+    file, current = _open(logfile, offset)
+    if file is not None and current != inode:
+        #The log was rotated while we were not running, start on the new one
+        offset = 0
+        file.seek(0)
+    inode = current
+    saved = offset
+    first = True
+    try:
+        while True:
+            offset, handled = _read(file, offset, session)
+            try:
+                stat = os.stat(logfile)
+            except FileNotFoundError:
+                stat = None
+            if stat is not None and stat.st_ino != inode:
+                #What was written to the old file has been handled above
+                log.info("{f} was rotated, following the new file", f=logfile)
+                if file is not None:
+                    file.close()
+                offset = 0
+                file, inode = _open(logfile, offset)
+            elif stat is not None and stat.st_size < offset:
+                log.info("{f} was truncated, starting over", f=logfile)
+                offset = 0
+                file.seek(0)
+            if checkpoint is not None and offset != saved:
+                saved_state = save_checkpoint(checkpoint, offset, inode, session.store,
+                                              saved_state)
+                saved = offset
+            if handled or first:
+                first = False
+                yield session.store
+            elif once:
+                return
+            else:
+                time.sleep(interval)
+    finally:
+        if file is not None:
+            file.close()
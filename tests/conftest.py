@@ -0,0 +1,20 @@
+""" Shared fixtures for the UHC Parser tests
+The logs are made by the benchmark generator, so every test runs on logs with all the
+actions and noise the parser knows about without shipping log files.
+"""
+import pytest
+
+from benchmarks.generate import generate
+from helpers import split_games
+
+@pytest.fixture(scope='session')
+def generated_log(tmp_path_factory):
+    """ A generated log of a few hundred kilobytes """
+    path = str(tmp_path_factory.mktemp('logs') / 'generated.log')
+    generate(path, 300 * 1024, seed=1)
+    return path
+
+@pytest.fixture(scope='session')
+def generated_games(generated_log):
+    """ The games of the generated log as lists of lines """
+    return split_games(generated_log)
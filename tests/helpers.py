@@ -0,0 +1,62 @@
+""" Helpers for the UHC Parser tests """
+import os
+import random
+
+from parser.export import dump_game
+
+SERVER_START = 'Starting minecraft server version'
+#Lines that stop, crash or look like a server start without being one
+ODD_LINES = ['2017-03-02 19:00:00 [WARN] Not Starting minecraft server version 1.11.2 yet\n',
+             '2017-03-02 19:06:00 [ERROR] This crash report has been saved to: ./crash.txt\n',
+             '2017-03-02 19:06:00 [INFO] Stopping the server\n']
+
+def dump_games(games):
+    """ Everything about some games, for comparing two parses """
+    return [dump_game(game) + game.state.name for game in games]
+
+def dump_store(store):
+    """ Everything about the games in a store """
+    return dump_games(store.all_items())
+
+def split_games(path):
+    """ The lines of a log cut into games, every game begins with a server start """
+    games = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if SERVER_START in line or not games:
+                games.append([])
+            games[-1].append(line)
+    return games
+
+def fuzz_log(path, games, count, seed):
+    """ Write a log of count random games, some cut short and with odd lines between them """
+    rand = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        game = rand.choice(games)
+        if rand.random() < 0.3:
+            game = game[:rand.randint(1, len(game))]
+        lines.extend(game)
+        if rand.random() < 0.2:
+            lines.append(rand.choice(ODD_LINES))
+    with open(path, 'w', encoding='utf-8') as file:
+        file.writelines(lines)
+    return path
+
+def rotate_log(path, directory, parts, opener=open, suffix='.log'):
+    """ Cut a log into parts at line breaks and write them like a server rotates its logs,
+    as 2017-01-01-N.log (opened with opener) and the rest as latest.log. Returns the paths """
+    with open(path, 'rb') as file:
+        lines = file.readlines()
+    size = len(lines) // parts + 1
+    paths = []
+    for part in range(parts):
+        chunk = lines[part * size:(part + 1) * size]
+        if part == parts - 1:
+            name, write = 'latest.log', open
+        else:
+            name, write = '2017-01-01-{n}{s}'.format(n=part + 1, s=suffix), opener
+        paths.append(os.path.join(directory, name))
+        with write(paths[-1], 'wb') as file:
+            file.writelines(chunk)
+    return paths
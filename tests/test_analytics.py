@@ -0,0 +1,121 @@
+""" The event table must hold every game and the analytics must match looping over them """
+from datetime import datetime, timedelta
+
+import pytest
+
+#NumPy is optional, without it there is nothing to test here
+np = pytest.importorskip('numpy')
+
+from parser.analytics import (death_causes, kill_matrix, player_kills, summary,
+                              survival_times, time_to_first_kill)
+from parser.events import EVENT_COLUMNS, GAME_COLUMNS, ROSTER_COLUMNS, EventTable
+from parser.parser import ParserSession
+
+#carol dies before the world border starts shrinking, that is before the game started
+EARLY_DEATH = """\
+2017-03-01 19:00:00 [INFO] Starting minecraft server version 1.11.2
+2017-03-01 19:01:00 [INFO] UUID of player alice is 11111111-1111-1111-1111-111111111111
+2017-03-01 19:01:10 [INFO] UUID of player bob is 22222222-2222-2222-2222-222222222222
+2017-03-01 19:01:20 [INFO] UUID of player carol is 33333333-3333-3333-3333-333333333333
+2017-03-01 19:01:30 [INFO] UUID of player dave is 44444444-4444-4444-4444-444444444444
+2017-03-01 19:02:01 [INFO] Added 2 player(s) to team red: alice and bob
+2017-03-01 19:02:02 [INFO] Added 2 player(s) to team blue: carol and dave
+2017-03-01 19:02:30 [INFO] carol was slain by alice
+2017-03-01 19:03:00 [INFO] Shrinking world border to 100.0 blocks wide (down from 1000.0 blocks) over 3600 seconds
+2017-03-01 19:10:00 [INFO] dave was slain by bob
+2017-03-01 19:14:00 [INFO] Stopping the server
+"""
+
+def _time(text):
+    return datetime.strptime(text, "%Y-%m-%d %H:%M:%S")
+
+def _start(game):
+    return _time(game.game_info['timestamp']) if game.game_info else game.sid
+
+def _survival(game):
+    """ Seconds survived by the playing players of a game, the slow way """
+    end = max(_time(action['timestamp']) for action in game.get_actions()
+              if action.get('timestamp'))
+    survivors = set()
+    died = {}
+    for action in game.get_actions():
+        if action['action'] == 'survivors':
+            survivors.update(action['players'])
+        elif action['action'] == 'death':
+            died.setdefault(action['player'], _time(action['timestamp']))
+    return [max((end if player in survivors else died.get(player, end)) - _start(game),
+                timedelta(0)).total_seconds()
+            for player in game.get_playing_players()]
+
+@pytest.fixture(scope='module')
+def store(generated_log):
+    return ParserSession().parse(generated_log)
+
+@pytest.fixture(scope='module')
+def table(store):
+    return EventTable.from_store(store)
+
+def test_table_rows(store, table):
+    games = list(store.items())
+    assert len(table.game_sid) == len(games)
+    events = 0
+    for game in games:
+        for action in game.get_actions():
+            if action.get('timestamp') is None:
+                continue
+            events += len(action['players']) if action['action'] == 'team_members' else 1
+    assert len(table) == events
+    assert len(table.roster_game) == sum(len(list(game.get_playing_players()))
+                                         for game in games)
+
+def test_save_and_load(tmp_path, table):
+    path = str(tmp_path / 'events.npz')
+    table.save(path)
+    loaded = EventTable.load(path)
+    for name in EVENT_COLUMNS + GAME_COLUMNS + ROSTER_COLUMNS:
+        assert np.array_equal(getattr(loaded, name), getattr(table, name)), name
+    assert (loaded.players, loaded.teams, loaded.causes) == \
+        (table.players, table.teams, table.causes)
+
+def test_survival_times(store, table):
+    expected = [seconds for game in store.items() for seconds in _survival(game)]
+    assert survival_times(table).tolist() == expected
+
+def test_death_before_the_game_started(tmp_path):
+    path = tmp_path / 'early.log'
+    path.write_text(EARLY_DEATH)
+    store = ParserSession().parse(str(path))
+    table = EventTable.from_store(store, all_games=True)
+    times = dict(zip((table.players[player] for player in table.roster_player),
+                     survival_times(table).tolist()))
+    assert times['carol'] == 0
+    assert times['dave'] == 7 * 60
+    assert times == dict(zip(next(store.all_items()).get_playing_players(),
+                             _survival(next(store.all_items()))))
+
+def test_time_to_first_kill(store, table):
+    expected = []
+    for game in store.items():
+        players = set(game.get_playing_players())
+        kills = [_time(action['timestamp']) for action in game.get_actions()
+                 if action['action'] == 'death' and action['player'] in players
+                 and action.get('killed_by') in players
+                 and _time(action['timestamp']) >= _start(game)]
+        expected.append((min(kills) - _start(game)).total_seconds() if kills else -1)
+    assert time_to_first_kill(table).tolist() == expected
+
+def test_kills_and_causes(store, table):
+    kills = 0
+    causes = {}
+    for game in store.items():
+        players = set(game.get_playing_players())
+        for action in game.get_actions():
+            if action['action'] != 'death':
+                continue
+            if action['player'] in players and action.get('killed_by') in players:
+                kills += 1
+            if action.get('reason') is not None:
+                causes[action['reason']] = causes.get(action['reason'], 0) + 1
+    assert player_kills(table).sum() == kill_matrix(table).sum() == kills
+    assert death_causes(table) == causes
+    assert summary(table)['games'] == len(table.game_sid)
@@ -0,0 +1,72 @@
+""" Games saved to the archive must come back the same, found by the filters asked for """
+import pytest
+
+from helpers import dump_games, dump_store, rotate_log
+from parser.archive import Archive
+from parser.parser import ParserSession
+
+@pytest.fixture(scope='module')
+def store(generated_log):
+    return ParserSession().parse(generated_log)
+
+@pytest.fixture
+def archive(tmp_path, store):
+    with Archive(str(tmp_path / 'games.db')) as archive:
+        archive.save(store.all_items())
+        yield archive
+
+def test_saved_games_come_back(archive, store):
+    assert archive.count == store.count
+    assert dump_games(archive.games(state=None)) == dump_store(store)
+    assert dump_games(archive.games()) == dump_games(store.items())
+    #Saving a game again replaces it
+    archive.save(store.all_items())
+    assert archive.count == store.count
+
+def test_logs_are_read_when_used(archive, store):
+    game = next(archive.games())
+    assert game._rowid is not None
+    expected = next(store.items())
+    assert [action.to_json() for action in game.get_actions()] == \
+        [action.to_json() for action in expected.get_actions()]
+    assert game._rowid is None
+
+def test_filters(archive, store):
+    games = list(store.items())
+    player = next(games[0].get_playing_players())
+    assert [game.sid for game in archive.games(player=player)] == \
+        [game.sid for game in games if game.player_info(player) is not None]
+    winner = games[0].winning_team
+    assert [game.sid for game in archive.games(winner=winner)] == \
+        [game.sid for game in games if game.winning_team == winner]
+    middle = games[len(games) // 2].sid
+    assert [game.sid for game in archive.games(start=middle)] == \
+        [game.sid for game in games if game.sid >= middle]
+    kills = [(game.sid.isoformat(), action['timestamp'], action['player'])
+             for game in games for action in game.get_actions()
+             if action['action'] == 'death' and action.get('killed_by') == player]
+    assert [row[:3] for row in archive.deaths(killed_by=player)] == kills
+    assert [row[0] for row in archive.player_games(player)] == \
+        [game.sid.isoformat() for game in store.all_items()
+         if game.player_info(player) is not None]
+    assert archive.last().sid == max(game.sid for game in store.all_items())
+
+def test_parse_into_the_archive(tmp_path, generated_log, store):
+    with Archive(str(tmp_path / 'games.db')) as archive:
+        games = archive.store()
+        ParserSession(store=games).parse(generated_log)
+        games.flush()
+        assert dump_store(games) == dump_store(store)
+        assert dump_games(games.items()) == dump_games(store.items())
+
+def test_resume_across_rotated_logs(tmp_path, generated_log, store):
+    paths = rotate_log(generated_log, str(tmp_path), 4)
+    path = str(tmp_path / 'games.db')
+    for logfile in paths:
+        #A new run for every file, the game being played is picked up from the archive
+        with Archive(path) as archive:
+            games = archive.store()
+            ParserSession(store=games).parse(logfile)
+            games.flush()
+    with Archive(path) as archive:
+        assert dump_games(archive.games(state=None)) == dump_store(store)
@@ -0,0 +1,74 @@
+""" The parse cache must give what a parse gives, parsing only what is new in the log """
+import re
+
+from helpers import dump_store
+from parser.cache import ParseCache, session_fingerprint
+from parser.parser import REGISTRY, ParserSession
+from parser.stats import Highscore, score_count
+
+def _parse(cache, logfile, session=None):
+    """ Parse with the cache, returns (store, highscore, the offset the parse started at) """
+    session = session if session is not None else ParserSession()
+    starts = []
+    match_file = session.match_file
+    def recording(logfile, offset=0, **options):
+        starts.append(offset)
+        return match_file(logfile, offset, **options)
+    session.match_file = recording
+    store, highscore = ParseCache(cache).parse(logfile, session)
+    return store, highscore, starts[0]
+
+def _zapped():
+    """ A pattern that is not in the registry """
+    death = REGISTRY.actions()[0][1]
+    return (re.compile(r'(\d+-\d+-\d+ \d+:\d+:\d+) \[INFO\] (\w+) was zapped by (\w+)'),
+            death, 'zapped', ' was zapped by ')
+
+def test_rerun_like_parse(tmp_path, generated_log):
+    expected = ParserSession().parse(generated_log)
+    for _ in range(2):
+        store, highscore, _ = _parse(str(tmp_path), generated_log)
+        assert dump_store(store) == dump_store(expected)
+        assert highscore.get_highscore() == score_count(expected)
+
+def test_growing_log_parses_only_new_bytes(tmp_path, generated_log):
+    with open(generated_log, 'rb') as file:
+        data = file.read()
+    logfile = str(tmp_path / 'server.log')
+    cache = str(tmp_path / 'cache')
+    (tmp_path / 'cache').mkdir()
+    with open(logfile, 'wb') as file:
+        file.write(data[:len(data) // 2])
+    _, _, start = _parse(cache, logfile)
+    assert start == 0
+    with open(logfile, 'ab') as file:
+        file.write(data[len(data) // 2:])
+    store, highscore, start = _parse(cache, logfile)
+    assert 0 < start < len(data) // 2
+    expected = ParserSession().parse(logfile)
+    assert dump_store(store) == dump_store(expected)
+    assert highscore.get_highscore() == score_count(expected)
+
+def test_other_options_start_over(tmp_path, generated_log):
+    _parse(str(tmp_path), generated_log)
+    store, _, start = _parse(str(tmp_path), generated_log, ParserSession(keep_stop_log=False))
+    assert start == 0
+    assert dump_store(store) == dump_store(ParserSession(keep_stop_log=False).parse(generated_log))
+
+def test_new_pattern_starts_over(tmp_path, generated_log):
+    actions = REGISTRY.actions() + [_zapped()]
+    assert session_fingerprint(ParserSession(actions=actions)) != \
+        session_fingerprint(ParserSession())
+    _parse(str(tmp_path), generated_log)
+    _, _, start = _parse(str(tmp_path), generated_log, ParserSession(actions=actions))
+    assert start == 0
+    _, _, start = _parse(str(tmp_path), generated_log, ParserSession(actions=actions))
+    assert start > 0
+
+def test_season_tables_from_the_cache(tmp_path, generated_log):
+    _parse(str(tmp_path), generated_log)
+    expected = ParserSession().parse(generated_log)
+    table = Highscore()
+    ParseCache(str(tmp_path)).parse(generated_log, ParserSession(), load_games=False,
+                                    tables=[table])
+    assert table.get_highscore() == score_count(expected)
@@ -0,0 +1,46 @@
+""" Overlapping logs must be merged into the games of one log, with nothing counted twice """
+import shutil
+
+import pytest
+from click.testing import CliRunner
+
+from helpers import dump_store, rotate_log
+from main import cli
+from parser.dedup import BloomFilter, Deduplicator
+from parser.parallel import parse_files
+from parser.parser import ParserSession
+
+def test_bloom_filter():
+    bloom = BloomFilter(capacity=10000, error_rate=1e-4)
+    keys = [str(number).encode('ascii') for number in range(10000)]
+    assert not any(bloom.add(key) for key in keys)
+    assert all(bloom.add(key) for key in keys)
+    assert bloom.count == len(keys)
+    others = [str(number).encode('ascii') for number in range(10000, 110000)]
+    assert sum(key in bloom for key in others) < 100
+
+def test_overlapping_logs_like_one_log(tmp_path, generated_log):
+    paths = rotate_log(generated_log, str(tmp_path), 4)
+    #A backup copy and a console capture running from one file into the next
+    shutil.copy(paths[0], str(tmp_path / '2017-01-01-1-backup.log'))
+    lines = []
+    for path in paths[:2]:
+        with open(path, 'rb') as file:
+            lines.append(file.readlines())
+    with open(str(tmp_path / 'console.log'), 'wb') as file:
+        file.writelines(lines[0][len(lines[0]) // 2:] + lines[1][:len(lines[1]) // 2])
+    deduplicator = Deduplicator(capacity=10 ** 5)
+    games = parse_files(str(tmp_path), processes=2, dedup=deduplicator)
+    assert dump_store(games) == dump_store(ParserSession().parse(generated_log))
+    assert deduplicator.skipped_files == [str(tmp_path / '2017-01-01-1-backup.log')]
+    assert deduplicator.dropped > 0
+
+def test_dedup_needs_a_directory(generated_log):
+    result = CliRunner().invoke(cli, ['parse', generated_log, '--dedup'])
+    assert result.exit_code == 2
+    assert '--dedup merges the logs in a directory' in result.output
+
+@pytest.mark.parametrize('option', ['--follow', '--stream'])
+def test_dedup_with_other_modes(generated_log, option):
+    result = CliRunner().invoke(cli, ['parse', generated_log, '--dedup', option])
+    assert result.exit_code == 2
@@ -0,0 +1,44 @@
+""" Games are written as JSON that reads back the same, and only when they changed """
+import json
+import os
+
+from parser.export import GameWriter, dump_game, game_name, write_games
+from parser.models import Game
+from parser.parser import ParserSession
+
+def test_files_read_back(tmp_path, generated_log):
+    store = ParserSession().parse(generated_log)
+    names = write_games(store, str(tmp_path))
+    assert names == [game_name(game) for game in store.items()]
+    for game in store.items():
+        with open(os.path.join(str(tmp_path), game_name(game) + '.json')) as file:
+            assert dump_game(Game.from_json(json.load(file))) == dump_game(game)
+
+def test_unchanged_games_are_not_written(tmp_path, generated_log):
+    store = ParserSession().parse(generated_log)
+    with GameWriter(str(tmp_path)) as writer:
+        for game in store.items():
+            writer.write(game)
+    assert writer.written == len(writer.names) > 0
+    with GameWriter(str(tmp_path)) as writer:
+        for game in store.items():
+            writer.write(game)
+    assert writer.written == 0
+
+def test_jsonl(tmp_path, generated_log):
+    store = ParserSession().parse(generated_log)
+    write_games(store, str(tmp_path), jsonl=True)
+    with open(str(tmp_path / 'games.jsonl')) as file:
+        games = [Game.from_json(json.loads(line)) for line in file]
+    assert [dump_game(game) for game in games] == [dump_game(game) for game in store.items()]
+
+def test_same_second_later_game_wins(tmp_path, generated_log):
+    games = list(ParserSession().parse(generated_log).items())[:2]
+    #Both games claim the second the first one started in
+    games[1].sid = games[0].sid
+    with GameWriter(str(tmp_path), workers=4) as writer:
+        for _ in range(50):
+            writer.write(games[0])
+            writer.write(games[1])
+    with open(os.path.join(str(tmp_path), game_name(games[0]) + '.json')) as file:
+        assert json.load(file) == json.loads(dump_game(games[1]))
@@ -0,0 +1,48 @@
+""" Following a log, with or without restarts, must give the games a parse gives """
+import random
+
+from helpers import dump_store, fuzz_log
+from parser.tail import follow
+from parser.parser import ParserSession
+
+def _crlf_log(tmp_path, games, seed):
+    """ A fuzzed log written with Windows line endings """
+    path = fuzz_log(str(tmp_path / 'fuzzed.log'), games, 40, seed)
+    with open(path, encoding='utf-8') as file:
+        data = file.read()
+    with open(path, 'wb') as file:
+        file.write(data.replace('\n', '\r\n').encode('utf-8'))
+    return path
+
+def _follow_once(logfile, checkpoint):
+    store = None
+    for store in follow(logfile, checkpoint, interval=0, once=True):
+        pass
+    return store
+
+def test_follow_crlf_like_parse(tmp_path, generated_games):
+    path = _crlf_log(tmp_path, generated_games, 0)
+    assert dump_store(_follow_once(path, None)) == dump_store(ParserSession().parse(path))
+
+def test_checkpoint_restarts_like_parse(tmp_path, generated_games):
+    path = _crlf_log(tmp_path, generated_games, 1)
+    expected = dump_store(ParserSession().parse(path))
+    with open(path, 'rb') as file:
+        data = file.read()
+    logfile = str(tmp_path / 'live.log')
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    #Cut anywhere, also in the middle of a line or between \r and \n
+    cuts = sorted(random.Random(1).sample(range(len(data)), 10)) + [len(data)]
+    written = 0
+    for cut in cuts:
+        with open(logfile, 'ab') as file:
+            file.write(data[written:cut])
+        written = cut
+        store = _follow_once(logfile, checkpoint)
+    assert dump_store(store) == expected
+
+def test_unreadable_checkpoint_starts_over(tmp_path, generated_log):
+    checkpoint = tmp_path / 'checkpoint.json'
+    checkpoint.write_bytes(b'\x80\x04not a checkpoint')
+    store = _follow_once(generated_log, str(checkpoint))
+    assert dump_store(store) == dump_store(ParserSession().parse(generated_log))
@@ -0,0 +1,37 @@
+""" The log generator must write the same log for a seed, with players the parser knows """
+from benchmarks.generate import generate, parse_size, player_uuid
+from benchmarks.measure import measure
+from parser.parser import ParserSession
+
+def test_same_seed_same_log(tmp_path):
+    paths = [str(tmp_path / name) for name in ('a.log', 'b.log', 'c.log')]
+    lines = [generate(path, 50 * 1024, seed) for path, seed in zip(paths, (7, 7, 8))]
+    data = []
+    for path in paths:
+        with open(path, 'rb') as file:
+            data.append(file.read())
+    assert data[0] == data[1] != data[2]
+    assert len(data[0]) >= 50 * 1024
+    assert lines[0] == data[0].count(b'\n')
+
+def test_players_keep_their_uuid(generated_log):
+    uuids = {}
+    for game in ParserSession().parse(generated_log).all_items():
+        for player in game.get_playing_players():
+            uuid = game.player_info(player)['uuid']
+            assert uuids.setdefault(player, uuid) == uuid == player_uuid(player)
+    assert len(set(uuids.values())) == len(uuids) > 0
+
+def test_parse_size():
+    assert parse_size('10MB') == 10 * 1024 ** 2
+    assert parse_size('1.5G') == int(1.5 * 1024 ** 3)
+    assert parse_size('300kb') == 300 * 1024
+    assert parse_size('1234') == 1234
+
+def test_measure(generated_log):
+    with open(generated_log, 'rb') as file:
+        lines = file.read().count(b'\n')
+    result = measure(generated_log, lines)
+    assert result['games'] == ParserSession().parse(generated_log).count
+    assert set(result['stages']) == {'parse', 'score_count', 'export'}
+    assert result['lines_per_sec'] > 0
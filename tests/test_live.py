@@ -0,0 +1,100 @@
+""" The live scoreboard must keep up with bursts and serve snapshots right after a restart """
+import asyncio
+import functools
+import json
+
+from parser import live
+from parser.live import ScoreboardServer, Viewer, websocket_frame
+from parser.stats import score_count
+from parser.parser import ParserSession
+
+class Writer(object):
+    """ Collects what is written, drain waits until released when the socket is slow """
+    def __init__(self, slow=False):
+        self.data = bytearray()
+        self.released = asyncio.Event()
+        if not slow:
+            self.released.set()
+
+    def write(self, data):
+        self.data.extend(data)
+
+    async def drain(self):
+        await self.released.wait()
+
+class Loop(object):
+    """ Runs what the ingest thread hands to the event loop right away """
+    def call_soon_threadsafe(self, callback, *args):
+        callback(*args)
+
+def _messages(data):
+    """ The JSON messages in a stream of unmasked text frames """
+    messages = []
+    data = bytes(data)
+    while data:
+        length = data[1] & 0x7f
+        start = 2
+        if length == 126:
+            length, start = int.from_bytes(data[2:4], 'big'), 4
+        elif length == 127:
+            length, start = int.from_bytes(data[2:10], 'big'), 10
+        messages.append(json.loads(data[start:start + length].decode('utf-8')))
+        data = data[start + length:]
+    return messages
+
+def _viewers(server, writers):
+    viewers = []
+    for writer in writers:
+        viewer = Viewer(writer)
+        server.viewers.add(viewer)
+        viewers.append(viewer)
+    return viewers
+
+def test_burst_does_not_resync(tmp_path):
+    async def run():
+        server = ScoreboardServer(str(tmp_path / 'none.log'))
+        fast, slow = _viewers(server, [Writer(), Writer(slow=True)])
+        senders = [asyncio.ensure_future(server._send(viewer)) for viewer in (fast, slow)]
+        burst = [{'type': 'death', 'n': number} for number in range(live.QUEUE_SIZE * 4)]
+        server.publish(burst, None)
+        await asyncio.sleep(0)
+        assert _messages(fast.writer.data) == burst
+        #The slow viewer got the burst too, but its socket never drains
+        for number in range(live.QUEUE_SIZE + 2):
+            server.publish([{'type': 'death', 'n': number}], None)
+            await asyncio.sleep(0)
+        assert _messages(fast.writer.data)[len(burst):] == \
+            [{'type': 'death', 'n': number} for number in range(live.QUEUE_SIZE + 2)]
+        slow.writer.released.set()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        #The queue filled up while the socket did not drain, what came after the resync
+        #is still sent
+        assert _messages(slow.writer.data) == burst + [{'type': 'resync'},
+                                                       {'type': 'death',
+                                                        'n': live.QUEUE_SIZE + 1}]
+        for sender in senders:
+            sender.cancel()
+    asyncio.run(run())
+
+def test_push_keeps_the_batch_whole():
+    async def run():
+        viewer = Viewer(Writer())
+        frames = b''.join(websocket_frame(b'{}') for _ in range(live.QUEUE_SIZE + 1))
+        viewer.push(frames, b'resync')
+        assert viewer.queue.qsize() == 1
+        assert viewer.queue.get_nowait() == frames
+    asyncio.run(run())
+
+def test_snapshots_after_checkpoint_restart(tmp_path, monkeypatch, generated_log):
+    monkeypatch.setattr(live, 'follow', functools.partial(live.follow, once=True))
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    for _ in range(2):
+        #The second server starts from the checkpoint with nothing new in the log
+        server = ScoreboardServer(generated_log, checkpoint=checkpoint, interval=0)
+        server._loop = Loop()
+        server._ingest()
+    expected = score_count(ParserSession().parse(generated_log))
+    body = server.snapshots['/highscore'].split(b'\r\n\r\n', 1)[1]
+    assert json.loads(body.decode('utf-8')) == expected
+    assert server._ranking == expected
@@ -0,0 +1,21 @@
+""" The keyword automaton must find exactly what running every pattern finds """
+from helpers import ODD_LINES, dump_store
+from parser.parser import REGISTRY, ParserSession, legacy_match_line, match_line
+
+def _json(actions):
+    return [action.to_json() for action in actions]
+
+def test_every_line_matches_like_legacy(generated_log):
+    actions = REGISTRY.actions()
+    keywords = REGISTRY.keywords()[0]
+    with open(generated_log, encoding='utf-8') as file:
+        lines = file.readlines()
+    for line in lines + ODD_LINES:
+        assert _json(match_line(line, actions, keywords)) == \
+            _json(legacy_match_line(line, actions)), line
+
+def test_parse_like_legacy(generated_log):
+    legacy = ParserSession(legacy=True).parse(generated_log)
+    keyword = ParserSession().parse(generated_log)
+    assert keyword.count > 0
+    assert dump_store(keyword) == dump_store(legacy)
@@ -0,0 +1,32 @@
+""" Action records read like dicts and trimmed games still score the same """
+from parser.models import Action, Death, TeamMembers
+from parser.parser import ParserSession
+from parser.stats import score_count
+
+def test_action_reads_like_a_dict():
+    action = Death(timestamp='2017-01-01 10:00:00', player='player1', reason='slain',
+                   killed_by='player2')
+    assert action['action'] == 'death' and action['player'] == 'player1'
+    assert action.get('missing') is None
+    assert len(action) == 5
+    assert dict(action) == {'action': 'death', 'timestamp': '2017-01-01 10:00:00',
+                            'player': 'player1', 'reason': 'slain', 'killed_by': 'player2'}
+    fallen = Death(timestamp='2017-01-01 10:00:01', player='player1', reason='fell')
+    assert 'killed_by' not in fallen and len(fallen) == 4
+
+def test_action_json_round_trip():
+    action = TeamMembers(timestamp='2017-01-01 10:00:00', team='red',
+                         players=['player1', 'player2'])
+    copy = Action.from_json(action.to_json())
+    assert type(copy) is TeamMembers and dict(copy) == dict(action)
+    #Names are shared by every record
+    assert copy['team'] is action['team']
+
+def test_trimmed_games_score_the_same(generated_log):
+    full = ParserSession().parse(generated_log)
+    trimmed = ParserSession(scoring_only=True, keep_stop_log=False).parse(generated_log)
+    assert score_count(trimmed) == score_count(full)
+    assert [game.state for game in trimmed.all_items()] == \
+        [game.state for game in full.all_items()]
+    assert all(not game._stop_log for game in trimmed.all_items())
+    assert any(game._stop_log for game in full.all_items())
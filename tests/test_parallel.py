@@ -0,0 +1,19 @@
+""" A directory of rotated logs parsed in a process pool must give the games of one log """
+import gzip
+
+from helpers import dump_store, rotate_log
+from parser.parallel import log_files, parse_files
+from parser.parser import ParserSession
+
+def test_rotated_logs_in_order(tmp_path):
+    for name in ('latest.log', '2017-01-02-1.log', '2017-01-01-10.log.gz', '2017-01-01-2.log',
+                 'notes.txt'):
+        (tmp_path / name).write_bytes(b'')
+    assert [path.split('/')[-1] for path in log_files(str(tmp_path))] == \
+        ['2017-01-01-2.log', '2017-01-01-10.log.gz', '2017-01-02-1.log', 'latest.log']
+
+def test_directory_like_one_log(tmp_path, generated_log):
+    #Games are cut in the middle, a game goes on in the next file
+    rotate_log(generated_log, str(tmp_path), 12, gzip.open, '.log.gz')
+    expected = dump_store(ParserSession().parse(generated_log))
+    assert dump_store(parse_files(str(tmp_path), processes=2)) == expected
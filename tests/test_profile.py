@@ -0,0 +1,45 @@
+""" A profiled parse must count what it read and matched and make the same games """
+import json
+
+import logbook
+
+from helpers import dump_store
+from parser.helpers import get_logger, set_debug
+from parser.instrument import Profile
+from parser.parser import REGISTRY, ParserSession, legacy_match_line
+
+def test_profile_counts(generated_log):
+    profile = Profile()
+    store = ParserSession(profile=profile).parse(generated_log)
+    assert dump_store(store) == dump_store(ParserSession().parse(generated_log))
+    with open(generated_log, 'rb') as file:
+        data = file.read()
+    assert profile.bytes_read == len(data)
+    assert profile.lines_read == data.count(b'\n')
+    matched = [legacy_match_line(line, REGISTRY.actions())
+               for line in data.decode('utf-8').splitlines(True)]
+    assert profile.lines_matched == sum(1 for actions in matched if actions)
+    hits = sum(counts[1] for counts in profile.patterns.values())
+    assert hits == sum(len(actions) for actions in matched) == sum(profile.actions.values())
+    assert sum(profile.games.values()) == store.count
+    assert sum(counts[0] for counts in profile.handlers.values()) == hits
+
+def test_profile_json(generated_log):
+    profile = Profile()
+    with profile.stage('parse'):
+        ParserSession(profile=profile).parse(generated_log)
+    data = json.loads(json.dumps(profile.to_json()))
+    assert data['lines_read'] == profile.lines_read
+    assert set(data['stages']) == {'parse'}
+    assert 'Patterns:' in profile.report()
+
+def test_debug_only_when_turned_on():
+    log = get_logger('test')
+    with logbook.TestHandler() as handler:
+        log.debug("Not shown {n}", n=1)
+        set_debug(True)
+        try:
+            log.debug("Shown {n}", n=2)
+        finally:
+            set_debug(False)
+    assert [record.message for record in handler.records] == ['Shown 2']
@@ -0,0 +1,41 @@
+""" Only running the server patterns between games must not change what is parsed """
+from helpers import dump_games, dump_store, fuzz_log, split_games
+from parser.instrument import Profile
+from parser.models import StreamStore
+from parser.parser import ParserSession, iter_games
+from parser.stats import score_count
+
+def _parse(path, **options):
+    return dump_store(ParserSession(keep_stop_log=False, **options).parse(path))
+
+def _idle_log(path, games):
+    """ Every game followed by the lines of another game that is never started """
+    with open(path, 'w', encoding='utf-8') as file:
+        for game, idle in zip(games, games[1:] + games[:1]):
+            file.writelines(game)
+            file.writelines(idle[1:])
+    return path
+
+def test_pruned_like_unpruned(tmp_path, generated_log, generated_games):
+    fuzzed = fuzz_log(str(tmp_path / 'fuzzed.log'), generated_games, 40, 4)
+    idle = _idle_log(str(tmp_path / 'idle.log'), split_games(generated_log))
+    for path in (generated_log, fuzzed, idle):
+        pruned = _parse(path)
+        assert pruned == _parse(path, prune=False)
+        assert pruned == _parse(path, legacy=True)
+        streamed = ParserSession(store=StreamStore(), keep_stop_log=False)
+        assert dump_games(iter_games(path, session=streamed)) == pruned
+
+def test_pruned_scores_like_default(generated_log):
+    pruned = ParserSession(keep_stop_log=False)
+    assert pruned.prune
+    assert score_count(pruned.parse(generated_log)) == \
+        score_count(ParserSession().parse(generated_log))
+
+def test_idle_lines_are_not_matched(tmp_path, generated_log):
+    idle = _idle_log(str(tmp_path / 'idle.log'), split_games(generated_log))
+    pruned, unpruned = Profile(), Profile()
+    ParserSession(keep_stop_log=False, profile=pruned).parse(idle)
+    ParserSession(keep_stop_log=False, profile=unpruned, prune=False).parse(idle)
+    assert pruned.lines_read == unpruned.lines_read
+    assert pruned.candidates < unpruned.candidates
@@ -0,0 +1,97 @@
+""" Actions that can not be handled or scored are quarantined with where they came from """
+import json
+
+from helpers import dump_store
+from parser.cache import ParseCache
+from parser.parser import ParserSession, iter_games
+from parser.quarantine import Quarantine
+from parser.stats import Highscore, score_stream, score_tables
+
+#frank logs in on line 5 without a UUID line, the IP of an unknown player can not be
+#handled. dave only watches the second game (from line 12) and dies, that can not be scored
+BROKEN = """\
+2017-03-01 19:00:00 [INFO] Starting minecraft server version 1.11.2
+2017-03-01 19:01:00 [INFO] UUID of player alice is 11111111-1111-1111-1111-111111111111
+2017-03-01 19:01:10 [INFO] UUID of player bob is 22222222-2222-2222-2222-222222222222
+2017-03-01 19:01:20 [INFO] UUID of player carol is 33333333-3333-3333-3333-333333333333
+2017-03-01 19:01:25 [INFO] frank[/10.0.0.6:5555] logged in with entity id 6
+2017-03-01 19:01:30 [INFO] UUID of player dave is 44444444-4444-4444-4444-444444444444
+2017-03-01 19:02:01 [INFO] Added 2 player(s) to team red: alice and bob
+2017-03-01 19:02:02 [INFO] Added 2 player(s) to team blue: carol and dave
+2017-03-01 19:10:00 [INFO] carol was slain by alice
+2017-03-01 19:11:00 [INFO] dave was slain by bob
+2017-03-01 19:14:00 [INFO] Stopping the server
+2017-03-02 19:00:00 [INFO] Starting minecraft server version 1.11.2
+2017-03-02 19:01:00 [INFO] UUID of player bob is 22222222-2222-2222-2222-222222222222
+2017-03-02 19:01:10 [INFO] UUID of player carol is 33333333-3333-3333-3333-333333333333
+2017-03-02 19:01:20 [INFO] UUID of player erin is 55555555-5555-5555-5555-555555555555
+2017-03-02 19:01:30 [INFO] UUID of player frank is 66666666-6666-6666-6666-666666666666
+2017-03-02 19:01:40 [INFO] UUID of player dave is 44444444-4444-4444-4444-444444444444
+2017-03-02 19:02:01 [INFO] Added 2 player(s) to team green: bob and carol
+2017-03-02 19:02:02 [INFO] Added 2 player(s) to team gold: erin and frank
+2017-03-02 19:05:00 [INFO] dave fell from a high place
+2017-03-02 19:10:00 [INFO] erin was slain by bob
+2017-03-02 19:11:00 [INFO] frank was slain by carol
+2017-03-02 19:14:00 [INFO] Stopping the server
+"""
+
+def _entries(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+def test_entries_point_at_the_log(tmp_path):
+    logfile = tmp_path / 'broken.log'
+    logfile.write_text(BROKEN)
+    side = str(tmp_path / 'bad.jsonl')
+    with Quarantine(side) as quarantine:
+        store = ParserSession(quarantine=quarantine).parse(str(logfile))
+        score_tables(store, [Highscore()], quarantine)
+    handled, scored = _entries(side)
+    assert (handled['stage'], handled['at'], handled['action']['action']) == \
+        ('handle', 'action', 'player_ip')
+    assert (handled['file'], handled['line'], handled['game']) == \
+        (str(logfile), 5, '2017-03-01T19:00:00')
+    assert (scored['stage'], scored['at'], scored['action']['player']) == \
+        ('score', 'game', 'dave')
+    assert (scored['file'], scored['line'], scored['game']) == \
+        (str(logfile), 12, '2017-03-02T19:00:00')
+    assert BROKEN.encode('utf-8')[scored['offset']:].startswith(b'2017-03-02 19:00:00')
+    assert all(game.inconsistent for game in store.all_items())
+
+def test_summary(tmp_path):
+    logfile = tmp_path / 'broken.log'
+    logfile.write_text(BROKEN)
+    quarantine = Quarantine()
+    store = ParserSession(quarantine=quarantine).parse(str(logfile))
+    score_tables(store, [Highscore()], quarantine)
+    summary = quarantine.summary()
+    assert (summary['quarantined'], summary['unscored'], summary['games']) == (1, 1, 2)
+    #Every line is an action
+    assert summary['actions'] == BROKEN.count('\n')
+    assert summary['by_action']['death'] == {'actions': 5, 'quarantined': 0, 'rate': 0.0,
+                                             'unscored': 1}
+    assert summary['errors'] == {'TypeError': 1, 'KeyError': 1}
+    assert 'Could not score 1 handled actions' in quarantine.report()
+
+def test_streamed_and_cached_games_keep_their_position(tmp_path):
+    logfile = tmp_path / 'broken.log'
+    logfile.write_text(BROKEN)
+    streamed = str(tmp_path / 'streamed.jsonl')
+    with Quarantine(streamed) as quarantine:
+        for _ in score_stream(iter_games(str(logfile), quarantine=quarantine),
+                              [Highscore()], quarantine):
+            pass
+    cached = str(tmp_path / 'cached.jsonl')
+    (tmp_path / 'cache').mkdir()
+    with Quarantine(cached) as quarantine:
+        ParseCache(str(tmp_path / 'cache')).parse(str(logfile),
+                                                  ParserSession(quarantine=quarantine))
+    for side in (streamed, cached):
+        assert [(entry['stage'], entry['line']) for entry in _entries(side)] == \
+            [('handle', 5), ('score', 12)]
+
+def test_clean_log_like_parse(generated_log):
+    quarantine = Quarantine()
+    store = ParserSession(quarantine=quarantine).parse(generated_log)
+    assert dump_store(store) == dump_store(ParserSession().parse(generated_log))
+    assert quarantine.summary()['quarantined'] == 0
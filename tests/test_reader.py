@@ -0,0 +1,56 @@
+""" The reader must give every line of plain and compressed logs, in windows of any size """
+import bz2
+import gzip
+import lzma
+
+import pytest
+
+from parser import reader
+from parser.parser import REGISTRY
+
+def _expected(path, keywords=None, start=0):
+    """ (offset, line) of every line from start, read the simple way """
+    with open(path, 'rb') as file:
+        data = file.read()
+    lines = []
+    offset = 0
+    for raw in data.splitlines(True):
+        if offset >= start and (keywords is None or any(word in raw for word in keywords)):
+            lines.append((offset, raw.rstrip(b'\r\n').decode('utf-8')))
+        offset += len(raw)
+    return lines
+
+@pytest.fixture(params=[4096, 64 * 1024 * 1024])
+def chunk_size(request, monkeypatch):
+    monkeypatch.setattr(reader, 'CHUNK_SIZE', request.param)
+    return request.param
+
+def test_plain_lines(generated_log, chunk_size):
+    keywords = REGISTRY.keywords()[1]
+    assert list(reader.read_lines(generated_log, offsets=True)) == _expected(generated_log)
+    assert list(reader.read_lines(generated_log, keywords, offsets=True)) == \
+        _expected(generated_log, keywords)
+
+def test_plain_from_offset(generated_log, chunk_size):
+    lines = _expected(generated_log)
+    start, end = lines[100][0], lines[200][0]
+    assert list(reader.read_lines(generated_log, start=start, end=end, offsets=True)) == \
+        lines[100:200]
+
+@pytest.mark.parametrize('suffix,opener', [('.gz', gzip.open), ('.xz', lzma.open),
+                                           ('.bz2', bz2.open)])
+def test_compressed_like_plain(tmp_path, generated_log, chunk_size, suffix, opener):
+    path = str(tmp_path / ('generated.log' + suffix))
+    with open(generated_log, 'rb') as plain, opener(path, 'wb') as packed:
+        packed.write(plain.read())
+    keywords = REGISTRY.keywords()[1]
+    assert list(reader.read_lines(path, keywords, offsets=True)) == \
+        _expected(generated_log, keywords)
+    start = _expected(generated_log)[500][0]
+    assert list(reader.read_lines(path, start=start, offsets=True)) == \
+        _expected(generated_log, start=start)
+
+def test_crlf_and_no_last_newline(tmp_path):
+    path = tmp_path / 'crlf.log'
+    path.write_bytes(b'first\r\nsecond\r\nthird')
+    assert list(reader.read_lines(str(path))) == ['first', 'second', 'third']
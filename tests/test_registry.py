@@ -0,0 +1,75 @@
+""" Patterns come from the registry, config files and plugins, and are only compiled when used """
+import importlib.metadata
+import json
+import os
+import subprocess
+import sys
+
+from parser.parser import REGISTRY, ParserSession
+from parser.patterns import ENTRY_POINT, PatternRegistry
+
+LINE = '2017-03-01 19:10:00 [INFO] carol was pricked to death\n'
+KILL = '2017-03-01 19:10:00 [INFO] carol was zapped by alice\n'
+
+class EntryPoint(object):
+    """ An installed plugin """
+    def __init__(self, plugin):
+        self.plugin = plugin
+
+    def load(self):
+        return self.plugin
+
+def _registry(plugins=False):
+    return PatternRegistry(dict(REGISTRY.builders), plugins=plugins)
+
+def _match(registry, line):
+    return [action.to_json() for action in ParserSession(actions=registry.actions())
+            .match_line(line)]
+
+def test_load_config(tmp_path):
+    path = tmp_path / 'extra.json'
+    path.write_text(json.dumps([{'death': ' was pricked to death', 'reason': 'cactus'},
+                                {'death': ' was zapped by ', 'reason': 'zap',
+                                 'killer': True}]))
+    registry = _registry()
+    registry.load(str(path))
+    assert len(registry) == 2
+    assert _match(registry, LINE) == [{'action': 'death', 'timestamp': '2017-03-01 19:10:00',
+                                       'player': 'carol', 'reason': 'cactus'}]
+    assert _match(registry, KILL)[0]['killed_by'] == 'alice'
+
+def test_compiled_once_until_changed():
+    registry = _registry()
+    registry.register_death(' was pricked to death', 'cactus')
+    actions = registry.actions()
+    assert registry.actions() is actions
+    assert registry.keywords() is registry.keywords()
+    registry.register_death(' was zapped by ', 'zap', killer=True)
+    assert registry.actions() is not actions
+    assert len(registry.actions()) == 2
+
+def test_plugins(monkeypatch):
+    groups = []
+    def entry_points(group):
+        groups.append(group)
+        return [EntryPoint(lambda registry: registry.register_death(' was pricked to death',
+                                                                   'cactus'))]
+    monkeypatch.setattr(importlib.metadata, 'entry_points', entry_points)
+    registry = _registry(plugins=True)
+    assert _match(registry, LINE)[0]['reason'] == 'cactus'
+    registry.actions()
+    assert groups == [ENTRY_POINT]
+
+def _run(code):
+    """ Run code in a new interpreter from the top of the repository, returns the words printed """
+    top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.check_output([sys.executable, '-c', code], cwd=top).decode('utf-8').split()
+
+def test_cli_does_not_import_the_parser():
+    assert _run('import sys, main; print("parser.parser" in sys.modules, '
+                '"logbook" in sys.modules)') == ['False', 'False']
+
+def test_follow_after_the_submodules():
+    assert _run('import parser.live, parser.tail\n'
+                'from parser import follow\n'
+                'print(callable(follow), follow.__module__)') == ['True', 'parser.tail']
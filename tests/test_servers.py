@@ -0,0 +1,76 @@
+""" Several servers keep their own games and share one leaderboard keyed by UUID """
+import os
+
+from helpers import dump_store, fuzz_log, rotate_log
+from parser.parser import ParserSession
+from parser.servers import find_servers, parse_servers
+from parser.stats import UuidHighscore
+
+#bob is called bobby in the second game, with the same UUID
+RENAMED = """\
+2017-03-01 19:00:00 [INFO] Starting minecraft server version 1.11.2
+2017-03-01 19:01:00 [INFO] UUID of player alice is 11111111-1111-1111-1111-111111111111
+2017-03-01 19:01:10 [INFO] UUID of player bob is 22222222-2222-2222-2222-222222222222
+2017-03-01 19:01:20 [INFO] UUID of player carol is 33333333-3333-3333-3333-333333333333
+2017-03-01 19:02:01 [INFO] Added 2 player(s) to team red: alice and bob
+2017-03-01 19:02:02 [INFO] Added 1 player(s) to team blue: carol
+2017-03-01 19:10:00 [INFO] carol was slain by bob
+2017-03-01 19:14:00 [INFO] Stopping the server
+2017-03-02 19:00:00 [INFO] Starting minecraft server version 1.11.2
+2017-03-02 19:01:00 [INFO] UUID of player alice is 11111111-1111-1111-1111-111111111111
+2017-03-02 19:01:10 [INFO] UUID of player bobby is 22222222-2222-2222-2222-222222222222
+2017-03-02 19:01:20 [INFO] UUID of player carol is 33333333-3333-3333-3333-333333333333
+2017-03-02 19:02:01 [INFO] Added 2 player(s) to team red: alice and carol
+2017-03-02 19:02:02 [INFO] Added 1 player(s) to team blue: bobby
+2017-03-02 19:10:00 [INFO] alice was slain by bobby
+2017-03-02 19:11:00 [INFO] carol was slain by bobby
+2017-03-02 19:14:00 [INFO] Stopping the server
+"""
+
+def _leaderboard(stores):
+    """ The UUID leaderboard of some stores, counted one game at a time """
+    leaderboard = UuidHighscore()
+    for store in stores:
+        for game in store.items():
+            leaderboard.add_game(game)
+    return leaderboard
+
+def test_servers_keep_their_games(tmp_path, generated_log, generated_games):
+    lobby = tmp_path / 'servers' / 'lobby'
+    lobby.mkdir(parents=True)
+    rotate_log(generated_log, str(lobby), 3)
+    eu = tmp_path / 'servers' / 'eu'
+    eu.mkdir()
+    fuzz_log(str(eu / 'latest.log'), generated_games, 30, 5)
+    servers = find_servers(str(tmp_path / 'servers'))
+    assert servers == {'eu': str(eu), 'lobby': str(lobby)}
+    stores, leaderboard = parse_servers(servers, processes=2)
+    alone = {'lobby': ParserSession().parse(generated_log),
+             'eu': ParserSession().parse(os.path.join(str(eu), 'latest.log'))}
+    for name, store in alone.items():
+        assert dump_store(stores[name]) == dump_store(store)
+    expected = _leaderboard([alone[name] for name in servers])
+    assert leaderboard.players == expected.players
+    assert leaderboard.get_highscore() == expected.get_highscore()
+
+def test_renamed_player_is_one_player(tmp_path):
+    path = tmp_path / 'renamed.log'
+    path.write_text(RENAMED)
+    store = ParserSession().parse(str(path))
+    #The order the games are counted in does not decide the name
+    for games in (list(store.items()), list(store.items())[::-1]):
+        leaderboard = UuidHighscore()
+        for game in games:
+            leaderboard.add_game(game)
+        players = {player['nickname']: player for player in leaderboard.get_highscore()}
+        assert sorted(players) == ['alice', 'bobby', 'carol']
+        assert players['bobby']['kills'] == 3
+        assert players['bobby']['games'] == 2
+        assert players['bobby']['last_seen'] == '2017-03-02T19:00:00'
+
+def test_json_round_trip(tmp_path):
+    path = tmp_path / 'renamed.log'
+    path.write_text(RENAMED)
+    leaderboard = _leaderboard([ParserSession().parse(str(path))])
+    loaded = UuidHighscore.from_json(leaderboard.to_json())
+    assert loaded.get_highscore() == leaderboard.get_highscore()
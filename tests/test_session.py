@@ -0,0 +1,32 @@
+""" Every session keeps its own games and plays actions with the same state machine """
+from helpers import dump_store
+from parser.models import ServerCrash, ServerStart, ServerStop, State
+from parser.parser import ParserSession, parse
+
+def _start(second):
+    return ServerStart(timestamp='2017-01-01 10:00:{s:02}'.format(s=second), version='1.11.2')
+
+def test_sessions_do_not_share_games(generated_log):
+    first = ParserSession()
+    first.parse(generated_log)
+    second = ParserSession()
+    assert second.store.count == 0
+    second.parse(generated_log)
+    assert dump_store(first.store) == dump_store(second.store)
+    assert dump_store(parse(generated_log)) == dump_store(parse(generated_log))
+
+def test_server_lifecycle():
+    session = ParserSession()
+    session.handle_action(ServerStop(timestamp='2017-01-01 09:59:00'))
+    assert session.store.count == 0
+    session.handle_action(_start(0))
+    session.handle_action(_start(1))
+    first, second = session.store.all_items()
+    assert first.state == State.ABORTED
+    session.handle_action(ServerCrash(timestamp='2017-01-01 10:00:02'))
+    session.handle_action(_start(3))
+    #A restart after a crash goes on with the same game
+    assert session.store.count == 2 and second.state == State.CRASHED
+    session.handle_action(ServerStop(timestamp='2017-01-01 10:00:04'))
+    #Stopped without a winner
+    assert second.state == State.ABORTED
@@ -0,0 +1,28 @@
+""" A log cut where servers start must give the same games as a sequential parse """
+import pytest
+
+from helpers import dump_store, fuzz_log
+from parser import parallel
+from parser.parser import ParserSession
+
+@pytest.mark.parametrize('seed,segments', [(0, 1), (1, 5), (2, 50), (3, 200)])
+def test_split_like_sequential(tmp_path, monkeypatch, generated_games, seed, segments):
+    path = fuzz_log(str(tmp_path / 'fuzzed.log'), generated_games, 60, seed)
+    monkeypatch.setattr(parallel, 'SEGMENTS_PER_PROCESS', segments)
+    sequential = ParserSession().parse(path)
+    split = parallel.parse_split(path, processes=2)
+    assert split.count > 0
+    assert dump_store(split) == dump_store(sequential)
+
+def test_split_without_stop_log(tmp_path, monkeypatch, generated_games):
+    path = fuzz_log(str(tmp_path / 'fuzzed.log'), generated_games, 60, 4)
+    monkeypatch.setattr(parallel, 'SEGMENTS_PER_PROCESS', 20)
+    sequential = ParserSession(keep_stop_log=False).parse(path)
+    split = parallel.parse_split(path, processes=2,
+                                 session=ParserSession(keep_stop_log=False))
+    assert dump_store(split) == dump_store(sequential)
+
+def test_split_generated(generated_log):
+    sequential = ParserSession().parse(generated_log)
+    assert dump_store(parallel.parse_split(generated_log, processes=2)) == \
+        dump_store(sequential)
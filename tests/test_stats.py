@@ -0,0 +1,97 @@
+""" Highscore tables can be merged in any order, windowed by season and saved as JSON """
+import random
+from datetime import datetime
+
+from parser.parser import ParserSession
+from parser.stats import Highscore, game_score, score_count, score_tables, season
+
+#dave plays the first game and only watches the second one, where he kills erin
+SPECTATOR_KILL = """\
+2017-03-01 19:00:00 [INFO] Starting minecraft server version 1.11.2
+2017-03-01 19:01:00 [INFO] UUID of player alice is 11111111-1111-1111-1111-111111111111
+2017-03-01 19:01:10 [INFO] UUID of player bob is 22222222-2222-2222-2222-222222222222
+2017-03-01 19:01:20 [INFO] UUID of player carol is 33333333-3333-3333-3333-333333333333
+2017-03-01 19:01:30 [INFO] UUID of player dave is 44444444-4444-4444-4444-444444444444
+2017-03-01 19:02:01 [INFO] Added 2 player(s) to team red: alice and bob
+2017-03-01 19:02:02 [INFO] Added 2 player(s) to team blue: carol and dave
+2017-03-01 19:10:00 [INFO] carol was slain by alice
+2017-03-01 19:11:00 [INFO] dave was slain by bob
+2017-03-01 19:14:00 [INFO] Stopping the server
+2017-03-02 19:00:00 [INFO] Starting minecraft server version 1.11.2
+2017-03-02 19:01:00 [INFO] UUID of player bob is 22222222-2222-2222-2222-222222222222
+2017-03-02 19:01:10 [INFO] UUID of player carol is 33333333-3333-3333-3333-333333333333
+2017-03-02 19:01:20 [INFO] UUID of player erin is 55555555-5555-5555-5555-555555555555
+2017-03-02 19:01:30 [INFO] UUID of player frank is 66666666-6666-6666-6666-666666666666
+2017-03-02 19:01:40 [INFO] UUID of player dave is 44444444-4444-4444-4444-444444444444
+2017-03-02 19:02:01 [INFO] Added 2 player(s) to team green: bob and carol
+2017-03-02 19:02:02 [INFO] Added 2 player(s) to team gold: erin and frank
+2017-03-02 19:10:00 [INFO] erin was slain by dave
+2017-03-02 19:11:00 [INFO] frank was slain by carol
+2017-03-02 19:14:00 [INFO] Stopping the server
+"""
+
+def _ranked(highscore):
+    """ The ranking the way the original code sorted the whole table """
+    players = sorted(highscore.players.items(), key=lambda item: -highscore.score(item[0]))
+    return [player for player, _ in players]
+
+def test_merge_in_any_order(generated_log):
+    store = ParserSession().parse(generated_log)
+    scores = [game_score(game) for game in store.items()]
+    expected = Highscore()
+    for score in scores:
+        expected.merge(score)
+    for seed in range(5):
+        random.Random(seed).shuffle(scores)
+        merged = sum(scores, Highscore())
+        assert merged.players == expected.players
+        ranking = [player['nickname'] for player in merged.get_highscore()]
+        assert sorted(ranking) == sorted(expected.players)
+        assert [merged.score(player) for player in ranking] == \
+            [merged.score(player) for player in _ranked(merged)]
+
+def test_recounting_a_game(generated_log):
+    store = ParserSession().parse(generated_log)
+    highscore = Highscore()
+    for game in store.items():
+        highscore.add_game(game)
+    #Like the live scoreboard when a game it counted changed
+    for game in list(store.items())[::3]:
+        highscore.remove_game(game).add_game(game)
+    assert highscore.get_highscore() == score_count(store)
+
+def test_season_windows(generated_log):
+    assert season('2017') == (datetime(2017, 1, 1), datetime(2018, 1, 1))
+    assert season('2017-05') == (datetime(2017, 5, 1), datetime(2017, 6, 1))
+    assert season('2017-12') == (datetime(2017, 12, 1), datetime(2018, 1, 1))
+    store = ParserSession().parse(generated_log)
+    games = list(store.items())
+    middle = games[len(games) // 2].sid
+    window = Highscore(start=middle)
+    everything = Highscore()
+    score_tables(store, [window, everything])
+    assert everything.get_highscore() == score_count(store)
+    expected = sum((game_score(game) for game in games if game.sid >= middle), Highscore())
+    assert window.players == expected.players
+
+def test_json_round_trip(generated_log):
+    highscore = Highscore(*season('2017'))
+    score_tables(ParserSession().parse(generated_log), [highscore])
+    loaded = Highscore.from_json(highscore.to_json())
+    assert (loaded.start, loaded.end) == (highscore.start, highscore.end)
+    assert loaded.get_highscore() == highscore.get_highscore()
+
+def test_kills_count_for_players_of_the_game(tmp_path):
+    path = tmp_path / 'spectator.log'
+    path.write_text(SPECTATOR_KILL)
+    players = {player['nickname']: player for player in
+               score_count(ParserSession().parse(str(path)))}
+    assert players['dave']['kills'] == 0
+    assert players['erin']['deaths'] == 1
+    assert players['carol']['kills'] == 1
+
+def test_season_does_not_replace_all_time():
+    from main import highscore_tables
+    tables = highscore_tables(['2017', '2017-05'])
+    assert sorted(tables) == ['hs2017.json', 'hs_season_2017-05.json', 'hs_season_2017.json']
+    assert tables['hs2017.json'].start is None
@@ -0,0 +1,48 @@
+""" Streamed games must be the games of a parse and be counted and saved like them """
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from helpers import dump_games, dump_store, fuzz_log, rotate_log
+from main import cli
+from parser.parallel import iter_files, parse_files
+from parser.parser import ParserSession, iter_games
+from parser.stats import score_count
+
+def _saved(directory):
+    with open(str(directory / 'hs2017.json')) as file:
+        return json.load(file)
+
+def test_iter_games_like_parse(tmp_path, generated_log, generated_games):
+    fuzzed = fuzz_log(str(tmp_path / 'fuzzed.log'), generated_games, 40, 3)
+    for path in (generated_log, fuzzed):
+        assert dump_games(iter_games(path)) == dump_store(ParserSession().parse(path))
+
+def test_iter_files_like_parse_files(tmp_path, generated_log):
+    rotate_log(generated_log, str(tmp_path), 4)
+    expected = dump_store(parse_files(str(tmp_path), processes=2))
+    assert expected == dump_store(ParserSession().parse(generated_log))
+    assert dump_games(iter_files(str(tmp_path), processes=2)) == expected
+
+def test_cli_stream_saves_like_parse(tmp_path, generated_log):
+    parsed, streamed = tmp_path / 'parsed', tmp_path / 'streamed'
+    parsed.mkdir()
+    streamed.mkdir()
+    runner = CliRunner()
+    assert runner.invoke(cli, ['parse', generated_log, '--save', str(parsed)]).exit_code == 0
+    assert runner.invoke(cli, ['parse', generated_log, '--save', str(streamed),
+                               '--stream']).exit_code == 0
+    saved = _saved(streamed)
+    assert saved == _saved(parsed)
+    assert saved['highscore'] == score_count(ParserSession().parse(generated_log))
+    assert sorted(path.name for path in streamed.iterdir()) == \
+        sorted(path.name for path in parsed.iterdir())
+
+@pytest.mark.parametrize('option', ['--cache', '--analytics', '--split'])
+def test_stream_with_other_modes(tmp_path, generated_log, option):
+    args = ['parse', generated_log, '--stream', option]
+    if option == '--cache':
+        args.append(str(tmp_path))
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 2
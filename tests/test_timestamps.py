@@ -0,0 +1,53 @@
+""" Timestamps read by position must equal strptime and the time index must find what a
+scan finds """
+import random
+from datetime import datetime, timedelta
+
+from parser.helpers import EPOCH, get_datetime, get_epoch
+from parser.models import Death
+from parser.parser import ParserSession
+
+def _strptime(timestamp):
+    return int((datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S") - EPOCH).total_seconds())
+
+def test_epoch_like_strptime():
+    rand = random.Random(1)
+    start = datetime(1999, 12, 31, 23, 59, 59)
+    for _ in range(5000):
+        when = start + timedelta(seconds=rand.randint(0, 40 * 365 * 86400))
+        timestamp = when.strftime("%Y-%m-%d %H:%M:%S")
+        assert get_epoch(timestamp) == _strptime(timestamp), timestamp
+        assert get_datetime(timestamp) == when
+    #Leap days and the turn of a year
+    for timestamp in ('2016-02-29 12:00:00', '2016-12-31 23:59:59', '2017-01-01 00:00:00'):
+        assert get_epoch(timestamp) == _strptime(timestamp)
+
+def test_odd_timestamps_fall_back_to_strptime():
+    assert get_epoch('2017-3-1 9:05:07') == _strptime('2017-03-01 09:05:07')
+
+def test_actions_between_like_a_scan(generated_log):
+    rand = random.Random(2)
+    for game in ParserSession().parse(generated_log).all_items():
+        timed = [(game.offset(action), action) for action in game.get_actions()
+                 if action.get('timestamp') is not None]
+        length = max(offset for offset, _ in timed) + 1
+        for _ in range(10):
+            start, end = sorted(rand.randint(-10, length + 10) for _ in range(2))
+            for action in (None, 'death'):
+                expected = sorted(((offset, found) for offset, found in timed
+                                   if start <= offset < end
+                                   and action in (None, found['action'])),
+                                  key=lambda entry: entry[0])
+                assert game.actions_between(start, end, action) == expected
+        assert game.actions_between() == sorted(timed, key=lambda entry: entry[0])
+
+def test_index_follows_a_growing_log(generated_log):
+    games = ParserSession().parse(generated_log).all_items()
+    game = next(game for game in games if game.game_info)
+    before = len(game.actions_between())
+    #A death a second after the last action is picked up by the next call
+    last = game.actions_between()[-1][1]['timestamp']
+    later = (get_datetime(last) + timedelta(seconds=1)).strftime("%Y-%m-%d %H:%M:%S")
+    game._log.append(Death(timestamp=later, player='late', reason=None))
+    assert len(game.actions_between()) == before + 1
+    assert game.actions_between(action='death')[-1][1]['player'] == 'late'
@@ -0,0 +1,71 @@
+""" The alive counters of Game must decide games like looking at every player does """
+import random
+
+from parser.models import (Death, Game, GameStart, PlayerJoin, PlayerMode, ServerStart,
+                           State, Survivors, TeamMembers, TeamWin)
+
+PLAYERS = ['player{n}'.format(n=n) for n in range(8)]
+TEAMS = ['red', 'blue', 'green']
+TIMESTAMP = '2017-01-01 10:00:00'
+
+class ScanningGame(Game):
+    """ A game deciding the winner the way it was done before the counters, by going
+    through all playing players on every death """
+    def check_for_winner(self):
+        playing = list(self.get_playing_players())
+        if len(playing) < 3:
+            self.stopped = True
+            self.state = State.ABORTED
+            return
+        alive = set(playing) - set(self._deaths)
+        teams = {self._player_info[player]['team'] for player in alive}
+        if len(teams) > 1:
+            return
+        team = next(iter(teams), None)
+        members = [player for player in playing if self._player_info[player]['team'] == team]
+        self._log.append(TeamWin(team=team, players=members))
+        self._log.append(Survivors(players=[player for player in playing if player in alive]))
+        self.stopped = True
+        self.state = State.STOPPED
+        self.winning_team = team
+
+def random_action(rand):
+    """ An action that changes who plays, who is in which team or who is alive """
+    roll = rand.random()
+    player = rand.choice(PLAYERS)
+    if roll < 0.25:
+        return PlayerJoin(timestamp=TIMESTAMP, player=player, uuid='uuid-' + player)
+    if roll < 0.5:
+        return TeamMembers(timestamp=TIMESTAMP, team=rand.choice(TEAMS),
+                           players=rand.sample(PLAYERS, rand.randint(1, 3)))
+    if roll < 0.6:
+        return PlayerMode(timestamp=TIMESTAMP, player=player,
+                          mode=rand.choice(['Survival', 'Spectator']))
+    if roll < 0.65:
+        return GameStart(timestamp=TIMESTAMP, end_blocks='100', start_blocks='2000',
+                         seconds='3600')
+    return Death(timestamp=TIMESTAMP, player=player, reason='slain')
+
+def _state(game):
+    return (game.state, game.stopped, game.winning_team, game.to_json()['log'],
+            list(game._players), game._player_info)
+
+def test_counters_decide_like_scanning():
+    for seed in range(3000):
+        rand = random.Random(seed)
+        start = ServerStart(timestamp=TIMESTAMP, version='1.11.2')
+        game, reference = Game(start), ScanningGame(start)
+        for _ in range(rand.randint(1, 40)):
+            action = random_action(rand)
+            game.add_action(action)
+            reference.add_action(action)
+            assert _state(game) == _state(reference), seed
+
+def test_counters_survive_json():
+    rand = random.Random(0)
+    game = Game(ServerStart(timestamp=TIMESTAMP, version='1.11.2'))
+    for _ in range(20):
+        game.add_action(random_action(rand))
+    copy = Game.from_json(game.to_json())
+    assert (copy._playing, copy._dead, copy._alive_teams) == \
+        (game._playing, game._dead, game._alive_teams)